@@ -0,0 +1,15 @@
+"""
+benchmarks
+
+Performance harness for the order API and the discount engine.
+
+Builds a synthetic dataset in a throwaway test database and measures
+throughput, latency percentiles and query counts per scenario. Run it with
+`python manage.py run_benchmarks`; results are written as JSON so runs from
+different commits can be compared with `--compare`.
+
+`python manage.py run_load_test` load-tests the running application
+instead: server workers (server.py) on their own copy of the database,
+concurrent HTTP traffic (traffic.py) and a check of the results against
+the declared SLOs (slo.py).
+"""
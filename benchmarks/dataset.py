@@ -0,0 +1,129 @@
+"""
+benchmarks/dataset.py
+
+Synthetic dataset for the benchmarks: users, products across a few
+categories, a mix of discount rules and order histories. Everything is written with bulk inserts.
+"""
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from core.discounts import bump_rules_version, summarize
+from core.models import Category, CustomerLoyalty, DiscountRule, Order, OrderItem, Product
+
+
+@dataclass
+class DatasetConfig:
+    users: int = 200
+    products: int = 300
+    orders_per_user: int = 10
+    max_items_per_order: int = 8
+    category_rules: int = 30
+    percentage_rules: int = 3
+    scheduled_rules: int = 300
+    seed: int = 1234
+
+
+@dataclass
+class Dataset:
+    admin: User
+    users: list
+    product_ids: list
+    order_ids: list
+
+
+CATEGORY_NAMES = ['Electronics', 'Fashion', 'Home & Living']
+
+# Order history statuses, weighted towards delivered orders
+HISTORY_STATUSES = ['completed'] * 5 + ['shipped'] * 2 + ['placed', 'delayed', 'cancelled', 'returned']
+
+
+def build_dataset(config):
+    rng = random.Random(config.seed)
+
+    admin = User.objects.create(username='bench-admin', is_staff=True, password='!')
+    users = User.objects.bulk_create([
+        User(username=f'bench-user-{i}', password='!') for i in range(config.users)
+    ])
+
+    categories = Category.objects.bulk_create([Category(name=name) for name in CATEGORY_NAMES])
+
+    products = Product.objects.bulk_create([
+        Product(
+            name=f'Product {i}',
+            price=Decimal(rng.randrange(100, 50000)) / 100,
+            category=rng.choice(categories),
+        )
+        for i in range(config.products)
+    ])
+
+    # Seasonal category rules, tiered percentage rules and the loyalty flat rule
+    rules = [
+        DiscountRule(
+            rule_type=DiscountRule.CATEGORY_BASED,
+            category=rng.choice(categories),
+            percentage=Decimal(rng.randrange(2, 15)),
+            min_quantity=rng.randrange(2, 6),
+        )
+        for _ in range(config.category_rules)
+    ]
+    rules += [
+        DiscountRule(
+            rule_type=DiscountRule.PERCENTAGE,
+            threshold=Decimal(2500 * (tier + 1)),
+            percentage=Decimal(5 * (tier + 1)),
+        )
+        for tier in range(config.percentage_rules)
+    ]
+    rules.append(DiscountRule(rule_type=DiscountRule.FLAT, flat_amount=Decimal('500')))
+    # Flash sales of a few hours each over four weeks around now; few are live at once
+    now = timezone.now()
+    for _ in range(config.scheduled_rules):
+        starts_at = now + timedelta(hours=rng.randrange(-14 * 24, 14 * 24))
+        rules.append(DiscountRule(
+            rule_type=DiscountRule.CATEGORY_BASED,
+            category=rng.choice(categories),
+            percentage=Decimal(rng.randrange(10, 40)),
+            min_quantity=1,
+            starts_at=starts_at,
+            ends_at=starts_at + timedelta(hours=rng.randrange(1, 7)),
+        ))
+    DiscountRule.objects.bulk_create(rules)
+    bump_rules_version()
+
+    orders, order_items = [], []
+    for user in users:
+        for _ in range(config.orders_per_user):
+            lines = [
+                (rng.choice(products), rng.randrange(1, 4))
+                for _ in range(rng.randrange(1, config.max_items_per_order + 1))
+            ]
+            summary = summarize((product.category_id, quantity, product.price) for product, quantity in lines)
+            order = Order(
+                user=user,
+                status=rng.choice(HISTORY_STATUSES),
+                subtotal=summary.total,
+                final_total=summary.total,
+                total_quantity=summary.quantity,
+            )
+            orders.append(order)
+            order_items.append(lines)
+
+    Order.objects.bulk_create(orders, batch_size=1000)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product=product, quantity=quantity, price_at_purchase=product.price)
+        for order, lines in zip(orders, order_items)
+        for product, quantity in lines
+    ], batch_size=1000)
+    CustomerLoyalty.rebuild([user.id for user in users])
+
+    return Dataset(
+        admin=admin,
+        users=users,
+        product_ids=[product.id for product in products],
+        order_ids=[order.id for order in orders],
+    )
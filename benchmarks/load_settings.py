@@ -0,0 +1,34 @@
+"""
+benchmarks/load_settings.py
+
+Settings for the load test's server workers (see benchmarks/server.py): the
+project settings pointed at the load test's throwaway database, with DEBUG
+off (as in production, so no query log) and without read replicas.
+`manage.py run_load_test` sets ORDER_ENGINE_LOAD_DB and ORDER_ENGINE_LOAD_RUN.
+"""
+import os
+
+from order_engine.settings import *  # noqa: F401,F403
+from order_engine.settings import CACHES, DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+DATABASES = {
+    'default': {**DATABASES['default'], 'NAME': os.environ['ORDER_ENGINE_LOAD_DB']},
+}
+DATABASE_REPLICAS = []
+
+# A shared cache backend may hold entries from the real database (or an
+# earlier run) under the same order ids; keep this run's keys apart
+CACHES = {
+    'default': {**CACHES['default'], 'KEY_PREFIX': f"order_engine-load-{os.environ['ORDER_ENGINE_LOAD_RUN']}"},
+}
+
+# With DEBUG off Django logs nothing to the console; server errors are worth seeing
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'django.request': {'handlers': ['console'], 'level': 'ERROR'}},
+}
@@ -0,0 +1,69 @@
+"""
+benchmarks/runner.py
+
+Times a scenario and collects latency percentiles, throughput and query
+counts.
+"""
+import subprocess
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(operation, iterations, warmup=5, before_each=None):
+    """
+    Run `operation` `warmup` times untimed, then `iterations` times timed.
+
+    `before_each`, if given, runs before every call outside the timed region
+    (e.g. to clear a cache). Returns a dict of results; latencies are in
+    milliseconds.
+    """
+    for _ in range(warmup):
+        if before_each:
+            before_each()
+        operation()
+
+    latencies = []
+    queries = []
+    for _ in range(iterations):
+        if before_each:
+            before_each()
+        # The log keeps at most 9000 queries; once full, captures come back empty
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            operation()
+            latencies.append(time.perf_counter() - start)
+        queries.append(len(captured.captured_queries))
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'iterations': iterations,
+        'throughput_per_s': round(iterations / total, 2) if total else None,
+        'mean_ms': round(total / iterations * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'queries_mean': round(sum(queries) / iterations, 2),
+        'queries_max': max(queries),
+    }
+
+
+def git_commit():
+    # Recorded with every result, so runs from different commits can be told apart
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
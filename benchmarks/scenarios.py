@@ -0,0 +1,108 @@
+"""
+benchmarks/scenarios.py
+
+The benchmarked operations. Each scenario drives OrderViewSet (or the
+discount engine directly) in-process through DRF's request factory, so the
+numbers cover routing-free view, serializer and ORM cost.
+"""
+import random
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.discounts import apply_discounts
+from core.models import CustomerLoyalty, Order
+from core.rollups import rebuild_shard
+from core.views import OrderViewSet, reports
+
+factory = APIRequestFactory()
+
+create_view = OrderViewSet.as_view({'post': 'create'})
+list_view = OrderViewSet.as_view({'get': 'list'})
+retrieve_view = OrderViewSet.as_view({'get': 'retrieve'})
+update_status_view = OrderViewSet.as_view({'patch': 'update_status'})
+bulk_update_status_view = OrderViewSet.as_view({'patch': 'bulk_update_status'})
+
+
+def _call(view, request, user, expected_status, **kwargs):
+    force_authenticate(request, user=user)
+    response = view(request, **kwargs)
+    response.render()
+    if response.status_code != expected_status:
+        raise RuntimeError(f"{request.method} {request.path} returned {response.status_code}: {response.data}")
+    return response
+
+
+def build_scenarios(dataset, seed=1234):
+    """
+    Return {name: (operation, before_each)} for the dataset.
+    """
+    rng = random.Random(seed)
+    # A fixed sample, so "cached" scenarios actually hit warm entries
+    sample_ids = rng.sample(dataset.order_ids, min(50, len(dataset.order_ids)))
+
+    def create():
+        items = [
+            {'product_id': rng.choice(dataset.product_ids), 'quantity': rng.randrange(1, 4), 'price_at_purchase': '0'}
+            for _ in range(rng.randrange(1, 9))
+        ]
+        request = factory.post('/api/orders/', {'items': items}, format='json')
+        _call(create_view, request, rng.choice(dataset.users), 201)
+
+    def list_orders():
+        _call(list_view, factory.get('/api/orders/'), dataset.admin, 200)
+
+    def retrieve():
+        order_id = rng.choice(sample_ids)
+        _call(retrieve_view, factory.get(f'/api/orders/{order_id}/'), dataset.admin, 200, pk=order_id)
+
+    # Status scenarios toggle open orders between 'placed' and 'delayed', which
+    # the transition table allows both ways; start them all from 'placed'.
+    open_ids = sample_ids[:20]
+    Order.objects.filter(pk__in=open_ids).update(status='placed')
+    CustomerLoyalty.rebuild(list(Order.objects.filter(pk__in=open_ids).values_list('user_id', flat=True).distinct()))
+    statuses = dict.fromkeys(open_ids, 'placed')
+
+    def update_status():
+        order_id = rng.choice(open_ids)
+        new_status = 'placed' if statuses[order_id] == 'delayed' else 'delayed'
+        request = factory.patch(f'/api/orders/{order_id}/update-status/', {'status': new_status}, format='json')
+        _call(update_status_view, request, dataset.admin, 200, pk=order_id)
+        statuses[order_id] = new_status
+
+    bulk_state = {'status': 'placed'}
+
+    def bulk_update_status():
+        new_status = 'placed' if bulk_state['status'] == 'delayed' else 'delayed'
+        request = factory.patch('/api/orders/update-status/', {'ids': open_ids, 'status': new_status}, format='json')
+        _call(bulk_update_status_view, request, dataset.admin, 200)
+        statuses.update(dict.fromkeys(open_ids, new_status))
+        bulk_state['status'] = new_status
+
+    orders = list(Order.objects.filter(pk__in=sample_ids))
+
+    def discounts():
+        apply_discounts(rng.choice(orders))
+
+    # The dataset is written in bulk, so roll its history up once
+    bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+    since, until = (timezone.localdate(bounds[name]) for name in ('first', 'last'))
+    rebuild_shard(since, until)
+
+    def report():
+        request = factory.get('/api/reports/', {'since': since.isoformat(), 'until': until.isoformat()})
+        _call(reports, request, dataset.admin, 200)
+
+    return {
+        'create': (create, None),
+        'list': (list_orders, cache.clear),
+        'list_cached': (list_orders, None),
+        'retrieve': (retrieve, cache.clear),
+        'retrieve_cached': (retrieve, None),
+        'update_status': (update_status, None),
+        'bulk_update_status': (bulk_update_status, None),
+        'apply_discounts': (discounts, None),
+        'reports': (report, None),
+    }
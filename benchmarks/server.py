@@ -0,0 +1,162 @@
+"""
+benchmarks/server.py
+
+Serves order_engine.wsgi or order_engine.asgi for the load test:
+
+    python -m benchmarks.server {wsgi,asgi} PORT [--threads N]
+
+Several workers can listen on the same port (SO_REUSEPORT), and the kernel
+spreads connections across them, like a pre-fork server. WSGI requests are
+handled on a fixed pool of threads (like gunicorn's gthread worker); ASGI
+requests on one event loop per worker. Only the standard library is used, so
+the load test runs offline; each connection carries one request (the driver
+sends `Connection: close`).
+
+Prints "ready" once the application is built and warmed up (see
+order_engine/wsgi.py) and the port is open.
+"""
+import argparse
+import asyncio
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+HOST = '127.0.0.1'
+# Pending connections the kernel queues per worker
+BACKLOG = 1024
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    wsgiref's server, handling each connection on a fixed pool of threads.
+    """
+    request_queue_size = BACKLOG
+
+    def __init__(self, port, threads):
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='request')
+        super().__init__((HOST, port), QuietHandler)
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve_wsgi(port, threads):
+    from order_engine.wsgi import application
+
+    server = PooledWSGIServer(port, threads)
+    server.set_app(application)
+    print('ready', flush=True)
+    server.serve_forever()
+
+
+async def handle_asgi(application, port, reader, writer):
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+        request_line, *lines = head[:-4].decode('latin-1').split('\r\n')
+        method, target, _ = request_line.split(' ', 2)
+        headers = []
+        for line in lines:
+            name, _, value = line.partition(':')
+            headers.append((name.strip().lower().encode('latin-1'), value.strip().encode('latin-1')))
+        body = await reader.readexactly(int(dict(headers).get(b'content-length', b'0')))
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        writer.close()
+        return
+
+    path, _, query = target.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': unquote(path),
+        'raw_path': path.encode('latin-1'),
+        'query_string': query.encode('latin-1'),
+        'root_path': '',
+        'headers': headers,
+        'client': writer.get_extra_info('peername')[:2],
+        'server': (HOST, port),
+    }
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # Client disconnects are not detected; Django cancels this wait once
+        # the response is sent
+        await asyncio.get_running_loop().create_future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            try:
+                reason = HTTPStatus(status).phrase
+            except ValueError:
+                reason = ''
+            lines = [f'HTTP/1.1 {status} {reason}'.encode('latin-1')]
+            lines += [name + b': ' + value for name, value in message.get('headers', ())]
+            lines.append(b'Connection: close')
+            writer.write(b'\r\n'.join(lines) + b'\r\n\r\n')
+        elif message['type'] == 'http.response.body':
+            writer.write(message.get('body', b''))
+        await writer.drain()
+
+    try:
+        await application(scope, receive, send)
+    finally:
+        writer.close()
+
+
+async def serve_asgi(port):
+    from order_engine.asgi import application
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, port))
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_asgi(application, port, reader, writer), sock=sock, backlog=BACKLOG
+    )
+    print('ready', flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the order engine for the load test.")
+    parser.add_argument('interface', choices=['wsgi', 'asgi'])
+    parser.add_argument('port', type=int)
+    parser.add_argument('--threads', type=int, default=8, help="Request threads per WSGI worker (default: 8).")
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.load_settings')
+    if args.interface == 'wsgi':
+        serve_wsgi(args.port, args.threads)
+    else:
+        asyncio.run(serve_asgi(args.port))
+
+
+if __name__ == '__main__':
+    main()
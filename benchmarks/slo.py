@@ -0,0 +1,124 @@
+"""
+benchmarks/slo.py
+
+Service level objectives the load test is checked against, and the summary
+of a run they are checked on.
+
+Each operation of the traffic mix (see benchmarks/traffic.py) has latency
+and error rate objectives; 'total' covers every request together. A run
+fails when any objective is missed, so releases can be gated on
+`manage.py run_load_test`. Objectives can be overridden per operation from a
+JSON file of the same shape:
+
+    {"create": {"p95_ms": 400}, "total": {"min_throughput_per_s": 150}}
+
+Throughput depends on the machine, so no minimum is declared by default.
+"""
+import json
+from dataclasses import dataclass, fields, replace
+
+from .runner import percentile
+
+
+@dataclass(frozen=True)
+class SLO:
+    p95_ms: float = None
+    p99_ms: float = None
+    max_error_rate: float = 0.001
+    min_throughput_per_s: float = None
+
+
+DEFAULT_SLOS = {
+    # Hashing the new password (PBKDF2) dominates a signup
+    'signup': SLO(p95_ms=2500, p99_ms=5000),
+    'create': SLO(p95_ms=1000, p99_ms=2000),
+    'list': SLO(p95_ms=500, p99_ms=1000),
+    'retrieve': SLO(p95_ms=300, p99_ms=600),
+    'update_status': SLO(p95_ms=300, p99_ms=600),
+    'total': SLO(),
+}
+
+
+def load_slos(path=None):
+    """
+    DEFAULT_SLOS, with the objectives in the JSON file at `path` replacing
+    the defaults they name. Raises ValueError on unknown objectives.
+    """
+    slos = dict(DEFAULT_SLOS)
+    if path is None:
+        return slos
+    with open(path) as f:
+        overrides = json.load(f)
+    names = {field.name for field in fields(SLO)}
+    for operation, objectives in overrides.items():
+        unknown = set(objectives) - names
+        if unknown:
+            raise ValueError(f"Unknown objectives for {operation}: {', '.join(sorted(unknown))}")
+        slos[operation] = replace(slos.get(operation, SLO()), **objectives)
+    return slos
+
+
+def _stats(latencies, outcomes, errors, seconds):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'throughput_per_s': round(count / seconds, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        'errors': errors,
+        'error_rate': round(errors / count, 5) if count else 0.0,
+        'outcomes': dict(sorted(outcomes.items())),
+    }
+
+
+def summarize(results, seconds):
+    """
+    Merge the results of every driver process (see traffic.run) into
+    {operation: stats}, plus 'total' over all requests. `seconds` is the
+    length of the measured window.
+    """
+    merged = {}
+    for result in results:
+        for operation, measured in result.items():
+            into = merged.setdefault(operation, {'latencies': [], 'outcomes': {}, 'errors': 0})
+            into['latencies'] += measured['latencies']
+            into['errors'] += measured['errors']
+            for outcome, count in measured['outcomes'].items():
+                into['outcomes'][outcome] = into['outcomes'].get(outcome, 0) + count
+
+    summary = {
+        operation: _stats(measured['latencies'], measured['outcomes'], measured['errors'], seconds)
+        for operation, measured in sorted(merged.items())
+    }
+    outcomes = {}
+    for measured in merged.values():
+        for outcome, count in measured['outcomes'].items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    summary['total'] = _stats(
+        [latency for measured in merged.values() for latency in measured['latencies']],
+        outcomes, sum(measured['errors'] for measured in merged.values()), seconds,
+    )
+    return summary
+
+
+def check(summary, slos):
+    """
+    Returns a description of every objective `summary` misses.
+    """
+    missed = []
+    for operation, slo in slos.items():
+        stats = summary.get(operation)
+        if stats is None or not stats['requests']:
+            continue
+        for key in ('p95_ms', 'p99_ms'):
+            target = getattr(slo, key)
+            if target is not None and stats[key] > target:
+                missed.append(f"{operation} {key[:3]} {stats[key]:g} ms > {target:g} ms")
+        if slo.max_error_rate is not None and stats['error_rate'] > slo.max_error_rate:
+            missed.append(f"{operation} error rate {stats['error_rate']:.2%} > {slo.max_error_rate:.2%}")
+        if slo.min_throughput_per_s is not None and stats['throughput_per_s'] < slo.min_throughput_per_s:
+            missed.append(f"{operation} throughput {stats['throughput_per_s']:g}/s < {slo.min_throughput_per_s:g}/s")
+    return missed
@@ -0,0 +1,244 @@
+"""
+benchmarks/traffic.py
+
+The load test's traffic. Virtual users act like logged-in browsers (session
+cookie plus CSRF token) and loop over a weighted mix of requests against a
+running server, each timing its own requests: customers create orders of
+varied cart sizes, list and retrieve them and occasionally sign up someone
+new; admins move open orders between statuses. Their sessions are created
+up front (see run_load_test), so password hashing at login does not crowd
+out the measured traffic; signups still pay for it.
+
+Plain asyncio and sockets, no Django, so it also runs in the driver processes
+of a process pool. `run(plan)` drives one process's share of the virtual users
+and returns what it measured.
+"""
+import asyncio
+import json
+import random
+import string
+import time
+import uuid
+from dataclasses import dataclass
+
+USER_MIX = (('create', 35), ('list', 25), ('retrieve', 35), ('signup', 5))
+ADMIN_MIX = (('update_status', 80), ('list', 10), ('retrieve', 10))
+
+# (fewest, most, weight) distinct products per cart
+CART_SIZES = ((1, 2, 50), (3, 8, 35), (9, 40, 15))
+
+# Statuses counted as successes. A 409 on a status update is two admins racing
+# for the same order, which the API reports by design.
+EXPECTED_STATUSES = {
+    'signup': {201},
+    'create': {201},
+    'list': {200},
+    'retrieve': {200},
+    'update_status': {200, 409},
+}
+
+# Order ids a customer remembers to retrieve later
+KNOWN_ORDERS = 50
+
+
+@dataclass
+class Plan:
+    """
+    One driver process's share of the load; plain data, so it pickles.
+    """
+    port: int
+    customer_sessions: list
+    admin_sessions: list
+    password: str
+    product_ids: list
+    open_order_ids: list
+    start_at: float
+    measure_from: float
+    stop_at: float
+    think_time: float
+    timeout: float
+    seed: int
+    first_user: int = 0
+    host: str = '127.0.0.1'
+
+
+async def fetch(host, port, method, path, headers, body):
+    """
+    Send one request on a fresh connection; returns (status, [(header, value)], body).
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        head = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close']
+        head += [f'{name}: {value}' for name, value in headers.items()]
+        head.append(f'Content-Length: {len(body)}')
+        writer.write('\r\n'.join(head).encode('latin-1') + b'\r\n\r\n' + body)
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    if not head:
+        raise ConnectionError("empty response")
+    status_line, *lines = head.decode('latin-1').split('\r\n')
+    return int(status_line.split()[1]), [line.split(':', 1) for line in lines], content
+
+
+class Client:
+    """
+    A browser-like session: keeps cookies and sends the CSRF token on writes.
+    """
+
+    def __init__(self, plan, session_key=None, rng=random):
+        self.plan = plan
+        # Django accepts any well-formed CSRF secret the client holds, as long
+        # as the header repeats it
+        self.cookies = {'csrftoken': ''.join(rng.choices(string.ascii_letters + string.digits, k=32))}
+        if session_key:
+            self.cookies['sessionid'] = session_key
+
+    async def request(self, method, path, data=None, headers=None):
+        headers = dict(headers or {})
+        headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if method != 'GET':
+            headers['X-CSRFToken'] = self.cookies['csrftoken']
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        status, response_headers, content = await asyncio.wait_for(
+            fetch(self.plan.host, self.plan.port, method, path, headers, body), self.plan.timeout
+        )
+        for name, value in response_headers:
+            if name.strip().lower() == 'set-cookie':
+                name, _, value = value.split(';', 1)[0].partition('=')
+                self.cookies[name.strip()] = value.strip()
+        return status, content
+
+
+class Recorder:
+    """
+    Latencies and outcomes per operation, for requests started inside the
+    measured window.
+    """
+
+    def __init__(self, since, until):
+        self.since = since
+        self.until = until
+        self.results = {}
+
+    async def timed(self, name, operation):
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            status = await operation()
+            outcome = str(status)
+            error = status not in EXPECTED_STATUSES[name]
+        except (OSError, asyncio.TimeoutError, ValueError) as exc:
+            status, outcome, error = None, type(exc).__name__, True
+        latency = time.perf_counter() - start
+        if self.since <= started < self.until:
+            result = self.results.setdefault(name, {'latencies': [], 'outcomes': {}, 'errors': 0})
+            result['latencies'].append(latency)
+            result['outcomes'][outcome] = result['outcomes'].get(outcome, 0) + 1
+            result['errors'] += error
+        return status
+
+
+def choose(rng, mix):
+    return rng.choices([name for name, _ in mix], [weight for _, weight in mix])[0]
+
+
+def cart(rng, product_ids):
+    fewest, most = rng.choices(
+        [(fewest, most) for fewest, most, _ in CART_SIZES], [weight for _, _, weight in CART_SIZES]
+    )[0]
+    products = rng.sample(product_ids, min(len(product_ids), rng.randint(fewest, most)))
+    return [
+        {'product_id': product_id, 'quantity': rng.randrange(1, 4), 'price_at_purchase': '0'}
+        for product_id in products
+    ]
+
+
+class VirtualUser:
+    def __init__(self, plan, recorder, number, session_key, mix):
+        self.plan = plan
+        self.recorder = recorder
+        self.number = number
+        self.mix = mix
+        self.rng = random.Random(plan.seed * 100003 + number)
+        self.client = Client(plan, session_key, self.rng)
+        self.order_ids = []
+        self.signups = 0
+        # What this admin last saw each open order at; other admins move them too
+        self.statuses = dict.fromkeys(plan.open_order_ids, 'placed')
+
+    async def run(self):
+        while time.time() < self.plan.stop_at:
+            operation = choose(self.rng, self.mix)
+            await self.recorder.timed(operation, getattr(self, operation))
+            if self.plan.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.plan.think_time))
+
+    def remember(self, order_ids):
+        self.order_ids = (order_ids + self.order_ids)[:KNOWN_ORDERS]
+
+    async def create(self):
+        status, content = await self.client.request(
+            'POST', '/api/orders/', data={'items': cart(self.rng, self.plan.product_ids)},
+            headers={'Idempotency-Key': str(uuid.UUID(int=self.rng.getrandbits(128)))},
+        )
+        if status == 201:
+            self.remember([json.loads(content)['id']])
+        return status
+
+    async def list(self):
+        status, content = await self.client.request('GET', '/api/orders/')
+        if status == 200:
+            self.remember([order['id'] for order in json.loads(content)['results']])
+        return status
+
+    async def retrieve(self):
+        if not self.order_ids:
+            return await self.list()
+        status, _ = await self.client.request('GET', f'/api/orders/{self.rng.choice(self.order_ids)}/')
+        return status
+
+    async def signup(self):
+        self.signups += 1
+        anonymous = Client(self.plan, rng=self.rng)
+        status, _ = await anonymous.request('POST', '/api/signup/', data={
+            'username': f'load-user-{self.plan.seed}-{self.number}-{self.signups}',
+            'password': self.plan.password,
+        })
+        return status
+
+    async def update_status(self):
+        order_id = self.rng.choice(self.plan.open_order_ids)
+        new_status = 'placed' if self.statuses[order_id] == 'delayed' else 'delayed'
+        status, _ = await self.client.request(
+            'PATCH', f'/api/orders/{order_id}/update-status/', data={'status': new_status}
+        )
+        if status in (200, 409):
+            # On a 409 another admin got there first, so it already has that status
+            self.statuses[order_id] = new_status
+        return status
+
+
+async def drive(plan):
+    recorder = Recorder(plan.measure_from, plan.stop_at)
+    await asyncio.sleep(max(0.0, plan.start_at - time.time()))
+    sessions = [(key, USER_MIX) for key in plan.customer_sessions]
+    sessions += [(key, ADMIN_MIX) for key in plan.admin_sessions]
+    users = [
+        VirtualUser(plan, recorder, plan.first_user + index, key, mix)
+        for index, (key, mix) in enumerate(sessions)
+    ]
+    await asyncio.gather(*(user.run() for user in users))
+    return recorder.results
+
+
+def run(plan):
+    """
+    Entry point of a driver process: drive `plan` and return
+    {operation: {'latencies': [seconds], 'outcomes': {status: count}, 'errors': count}}.
+    """
+    return asyncio.run(drive(plan))
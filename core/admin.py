@@ -1,13 +1,89 @@
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Category, DiscountRule
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseNotAllowed
+from django.shortcuts import redirect
+from django.urls import path
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Category, DiscountJob, DiscountRule, Order
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name']
 
+class LiveAtFilter(admin.SimpleListFilter):
+    """
+    Preview the rules that apply to orders placed at a given time: one of
+    the presets, or any datetime in the URL, e.g. ?live_at=2025-11-28T18:00.
+    """
+    title = "live at"
+    parameter_name = 'live_at'
+    OFFSETS = {
+        'now': ("Now", timedelta(0)),
+        '1h': ("In 1 hour", timedelta(hours=1)),
+        '1d': ("In 1 day", timedelta(days=1)),
+        '7d': ("In 7 days", timedelta(days=7)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, (label, _) in self.OFFSETS.items()]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if value in self.OFFSETS:
+            return queryset.live_at(timezone.now() + self.OFFSETS[value][1])
+        moment = parse_datetime(value)
+        if moment is None:
+            raise IncorrectLookupParameters(f"Invalid live_at time: '{value}'.")
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return queryset.live_at(moment)
+
 @admin.register(DiscountRule)
 class DiscountRuleAdmin(admin.ModelAdmin):
-    list_display = ['rule_type', 'active', 'threshold', 'percentage', 'flat_amount', 'category', 'min_quantity']
-    list_filter = ['rule_type', 'active']
+    list_display = [
+        'rule_type', 'active', 'live_now', 'starts_at', 'ends_at', 'threshold', 'percentage', 'flat_amount',
+        'category', 'min_quantity',
+    ]
+    list_filter = [LiveAtFilter, 'rule_type', 'active']
+    filter_horizontal = ['bundle_categories']
+    raw_id_fields = ['user']
     search_fields = ['rule_type']
 
+    @admin.display(boolean=True, description="Live now")
+    def live_now(self, rule):
+        return rule.is_live_at(timezone.now())
+
+    def get_urls(self):
+        return [
+            path('recalculate/', self.admin_site.admin_view(self.recalculate_open_orders),
+                 name='core_discountrule_recalculate'),
+        ] + super().get_urls()
+
+    def recalculate_open_orders(self, request):
+        """
+        Queue every open order for recalculation after the rules changed; the
+        "Recalculate all open orders" button on the rule list posts here.
+        """
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        order_ids = Order.objects.filter(
+            status__in=DiscountJob.RECALCULABLE_STATUSES
+        ).values_list('id', flat=True)
+        queued = DiscountJob.enqueue(order_ids.iterator(chunk_size=5000))
+        self.message_user(request, f"Queued {queued} orders; run `manage.py run_discount_worker` to process them.")
+        return redirect('admin:core_discountrule_changelist')
+
+@admin.register(DiscountJob)
+class DiscountJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'order', 'status', 'attempts', 'created_at', 'claimed_at']
+    list_filter = ['status']
+    readonly_fields = ['order', 'worker', 'error', 'created_at', 'claimed_at']
+
@@ -0,0 +1,198 @@
+"""
+core/async_views.py
+
+Async-native order read paths: list, retrieve and quote.
+
+Served under /api/async/ and meant for ASGI, where they run on the event
+loop instead of a thread per request. They use the async ORM and cache
+APIs and return the same representations as OrderViewSet; serialization of
+orders that miss the cache runs in a worker thread on prefetched data, so
+it never touches the database or blocks the loop. Writes stay on the sync
+OrderViewSet.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import aprefetch_related_objects
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication, CSRFCheck
+from rest_framework.permissions import SAFE_METHODS
+
+from . import catalog, order_cache, routing
+from .discounts import (
+    LOYALTY_MIN_ORDERS, QUOTE_CACHE_TIMEOUT, aget_rule_set, aqualifying_order_count,
+    evaluate, normalize_cart, quote_cache_key, summarize,
+)
+from .instrumentation import phase
+from .models import Order, display_prefetches
+from .pagination import ORDERING, OrderCursorPagination, after_position, decode_position, encode_position
+from .serializers import OrderSerializer, QuoteSerializer, quote_representation
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def _csrf_failure(request):
+    # Same check DRF's SessionAuthentication applies to session users
+    check = CSRFCheck(lambda request: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
+
+
+async def authenticate(request):
+    """
+    Return the user for `request` from the session or HTTP Basic credentials,
+    like the DRF views (session users must pass the CSRF check on unsafe
+    methods); None if the request is not authenticated.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        if request.method not in SAFE_METHODS and _csrf_failure(request):
+            raise exceptions.PermissionDenied('CSRF Failed')
+        return user
+    if request.headers.get('Authorization', '').lower().startswith('basic '):
+        result = await sync_to_async(BasicAuthentication().authenticate)(request)
+        if result:
+            return result[0]
+    return None
+
+
+def authenticated(view):
+    """
+    Decorator for the async views: resolves the user into `request.user` or
+    answers 401/403 like DRF's IsAuthenticated.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user = await authenticate(request)
+        except exceptions.APIException as exc:
+            return error(str(exc.detail), exc.status_code)
+        if user is None:
+            return error('Authentication credentials were not provided.', 401)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def visible_orders(user):
+    queryset = Order.objects.all() if user.is_staff else Order.objects.filter(user=user)
+    return queryset.select_related('user')
+
+
+def _serialize(orders):
+    return {order.pk: OrderSerializer(order).data for order in orders}
+
+
+async def render_orders(orders):
+    """
+    Async counterpart of OrderViewSet.serialize_orders.
+    """
+    data = await order_cache.aget_orders(orders)
+    misses = [order for order in orders if order.pk not in data]
+    if misses:
+        with phase('serialize'):
+            await aprefetch_related_objects(misses, *display_prefetches())
+            fresh = await sync_to_async(_serialize, thread_sensitive=False)(misses)
+        await order_cache.aset_orders(misses, fresh)
+        data.update(fresh)
+    return [data[order.pk] for order in orders]
+
+
+"""This function lists the orders visible to the user, newest first. Pages are linked
+through an opaque `cursor`; `page_size` is bounded like the sync list endpoint.
+
+Route: GET /async/orders/?cursor=<cursor>&page_size=<n>
+"""
+@require_GET
+@authenticated
+async def order_list(request):
+    pagination = OrderCursorPagination
+    try:
+        page_size = min(int(request.GET.get('page_size', pagination.page_size)), pagination.max_page_size)
+    except ValueError:
+        page_size = pagination.page_size
+    page_size = max(page_size, 1)
+
+    routing.read_from_replica(request)
+    queryset = visible_orders(request.user).order_by(*ORDERING)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            created_at, pk, reverse = decode_position(cursor)
+        except ValueError:
+            return error('Invalid cursor', 404)
+        if reverse:
+            # This list only links forward
+            return error('Invalid cursor', 404)
+        queryset = after_position(queryset, created_at, pk)
+
+    orders = [order async for order in queryset[:page_size + 1]]
+    next_url = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        params = request.GET.copy()
+        params['cursor'] = encode_position(orders[-1])
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    return JsonResponse({'next': next_url, 'results': await render_orders(orders)})
+
+
+"""This function returns a single order visible to the user, through the order cache.
+
+Route: GET /async/orders/<id>/
+"""
+@require_GET
+@authenticated
+async def order_detail(request, pk):
+    routing.read_from_replica(request)
+    try:
+        order = await visible_orders(request.user).aget(pk=pk)
+    except Order.DoesNotExist:
+        return error('No Order matches the given query.', 404)
+    return JsonResponse((await render_orders([order]))[0])
+
+
+"""This function previews the discounts and final price of a cart, like POST /orders/quote/.
+
+Route: POST /async/orders/quote/
+Body: {"items": [{"product_id": 1, "quantity": 2}, ...]}
+"""
+@csrf_exempt
+@require_POST
+@authenticated
+async def order_quote(request):
+    try:
+        payload = json.loads(request.body or b'null')
+    except ValueError:
+        return error('JSON parse error', 400)
+    serializer = QuoteSerializer(data=payload)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    cart = normalize_cart(serializer.validated_data['items'])
+    loyalty_user = await aqualifying_order_count(request.user.id) >= LOYALTY_MIN_ORDERS
+    rule_set = await aget_rule_set()
+    cache_key = quote_cache_key(cart, loyalty_user, rule_set, request.user.id)
+
+    data = await cache.aget(cache_key)
+    if data is None:
+        products = await catalog.aresolve(product_id for product_id, _ in cart)
+        missing = [product_id for product_id, _ in cart if product_id not in products]
+        if missing:
+            return JsonResponse({"error": f"Invalid product ids: {', '.join(map(str, missing))}"}, status=400)
+
+        summary = summarize(
+            (products[product_id].category_id, quantity, products[product_id].price)
+            for product_id, quantity in cart
+        )
+        data = quote_representation(summary, evaluate(rule_set, summary, loyalty_user, request.user.id))
+        await cache.aset(cache_key, data, timeout=QUOTE_CACHE_TIMEOUT)
+
+    return JsonResponse(data)
@@ -0,0 +1,252 @@
+"""
+core/catalog.py
+
+Product lookups for order validation and pricing.
+
+`resolve` maps a batch of product ids to their (price, category id) with at
+most one `in_bulk` query, backed by a bounded, process-local LRU cache.
+Product save/delete records a CatalogChange for that product in the same
+transaction (see core/signals.py); each process reads the changes recorded
+since it last looked at most once per settings.VERSION_CHECK_INTERVAL
+seconds and drops only those products, so editing one product leaves the
+rest of every cache warm. `bump_catalog_version` records a change for the
+whole catalog, for bulk edits that send no signals.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CatalogChange, Product
+
+# Each process re-reads the changes recorded within this window before its
+# last read, so a change is seen as long as the transaction that recorded it
+# commits within the window (and server clocks agree to within it)
+CHANGE_GRACE = timedelta(minutes=1)
+# Changes are deleted after this long; a process that has not looked for
+# longer drops its whole cache instead
+CHANGE_RETENTION = timedelta(days=1)
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    """
+    The parts of a product that pricing needs.
+    """
+    id: int
+    price: Decimal
+    category_id: int
+
+
+class ProductLRU:
+    """
+    Thread-safe LRU of CatalogEntry by product id, with hit/miss/eviction
+    counters. `generation` changes whenever entries are dropped, so entries
+    read from the database before a drop are not cached after it.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.generation = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, product_ids):
+        """
+        Return ({id: entry} for the cached ids, [ids not cached], generation).
+        """
+        found, missing = {}, []
+        with self._lock:
+            for product_id in product_ids:
+                entry = self._entries.get(product_id)
+                if entry is None:
+                    missing.append(product_id)
+                else:
+                    self._entries.move_to_end(product_id)
+                    found[product_id] = entry
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing, self.generation
+
+    def set_many(self, entries, generation):
+        with self._lock:
+            if generation != self.generation:
+                # Some product changed while these were being read
+                return
+            for entry in entries:
+                self._entries[entry.id] = entry
+                self._entries.move_to_end(entry.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, product_ids):
+        with self._lock:
+            self.generation += 1
+            for product_id in product_ids:
+                self._entries.pop(product_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class ChangeFeed:
+    """
+    Applies the CatalogChange rows recorded by every process to this
+    process's LRU.
+    """
+    def __init__(self):
+        self.checked = None  # monotonic time of the last read
+        self.synced_at = None  # wall-clock time of the last read
+        self.applied = {}  # {change id: changed_at} of the changes within the window
+        self._lock = threading.Lock()
+
+    def due(self):
+        return self.checked is None or time.monotonic() - self.checked >= settings.VERSION_CHECK_INTERVAL
+
+    def read(self):
+        """
+        Return (the time of this read, the changes to look at).
+        """
+        now = timezone.now()
+        since = (self.synced_at or now) - CHANGE_GRACE
+        changes = list(
+            CatalogChange.objects.filter(changed_at__gte=since).values_list('id', 'product_id', 'changed_at')
+        )
+        return now, changes
+
+    def apply(self, lru, now, changes):
+        with self._lock:
+            forget_all = self.synced_at is None or now - self.synced_at > CHANGE_RETENTION - CHANGE_GRACE
+            product_ids = set()
+            for change_id, product_id, changed_at in changes:
+                if change_id in self.applied:
+                    continue
+                self.applied[change_id] = changed_at
+                if product_id is None:
+                    forget_all = True
+                else:
+                    product_ids.add(product_id)
+            self.synced_at = max(now, self.synced_at or now)
+            cutoff = self.synced_at - CHANGE_GRACE
+            self.applied = {change_id: changed_at for change_id, changed_at in self.applied.items()
+                            if changed_at >= cutoff}
+            self.checked = time.monotonic()
+        if forget_all:
+            lru.clear()
+        elif product_ids:
+            lru.discard(product_ids)
+
+    def reset(self):
+        with self._lock:
+            self.checked = self.synced_at = None
+            self.applied = {}
+
+
+_products = ProductLRU(settings.CATALOG_CACHE_SIZE)
+_changes = ChangeFeed()
+
+
+def _sync():
+    _changes.apply(_products, *_changes.read())
+
+
+def record_changes(product_ids):
+    """
+    Make every process drop `product_ids` (None: every product), inside the
+    caller's transaction if there is one. This process drops them right away
+    and again on commit, in case another thread re-read them meanwhile.
+    """
+    now = timezone.now()
+    if product_ids is None:
+        CatalogChange.objects.create(changed_at=now)
+        drop = _products.clear
+    else:
+        product_ids = list(product_ids)
+        CatalogChange.objects.bulk_create([
+            CatalogChange(product_id=product_id, changed_at=now) for product_id in product_ids
+        ])
+        drop = partial(_products.discard, product_ids)
+    drop()
+    transaction.on_commit(drop)
+    CatalogChange.objects.filter(changed_at__lt=now - CHANGE_RETENTION).delete()
+
+
+def product_changed(product_id):
+    record_changes([product_id])
+
+
+def bump_catalog_version():
+    """
+    Drop the whole catalog in every process, e.g. after Product.objects.update().
+    """
+    record_changes(None)
+
+
+def clear():
+    """
+    Forget every entry and change this process has seen, as at start-up.
+    """
+    _changes.reset()
+    _products.clear()
+
+
+def _load(product_ids):
+    products = Product.objects.only('id', 'price', 'category').in_bulk(product_ids)
+    return [CatalogEntry(product.id, product.price, product.category_id) for product in products.values()]
+
+
+def resolve(product_ids):
+    """
+    Return {product id: CatalogEntry} for the ids in `product_ids` that
+    exist, querying only for the ones not cached in this process.
+    """
+    if _changes.due():
+        _sync()
+    found, missing, generation = _products.get_many(set(product_ids))
+    if missing:
+        loaded = _load(missing)
+        _products.set_many(loaded, generation)
+        found.update((entry.id, entry) for entry in loaded)
+    return found
+
+
+async def aresolve(product_ids):
+    """
+    Async version of resolve.
+    """
+    if _changes.due():
+        await sync_to_async(_sync)()
+    found, missing, generation = _products.get_many(set(product_ids))
+    if missing:
+        loaded = [
+            CatalogEntry(product.id, product.price, product.category_id)
+            async for product in Product.objects.only('id', 'price', 'category').filter(pk__in=missing)
+        ]
+        _products.set_many(loaded, generation)
+        found.update((entry.id, entry) for entry in loaded)
+    return found
+
+
+def stats():
+    return _products.stats()
@@ -0,0 +1,405 @@
+"""
+core/discounts.py
+
+Compiled discount rule engine.
+
+Active DiscountRule rows are loaded once into a RuleSchedule, which is
+cached per process and rebuilt only when the rules' version token (bumped
+from core/signals.py on DiscountRule save/delete, in the same transaction;
+see core/versions.py) changes. The schedule
+splits time at every rule's starts_at/ends_at; the rules live in each
+segment are compiled into an immutable, pre-indexed RuleSet the first time
+an order falls in it, so evaluation never looks at expired or future rules.
+
+Orders are evaluated against an in-memory OrderSummary built from a single
+query over their items, so the number of queries does not depend on the
+number of rules.
+"""
+import hashlib
+import threading
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import versions
+from .instrumentation import instrumented
+from .models import CustomerLoyalty, Discount, DiscountRule, Order, RollupEntry
+from .rule_types import CENT, RULE_TYPES, OrderContext, compile_rule, select
+
+# Quotes are cached briefly: product prices are not part of the cache key.
+QUOTE_CACHE_TIMEOUT = 30
+
+# Rules that ended longer ago than this are not loaded into the per-process
+# schedule; orders placed before then are priced with a one-off query.
+SCHEDULE_LOOKBACK = timedelta(days=30)
+
+# Loyalty program: users with at least this many completed/shipped orders.
+LOYALTY_STATUSES = Order.LOYALTY_STATUSES
+LOYALTY_MIN_ORDERS = 5
+
+
+@dataclass(frozen=True)
+class RuleSet:
+    """
+    Immutable, pre-indexed view of the discount rules live in one segment
+    of a RuleSchedule.
+
+    `indexes` holds (RuleType, index) for every rule type with live rules;
+    each type builds whatever index suits its lookups (e.g. percentage tiers
+    sorted by threshold for bisecting, category rules keyed by category id).
+    `personal_users` are the users some live rule is specific to.
+    """
+    version: str
+    indexes: tuple
+    personal_users: frozenset = frozenset()
+    segment: int = 0
+
+    @property
+    def cache_version(self):
+        # Changes whenever the rules change or a rule starts or ends
+        return f"{self.version}.{self.segment}"
+
+
+def compile_rules(rules, version='', segment=0):
+    """
+    Compile DiscountRule instances into a RuleSet, letting each registered
+    rule type index its own rules.
+
+    Incomplete rules (e.g. a percentage rule without a percentage) and rules
+    of unregistered types are dropped here, once, instead of being
+    re-checked on every order.
+    """
+    by_type = {}
+    for rule in sorted(rules, key=lambda rule: rule.id):
+        rule_type = RULE_TYPES.get(rule.rule_type)
+        if rule_type is not None and rule_type.applicable(rule):
+            by_type.setdefault(rule_type, []).append(compile_rule(rule, rule_type))
+
+    return RuleSet(
+        version=version,
+        segment=segment,
+        indexes=tuple((rule_type, rule_type.index(compiled)) for rule_type, compiled in by_type.items()),
+        personal_users=frozenset(
+            rule.user_id for rule_type, compiled in by_type.items() if rule_type.per_user for rule in compiled
+        ),
+    )
+
+
+class RuleSchedule:
+    """
+    Interval index over DiscountRule instances with validity windows.
+
+    `boundaries` holds every distinct starts_at/ends_at in order; between
+    two consecutive boundaries the set of live rules cannot change, so
+    `at(moment)` bisects to its segment and returns that segment's RuleSet,
+    compiling it (from the live rules only) the first time it is needed.
+    Rules that ended before `horizon` may be missing; see `covers`.
+    """
+    def __init__(self, rules, version='', horizon=None):
+        self.version = version
+        self.horizon = horizon
+        self.rules = tuple(rules)
+        self.boundaries = tuple(sorted({
+            moment for rule in self.rules for moment in (rule.starts_at, rule.ends_at) if moment is not None
+        }))
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def covers(self, moment):
+        return self.horizon is None or moment >= self.horizon
+
+    def at(self, moment):
+        segment = bisect_right(self.boundaries, moment)
+        rule_set = self._segments.get(segment)
+        if rule_set is None:
+            with self._lock:
+                rule_set = self._segments.get(segment)
+                if rule_set is None:
+                    rule_set = self._segments[segment] = self._compile_segment(segment)
+        return rule_set
+
+    def _compile_segment(self, segment):
+        if segment:
+            start = self.boundaries[segment - 1]
+            live = [rule for rule in self.rules if rule.is_live_at(start)]
+        else:
+            # Before the first boundary only rules without a start are live
+            live = [rule for rule in self.rules if rule.active and rule.starts_at is None]
+        return compile_rules(live, self.version, segment)
+
+
+def get_rules_version():
+    return versions.get(versions.RULES)
+
+
+def bump_rules_version():
+    versions.bump(versions.RULES)
+
+
+_schedule = None
+_schedule_lock = threading.Lock()
+
+
+def get_schedule():
+    """
+    Return the RuleSchedule for the current rule version, loading it on
+    first use and whenever a DiscountRule has been saved or deleted.
+    """
+    version = get_rules_version()
+    schedule = _schedule
+    if schedule is not None and schedule.version == version:
+        return schedule
+    return _load_schedule(version)
+
+
+def get_rule_set(at=None):
+    """
+    Return the compiled RuleSet of the rules live at `at` (default: now).
+    """
+    at = at or timezone.now()
+    schedule = get_schedule()
+    if not schedule.covers(at):
+        rules = DiscountRule.objects.live_at(at).select_related('category').prefetch_related('bundle_categories')
+        return compile_rules(rules, schedule.version)
+    return schedule.at(at)
+
+
+async def aget_rule_set(at=None):
+    """
+    Async version of get_rule_set; only a rebuild or a moment older than
+    the schedule leaves the event loop.
+    """
+    at = at or timezone.now()
+    version = await versions.aget(versions.RULES)
+    schedule = _schedule
+    if schedule is None or schedule.version != version or not schedule.covers(at):
+        return await sync_to_async(get_rule_set)(at)
+    return schedule.at(at)
+
+
+def _load_schedule(version):
+    global _schedule
+    with _schedule_lock:
+        if _schedule is None or _schedule.version != version:
+            horizon = timezone.now() - SCHEDULE_LOOKBACK
+            rules = (
+                DiscountRule.objects.filter(active=True)
+                .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=horizon))
+                .select_related('category').prefetch_related('bundle_categories')
+            )
+            _schedule = RuleSchedule(rules, version, horizon)
+        return _schedule
+
+
+@dataclass
+class OrderSummary:
+    """
+    Everything the rules need to know about an order's items.
+    """
+    total: Decimal
+    quantity: int
+    category_quantities: dict
+    category_totals: dict
+    category_min_prices: dict = field(default_factory=dict)
+
+
+def summarize(rows):
+    """
+    Build an OrderSummary in one pass over (category id, quantity, price) rows.
+    """
+    total = Decimal('0')
+    quantity = 0
+    category_quantities = {}
+    category_totals = {}
+    category_min_prices = {}
+
+    for category, item_quantity, price in rows:
+        line_total = price * item_quantity
+        total += line_total
+        quantity += item_quantity
+        category_quantities[category] = category_quantities.get(category, 0) + item_quantity
+        category_totals[category] = category_totals.get(category, Decimal('0')) + line_total
+        category_min_prices[category] = min(category_min_prices.get(category, price), price)
+
+    return OrderSummary(total, quantity, category_quantities, category_totals, category_min_prices)
+
+
+def load_order_summary(order):
+    rows = order.items.values_list('product__category_id', 'quantity', 'price_at_purchase')
+    return summarize(rows)
+
+
+def qualifying_order_count(user_id):
+    # Primary key lookup on the user's CustomerLoyalty row
+    return CustomerLoyalty.objects.filter(pk=user_id).values_list(
+        'qualifying_orders', flat=True
+    ).first() or 0
+
+
+async def aqualifying_order_count(user_id):
+    return await CustomerLoyalty.objects.filter(pk=user_id).values_list(
+        'qualifying_orders', flat=True
+    ).afirst() or 0
+
+
+def qualifies_for_loyalty(qualifying_orders, status):
+    # An order never counts towards its own loyalty discount
+    if status in LOYALTY_STATUSES:
+        qualifying_orders -= 1
+    return qualifying_orders >= LOYALTY_MIN_ORDERS
+
+
+def is_loyal(order):
+    return qualifies_for_loyalty(qualifying_order_count(order.user_id), order.status)
+
+
+def loyal_user_ids(user_ids):
+    """
+    Return the subset of `user_ids` that qualify for the loyalty program,
+    using one query for the whole batch.
+    """
+    return set(
+        CustomerLoyalty.objects.filter(pk__in=user_ids, qualifying_orders__gte=LOYALTY_MIN_ORDERS)
+        .values_list('pk', flat=True)
+    )
+
+
+def qualifying_order_counts(user_ids):
+    """
+    Return {user id: qualifying order count} for `user_ids` in one query;
+    users without a CustomerLoyalty row are left out.
+    """
+    return dict(
+        CustomerLoyalty.objects.filter(pk__in=user_ids).values_list('pk', 'qualifying_orders')
+    )
+
+
+def evaluate(rule_set, summary, loyalty_user, user_id=None):
+    """
+    Evaluate every rule in `rule_set` against an order summary.
+
+    Each rule type offers the discounts its rules qualify for and `select`
+    picks what applies (see core/rule_types.py): by default, buy X get Y,
+    category and bundle discounts stack, followed by the percentage discount
+    for the highest threshold reached, the user's best coupon and, for loyal
+    users, the flat discount.
+    """
+    order = OrderContext(summary, loyalty_user, user_id)
+    return select(
+        (
+            (rule_type, rule, amount)
+            for rule_type, index in rule_set.indexes
+            for rule, amount in rule_type.candidates(index, order)
+        ),
+        summary.total,
+    )
+
+
+def discount_rows(order, lines):
+    return [
+        Discount(
+            order=order,
+            discount_type=line.discount_type,
+            description=line.description,
+            amount=line.amount
+        )
+        for line in lines
+    ]
+
+
+def set_totals(order, summary, lines):
+    """
+    Set the denormalized totals on an in-memory order from its summary and
+    discount lines.
+    """
+    order.subtotal = summary.total
+    order.total_quantity = summary.quantity
+    order.discount_total = sum((line.amount for line in lines), Decimal('0'))
+    order.final_total = order.subtotal - order.discount_total
+
+
+@instrumented('apply_discounts')
+def apply_discounts(order):
+    """
+    (Re)calculate and persist the discounts for `order`.
+
+    Runs a fixed number of queries regardless of how many rules are active.
+    """
+    with transaction.atomic():
+        counted = order.status not in Order.NON_REVENUE_STATUSES
+        previous = []
+        if counted and order.discount_total:
+            # New orders have no discounts yet, so skip the read for them
+            previous = list(order.discounts.values_list('discount_type', 'amount'))
+        # Clear existing discounts (in case of re-calculation)
+        order.discounts.all().delete()
+
+        summary = load_order_summary(order)
+        lines = evaluate(get_rule_set(order.created_at), summary, is_loyal(order), order.user_id)
+
+        rows = discount_rows(order, lines)
+        Discount.objects.bulk_create(rows)
+        if counted:
+            RollupEntry.record(
+                RollupEntry.for_discounts(order, previous, sign=-1)
+                + RollupEntry.for_discounts(order, ((row.discount_type, row.amount) for row in rows))
+            )
+
+        # bulk_create skips the signals that maintain the totals, and the
+        # summary covers every item anyway, so store the totals outright.
+        set_totals(order, summary, lines)
+        Order.objects.filter(pk=order.pk).update(
+            subtotal=order.subtotal,
+            discount_total=order.discount_total,
+            final_total=order.final_total,
+            total_quantity=order.total_quantity,
+            version=F('version') + 1,
+        )
+    return lines
+
+
+def evaluate_bulk(orders, summaries):
+    """
+    Evaluate discounts for a batch of new, not yet saved orders.
+
+    `summaries` is parallel to `orders`. Loyalty is resolved with one grouped
+    query for the whole batch and each order's totals are set in memory;
+    returns the discount lines per order, in order. The orders are placed
+    now, so they share the rules live now.
+    """
+    rule_set = get_rule_set()
+    # New orders are 'placed', so they never count towards their own loyalty.
+    loyal_users = loyal_user_ids({order.user_id for order in orders})
+
+    results = []
+    for order, summary in zip(orders, summaries):
+        lines = evaluate(rule_set, summary, order.user_id in loyal_users, order.user_id)
+        set_totals(order, summary, lines)
+        results.append(lines)
+    return results
+
+
+def normalize_cart(items):
+    """
+    Reduce cart lines to a canonical tuple of (product_id, quantity), with
+    repeated products merged, so equivalent carts share a quote.
+    """
+    quantities = {}
+    for item in items:
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return tuple(sorted(quantities.items()))
+
+
+def quote_cache_key(cart, loyalty_user, rule_set, user_id):
+    digest = hashlib.sha1(repr(cart).encode()).hexdigest()
+    tier = 'loyal' if loyalty_user else 'regular'
+    if user_id in rule_set.personal_users:
+        # Users with personal rules (e.g. coupons) get quotes of their own
+        tier = f"{tier}_user{user_id}"
+    return f"quote_{rule_set.cache_version}_{tier}_{digest}"
@@ -0,0 +1,110 @@
+"""
+core/idempotency.py
+
+Idempotent order submission.
+
+A POST sent with an `Idempotency-Key` header claims the key by inserting an
+IdempotencyKey row in the same transaction that creates the orders, and
+stores the response there before committing. A retry with the same key
+gets the stored response back without validating, pricing or writing
+anything. A duplicate that arrives while the first request is still running
+blocks on the key's unique index (or, on SQLite, the write lock) until that
+request commits, then replays its response; if the first request fails,
+nothing was stored and the duplicate runs normally.
+
+Keys are scoped per user and kept for at least settings.IDEMPOTENCY_KEY_TTL.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(request):
+    body = json.dumps(request.data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _replay(record, request_fingerprint):
+    if record.fingerprint != request_fingerprint:
+        return Response(
+            {'error': f"This {HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(record.response, status=record.status_code)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def run_once(request, handler):
+    """
+    Return handler() (a DRF Response), or the stored response if the user
+    already sent a request with the same Idempotency-Key. Only successful
+    responses are stored; errors can be retried with the same key.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return handler()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {'error': f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    request_fingerprint = fingerprint(request)
+    stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+    if stored is not None:
+        return _replay(stored, request_fingerprint)
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user, key=key, fingerprint=request_fingerprint
+                )
+        except IntegrityError:
+            # A concurrent request with this key committed first
+            record = None
+        if record is not None:
+            response = handler()
+            if status.is_success(response.status_code):
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+            else:
+                transaction.set_rollback(True)
+            return response
+
+    return _replay(IdempotencyKey.objects.get(user=request.user, key=key), request_fingerprint)
+
+
+def sweep(older_than=None, batch_size=10000):
+    """
+    Delete keys created more than `older_than` (default
+    settings.IDEMPOTENCY_KEY_TTL seconds) ago, oldest first, in batches.
+    Returns the number deleted.
+    """
+    if older_than is None:
+        older_than = timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    cutoff = timezone.now() - older_than
+    deleted = 0
+    while True:
+        batch = list(
+            IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by('created_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
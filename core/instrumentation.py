@@ -0,0 +1,233 @@
+"""
+core/instrumentation.py
+
+Per-request instrumentation for the order API.
+
+For sampled requests, InstrumentationMiddleware records the SQL query count
+and time (through an execute_wrapper on every connection), hits and misses
+on the order cache, and wall time per phase (see `phase` / `instrumented`).
+The data is returned in a `Server-Timing` header and aggregated into
+in-process histograms served by the metrics endpoint.
+Outside a sampled request every hook is a single context variable lookup.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('order_engine_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Measurements collected during one sampled request.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.phases = {}
+
+    def server_timing(self, total):
+        entries = [
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'cache;desc="order hits={self.cache_hits} misses={self.cache_misses}"',
+        ]
+        entries += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.phases.items()]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the wall time of the block to phase `name` of the current request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[name] = metrics.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def instrumented(name):
+    """
+    Decorator form of `phase`.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    execute_wrapper installed on every database connection. Connections are
+    per thread, so the request is found through the context variable, which
+    also follows async views into their sync_to_async threads.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - start
+        metrics.queries += 1
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_cache(hits, misses):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        cumulative, buckets = 0, {}
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'count': self.count, 'sum': round(self.sum, 3), 'buckets': buckets}
+
+
+class MetricsRegistry:
+    """
+    In-process histograms per endpoint, safe to update from several threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, total, metrics):
+        with self._lock:
+            series = self._endpoints.setdefault(endpoint, {
+                'latency_ms': Histogram(LATENCY_BUCKETS_MS),
+                'sql_ms': Histogram(LATENCY_BUCKETS_MS),
+                'queries': Histogram(QUERY_BUCKETS),
+                'cache_hits': 0,
+                'cache_misses': 0,
+                'phases_ms': {},
+            })
+            series['latency_ms'].observe(total * 1000)
+            series['sql_ms'].observe(metrics.sql_time * 1000)
+            series['queries'].observe(metrics.queries)
+            series['cache_hits'] += metrics.cache_hits
+            series['cache_misses'] += metrics.cache_misses
+            for name, seconds in metrics.phases.items():
+                series['phases_ms'].setdefault(name, Histogram(LATENCY_BUCKETS_MS)).observe(seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    key: (
+                        value.snapshot() if isinstance(value, Histogram)
+                        else {name: h.snapshot() for name, h in value.items()} if isinstance(value, dict)
+                        else value
+                    )
+                    for key, value in series.items()
+                }
+                for endpoint, series in self._endpoints.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = MetricsRegistry()
+
+
+class InstrumentationMiddleware:
+    """
+    Samples requests under settings.INSTRUMENTATION_PATH_PREFIX at
+    settings.INSTRUMENTATION_SAMPLE_RATE and instruments them. Supports
+    both sync and async stacks, so it never moves async views to a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        return request.path.startswith(settings.INSTRUMENTATION_PATH_PREFIX) and \
+            random.random() < settings.INSTRUMENTATION_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled(request):
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.sampled(request):
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        response['Server-Timing'] = metrics.server_timing(total)
+        match = request.resolver_match
+        endpoint = f"{request.method} {match.view_name if match else 'unresolved'}"
+        registry.observe(endpoint, total, metrics)
+        return response
@@ -0,0 +1,99 @@
+"""
+core/jobs.py
+
+Background discount recalculation.
+
+Jobs are rows in the DiscountJob table. Workers claim pending jobs in
+batches (with `SELECT ... FOR UPDATE SKIP LOCKED` where the database
+supports it), recompute the orders' discounts in chunks, and delete the jobs
+that succeeded. See `manage.py run_discount_worker`.
+
+Workers are long-lived, so every chunk starts by re-reading the rule and
+catalog versions: orders queued after a rule edit are always recalculated
+with the edited rules.
+"""
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from . import versions
+from .discounts import apply_discounts
+from .models import DiscountJob, Order
+
+# Failed jobs are retried until they have been attempted this many times
+MAX_ATTEMPTS = 3
+
+
+def claim_jobs(worker, limit):
+    """
+    Atomically mark up to `limit` pending jobs as running for `worker` and
+    return them as (job id, order id) pairs, oldest first.
+    """
+    with transaction.atomic():
+        pending = DiscountJob.objects.filter(status=DiscountJob.PENDING).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        job_ids = list(pending.values_list('id', flat=True)[:limit])
+        if not job_ids:
+            return []
+        # The status condition keeps two workers from claiming the same job
+        # on databases without row locks; the token tells them apart.
+        DiscountJob.objects.filter(id__in=job_ids, status=DiscountJob.PENDING).update(
+            status=DiscountJob.RUNNING,
+            worker=worker,
+            claimed_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+    return list(
+        DiscountJob.objects.filter(id__in=job_ids, status=DiscountJob.RUNNING, worker=worker)
+        .order_by('id')
+        .values_list('id', 'order_id')
+    )
+
+
+def reclaim_stale_jobs(older_than):
+    """
+    Return running jobs claimed more than `older_than` ago (e.g. by a worker
+    that died) to the queue.
+    """
+    return DiscountJob.objects.filter(
+        status=DiscountJob.RUNNING,
+        claimed_at__lt=timezone.now() - older_than,
+    ).update(status=DiscountJob.PENDING, worker='')
+
+
+def process_chunk(jobs):
+    """
+    Recompute discounts for a chunk of (job id, order id) pairs.
+
+    Runs inside pool processes, so it only takes and returns plain values:
+    returns (succeeded job ids, {failed job id: error message}).
+    """
+    versions.expire()
+    orders = Order.objects.in_bulk([order_id for _, order_id in jobs])
+    succeeded, failed = [], {}
+    for job_id, order_id in jobs:
+        try:
+            apply_discounts(orders[order_id])
+        except Exception as exc:
+            failed[job_id] = f"{type(exc).__name__}: {exc}"
+        else:
+            succeeded.append(job_id)
+    return succeeded, failed
+
+
+def finish_jobs(succeeded, failed):
+    """
+    Delete the jobs that succeeded; requeue failed ones until they run out of
+    attempts, then mark them failed.
+    """
+    DiscountJob.objects.filter(id__in=succeeded).delete()
+    for job_id, error in failed.items():
+        DiscountJob.objects.filter(id=job_id).update(
+            status=Case(
+                When(attempts__gte=MAX_ATTEMPTS, then=Value(DiscountJob.FAILED)),
+                default=Value(DiscountJob.PENDING),
+            ),
+            worker='',
+            error=error,
+        )
@@ -0,0 +1,121 @@
+"""
+core/management/commands/explain_hot_queries.py
+
+Runs EXPLAIN on the queries behind OrderViewSet, discount evaluation and
+the loyalty stats, and reports whether each one plans with the index that
+was designed for it (see the Meta.indexes in core/models.py).
+
+Small tables are legitimately scanned sequentially, so run this against a
+database of realistic size (or a copy of production statistics).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+
+from core.models import Discount, DiscountJob, DiscountRule, Order, OrderItem
+from core.pagination import OrderCursorPagination
+
+
+def hot_queries(order_id, user_id):
+    """
+    (name, queryset, index names the plan should use) for each hot query,
+    shaped like the code that runs it.
+    """
+    ordering = OrderCursorPagination.ordering
+    page_size = OrderCursorPagination.page_size + 1
+    return [
+        (
+            'order list (staff)',
+            Order.objects.select_related('user').order_by(*ordering)[:page_size],
+            ['order_created_id_idx'],
+        ),
+        (
+            'order list (customer)',
+            Order.objects.filter(user_id=user_id).select_related('user').order_by(*ordering)[:page_size],
+            ['order_user_created_idx'],
+        ),
+        (
+            'loyalty rebuild',
+            Order.objects.filter(user_id__in=[user_id], status__in=Order.LOYALTY_STATUSES)
+            .values('user_id').annotate(orders=Count('id'), spend=Sum('final_total')),
+            ['order_user_status_idx'],
+        ),
+        (
+            'active discount rules',
+            DiscountRule.objects.filter(active=True).select_related('category'),
+            ['discountrule_active_idx'],
+        ),
+        (
+            'order summary',
+            OrderItem.objects.filter(order_id=order_id)
+            .values_list('product__category_id', 'quantity', 'price_at_purchase'),
+            ['orderitem_order_cover_idx'],
+        ),
+        (
+            'item prefetch',
+            OrderItem.objects.filter(order_id__in=[order_id]),
+            ['orderitem_order_cover_idx'],
+        ),
+        (
+            'discount prefetch',
+            Discount.objects.filter(order_id__in=[order_id]),
+            ['discount_order_cover_idx'],
+        ),
+        (
+            'computed totals',
+            Order.objects.filter(pk=order_id).with_computed_totals(),
+            ['orderitem_order_cover_idx', 'discount_order_cover_idx'],
+        ),
+        (
+            'discount job claim',
+            DiscountJob.objects.filter(status=DiscountJob.PENDING).order_by('id')[:100],
+            ['discountjob_status_id_idx'],
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot queries and report whether their indexes are used."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--order', type=int,
+            help="Order id to plan the per-order queries with (default: the latest order)."
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help="User id to plan the per-user queries with (default: the latest order's user)."
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="Run EXPLAIN ANALYZE (PostgreSQL only; executes the queries)."
+        )
+        parser.add_argument('--plans', action='store_true', help="Print the full plan of every query.")
+        parser.add_argument(
+            '--fail-on-miss', action='store_true',
+            help="Exit with an error if any query does not use its index."
+        )
+
+    def handle(self, *args, order=None, user=None, analyze=False, plans=False, fail_on_miss=False, **options):
+        if analyze and connection.vendor != 'postgresql':
+            raise CommandError("--analyze is only supported on PostgreSQL.")
+
+        latest = Order.objects.order_by('-pk').values('pk', 'user_id').first() or {'pk': 1, 'user_id': 1}
+        order_id = order or latest['pk']
+        user_id = user or latest['user_id']
+        explain_options = {'analyze': True} if analyze else {}
+
+        missed = []
+        for name, queryset, indexes in hot_queries(order_id, user_id):
+            plan = queryset.explain(**explain_options)
+            unused = [index for index in indexes if index not in plan]
+            if unused:
+                missed.append(name)
+                self.stdout.write(self.style.WARNING(f"MISS {name}: not using {', '.join(unused)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK   {name}: {', '.join(indexes)}"))
+            if plans or unused:
+                self.stdout.write('\n'.join(f"       {line}" for line in plan.splitlines()))
+
+        if missed and fail_on_miss:
+            raise CommandError(f"{len(missed)} of the hot queries do not use their index.")
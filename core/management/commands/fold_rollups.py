@@ -0,0 +1,35 @@
+"""
+core/management/commands/fold_rollups.py
+
+Folds pending RollupEntry rows into the daily revenue rollups.
+
+Order writes only append entries; run this periodically (or with
+--poll-interval, continuously) to keep the entry table small.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.rollups import fold
+
+
+class Command(BaseCommand):
+    help = "Add pending rollup entries to the daily revenue rollups."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Entries folded per transaction (default: 5000)."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help="Keep running, folding every this many seconds (default: fold once and exit)."
+        )
+
+    def handle(self, *args, batch_size=5000, poll_interval=None, **options):
+        while True:
+            folded = fold(batch_size)
+            self.stdout.write(f"Folded {folded} rollup entries.")
+            if poll_interval is None:
+                break
+            time.sleep(poll_interval)
@@ -0,0 +1,138 @@
+"""
+core/management/commands/profile_startup.py
+
+Profiles how a worker boots: starts fresh interpreters with
+`python -X importtime`, times each boot phase (settings, app registry and
+models, request handler and middleware, URLconf and views, optionally the
+warm-up) and reports import time per package and the slowest modules.
+
+Import times vary between runs; with --runs the median of each is shown.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Workers boot with the garbage collector off (see core/warmup.py), and a
+# collection would otherwise be charged to whichever module it interrupts
+BOOT_SCRIPT = """
+import gc, json, os, sys, time
+gc.disable()
+os.environ['DJANGO_SETTINGS_MODULE'] = sys.argv[1]
+phases = []
+last = time.perf_counter()
+
+def mark(name):
+    global last
+    now = time.perf_counter()
+    phases.append((name, now - last))
+    last = now
+
+import django
+mark('django')
+from django.conf import settings
+settings.INSTALLED_APPS
+mark('settings')
+django.setup(set_prefix=False)
+mark('apps')
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+mark('handler')
+from django.urls import get_resolver
+get_resolver().url_patterns
+mark('urls')
+if sys.argv[2] == 'warm':
+    from core.warmup import warm
+    warm()
+    mark('warmup')
+print(json.dumps(phases))
+"""
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+# Packages reported on their own; everything else is grouped as the rest
+PROJECT_PACKAGES = ('core', 'order_engine', 'benchmarks')
+
+
+def boot(warm):
+    """
+    Boot a fresh interpreter; returns ([(phase, seconds)], {module: (self us, cumulative us)}).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT,
+         os.environ.get('DJANGO_SETTINGS_MODULE', 'order_engine.settings'), 'warm' if warm else 'cold'],
+        cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise CommandError(f"The profiled boot failed:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules[match[4]] = (int(match[1]), int(match[2]))
+    return json.loads(result.stdout.strip().splitlines()[-1]), modules
+
+
+def package_of(module):
+    top = module.split('.')[0]
+    if top in PROJECT_PACKAGES or top in ('django', 'rest_framework'):
+        return top
+    return 'other' if top in sys.stdlib_module_names else 'third party'
+
+
+class Command(BaseCommand):
+    help = "Report where a worker's boot time goes: phases, packages and the slowest imports."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help="Fresh boots to take the median of (default: 3).")
+        parser.add_argument('--top', type=int, default=15, help="Slowest modules to list (default: 15).")
+        parser.add_argument(
+            '--warm', action='store_true',
+            help="Also time the warm-up (core/warmup.py); needs the database."
+        )
+
+    def handle(self, *args, runs=3, top=15, warm=False, **options):
+        if runs < 1:
+            raise CommandError("--runs must be at least 1.")
+        boots = [boot(warm) for _ in range(runs)]
+
+        self.stdout.write(f"Boot phases (median of {runs}):")
+        phases = [name for name, _ in boots[0][0]]
+        totals = []
+        for index, name in enumerate(phases):
+            seconds = median(boot_phases[index][1] for boot_phases, _ in boots)
+            totals.append(seconds)
+            self.stdout.write(f"  {name:<14}{seconds * 1000:>9.1f} ms")
+        self.stdout.write(f"  {'total':<14}{sum(totals) * 1000:>9.1f} ms")
+
+        # Median self/cumulative time per module over the runs that imported it
+        names = set().union(*(modules for _, modules in boots))
+        times = {
+            name: tuple(median(modules[name][i] for _, modules in boots if name in modules) for i in (0, 1))
+            for name in names
+        }
+
+        packages = {}
+        for name, (own, _) in times.items():
+            count, total = packages.get(package_of(name), (0, 0))
+            packages[package_of(name)] = (count + 1, total + own)
+        self.stdout.write("\nImport time by package (self time):")
+        for package, (count, total) in sorted(packages.items(), key=lambda item: -item[1][1]):
+            self.stdout.write(f"  {package:<14}{total / 1000:>9.1f} ms  {count:>5} modules")
+
+        self.stdout.write(f"\nSlowest {top} modules (self time, cumulative):")
+        for name, (own, cumulative) in sorted(times.items(), key=lambda item: -item[1][0])[:top]:
+            self.stdout.write(f"  {own / 1000:>8.1f} ms {cumulative / 1000:>9.1f} ms  {name}")
+
+        project = sorted(
+            ((name, cumulative) for name, (_, cumulative) in times.items() if package_of(name) in PROJECT_PACKAGES),
+            key=lambda item: -item[1],
+        )
+        self.stdout.write("\nProject modules (cumulative, including what they import first):")
+        for name, cumulative in project[:top]:
+            self.stdout.write(f"  {cumulative / 1000:>8.1f} ms  {name}")
@@ -0,0 +1,37 @@
+"""
+core/management/commands/rebuild_loyalty_stats.py
+
+Rebuilds the per-user loyalty stats (CustomerLoyalty) from order history.
+
+Used to backfill the table and to repair it after out-of-band changes.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from core.models import CustomerLoyalty
+
+
+class Command(BaseCommand):
+    help = "Rebuild CustomerLoyalty rows from the users' qualifying orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of users rebuilt per query (default: 1000)."
+        )
+
+    def handle(self, *args, batch_size=1000, **options):
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        total = 0
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) == batch_size:
+                CustomerLoyalty.rebuild(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            CustomerLoyalty.rebuild(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt loyalty stats for {total} users."))
@@ -0,0 +1,57 @@
+"""
+core/management/commands/recompute_order_totals.py
+
+Recomputes the denormalized order totals (subtotal, discount_total,
+final_total, total_quantity) from the item and discount rows.
+
+Used to backfill the columns after they were introduced and to detect drift.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from core.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recompute and verify the denormalized totals stored on orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report orders whose stored totals have drifted; do not fix them."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help="Number of orders compared per query (default: 2000)."
+        )
+
+    def handle(self, *args, check=False, batch_size=2000, **options):
+        last_id = Order.objects.aggregate(last=Max('pk'))['last'] or 0
+        checked = drifted = 0
+
+        # Walk the table in primary key ranges so each batch is an index range scan
+        for start in range(0, last_id, batch_size):
+            batch = Order.objects.filter(pk__gt=start, pk__lte=start + batch_size)
+            rows = batch.with_computed_totals().values_list(
+                'pk', 'subtotal', 'discount_total', 'final_total', 'total_quantity',
+                'computed_subtotal', 'computed_discount_total', 'computed_quantity',
+            )
+
+            drifted_ids = []
+            for pk, subtotal, discount, final, quantity, c_subtotal, c_discount, c_quantity in rows:
+                checked += 1
+                if (subtotal, discount, final, quantity) != (c_subtotal, c_discount, c_subtotal - c_discount, c_quantity):
+                    drifted_ids.append(pk)
+
+            if drifted_ids:
+                drifted += len(drifted_ids)
+                if check:
+                    self.stdout.write(f"Drifted orders: {', '.join(map(str, drifted_ids))}")
+                else:
+                    Order.objects.filter(pk__in=drifted_ids).recompute_totals()
+
+        if check and drifted:
+            raise CommandError(f"{drifted} of {checked} orders have drifted totals.")
+
+        action = "found" if check else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} orders, {action} {drifted} with drifted totals."))
@@ -0,0 +1,117 @@
+"""
+core/management/commands/reprice_orders.py
+
+Re-evaluates the discounts of historical orders in batches.
+
+Used after a DiscountRule changes retroactively, and with --dry-run to
+report what the current or hypothetical (--add-rule/--drop-rule) rules
+would have cost over a period without touching any order.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date, parse_datetime
+
+from core.models import Category, DiscountRule, Order
+from core.repricing import hypothetical_rule, reprice, what_if_schedule
+
+RULE_SPECS = {
+    # spec prefix: (rule type, field names of the remaining parts)
+    'percentage': (DiscountRule.PERCENTAGE, ('percentage', 'threshold')),
+    'flat': (DiscountRule.FLAT, ('flat_amount',)),
+    'category': (DiscountRule.CATEGORY_BASED, ('category', 'percentage', 'min_quantity')),
+    'buyxgety': (DiscountRule.BUY_X_GET_Y, ('category', 'min_quantity', 'free_quantity')),
+}
+
+
+def parse_rule(spec):
+    kind, *values = spec.split(':')
+    if kind not in RULE_SPECS:
+        raise CommandError(f"Unknown rule type in '{spec}'; use one of {', '.join(RULE_SPECS)}.")
+    rule_type, fields = RULE_SPECS[kind]
+    if len(values) != len(fields):
+        raise CommandError(f"'{spec}' should be {kind}:{':'.join(f.upper() for f in fields)}.")
+
+    kwargs = {}
+    try:
+        for name, value in zip(fields, values):
+            if name == 'category':
+                kwargs[name] = Category.objects.filter(name__iexact=value).first()
+                if kwargs[name] is None:
+                    raise CommandError(f"Unknown category '{value}' in '{spec}'.")
+            elif name in ('min_quantity', 'free_quantity'):
+                kwargs[name] = int(value)
+            else:
+                kwargs[name] = Decimal(value)
+    except (InvalidOperation, ValueError):
+        raise CommandError(f"Invalid number in '{spec}'.")
+    return hypothetical_rule(rule_type, **kwargs)
+
+
+def parse_moment(value):
+    moment = parse_datetime(value) or parse_date(value)
+    if moment is None:
+        raise CommandError(f"Invalid date: '{value}'.")
+    return moment
+
+
+class Command(BaseCommand):
+    help = "Re-price historical orders against the active (or hypothetical) discount rules."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only orders created at or after this date/datetime.")
+        parser.add_argument('--until', help="Only orders created before this date/datetime.")
+        parser.add_argument(
+            '--status', action='append', choices=[choice for choice, _ in Order.STATUS_CHOICES],
+            help="Only orders with this status (repeatable)."
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report the aggregate impact; do not modify any order."
+        )
+        parser.add_argument(
+            '--add-rule', action='append', default=[], metavar='SPEC',
+            help="Add a hypothetical rule (dry run only): percentage:PERCENT:THRESHOLD, "
+                 "flat:AMOUNT, category:NAME:PERCENT:MIN_QUANTITY or buyxgety:NAME:BUY:FREE. Repeatable."
+        )
+        parser.add_argument(
+            '--drop-rule', action='append', type=int, default=[], metavar='ID',
+            help="Leave out the active rule with this id (dry run only). Repeatable."
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help="Number of orders evaluated per batch (default: 2000)."
+        )
+
+    def handle(self, *args, since=None, until=None, status=None, dry_run=False,
+               add_rule=(), drop_rule=(), chunk_size=2000, **options):
+        if (add_rule or drop_rule) and not dry_run:
+            raise CommandError("--add-rule and --drop-rule describe hypothetical rules and need --dry-run.")
+
+        orders = Order.objects.all()
+        if since:
+            orders = orders.filter(created_at__gte=parse_moment(since))
+        if until:
+            orders = orders.filter(created_at__lt=parse_moment(until))
+        if status:
+            orders = orders.filter(status__in=status)
+
+        schedule = None
+        if add_rule or drop_rule:
+            schedule = what_if_schedule([parse_rule(spec) for spec in add_rule], drop_rule)
+
+        report = reprice(orders, schedule, chunk_size=chunk_size, dry_run=dry_run)
+
+        self.stdout.write(f"Orders evaluated: {report.orders} ({report.changed} with a different discount)")
+        self.stdout.write(f"Subtotal:         ₹{report.subtotal:.2f}")
+        self.stdout.write(f"Discount before:  ₹{report.discount_before:.2f}")
+        self.stdout.write(f"Discount after:   ₹{report.discount_after:.2f} ({report.delta:+.2f})")
+        for discount_type in sorted(report.before_by_type.keys() | report.after_by_type.keys()):
+            before = report.before_by_type.get(discount_type, Decimal('0'))
+            after = report.after_by_type.get(discount_type, Decimal('0'))
+            self.stdout.write(f"  {discount_type:<16} ₹{before:.2f} -> ₹{after:.2f}")
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Dry run: no orders were changed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Re-priced {report.orders} orders."))
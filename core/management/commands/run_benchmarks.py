@@ -0,0 +1,109 @@
+"""
+core/management/commands/run_benchmarks.py
+
+Runs the benchmark suite (see the `benchmarks` package) against a throwaway
+test database and writes the results as JSON.
+"""
+import json
+import platform
+from datetime import datetime, timezone
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks.dataset import DatasetConfig, build_dataset
+from benchmarks.runner import git_commit, measure
+from benchmarks.scenarios import build_scenarios
+
+
+class Command(BaseCommand):
+    help = "Benchmark order creation, listing, retrieval, status updates and discount evaluation."
+
+    def add_arguments(self, parser):
+        defaults = DatasetConfig()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--products', type=int, default=defaults.products)
+        parser.add_argument('--orders-per-user', type=int, default=defaults.orders_per_user)
+        parser.add_argument('--category-rules', type=int, default=defaults.category_rules)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--iterations', type=int, default=200, help="Timed calls per scenario (default: 200).")
+        parser.add_argument('--warmup', type=int, default=5, help="Untimed calls per scenario (default: 5).")
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help="Only run this scenario (repeatable)."
+        )
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+        parser.add_argument('--compare', help="A previous JSON result to compare against.")
+
+    def handle(self, *args, **options):
+        config = DatasetConfig(
+            users=options['users'],
+            products=options['products'],
+            orders_per_user=options['orders_per_user'],
+            category_rules=options['category_rules'],
+            seed=options['seed'],
+        )
+
+        # Never touch the real database: build everything in a test database
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cache.clear()
+            self.stderr.write(f"Building dataset: {config}")
+            dataset = build_dataset(config)
+            scenarios = build_scenarios(dataset, seed=config.seed)
+
+            selected = options['scenarios'] or list(scenarios)
+            unknown = set(selected) - scenarios.keys()
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+            results = {}
+            for name in selected:
+                operation, before_each = scenarios[name]
+                self.stderr.write(f"Running {name}...")
+                results[name] = measure(
+                    operation, options['iterations'], warmup=options['warmup'], before_each=before_each
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'dataset': vars(config),
+            },
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.print_comparison(json.load(f), report)
+
+    def print_comparison(self, before, after):
+        self.stderr.write(f"\n{'scenario':<18}{'p50 ms':>18}{'p99 ms':>18}{'queries':>16}")
+        for name, result in after['results'].items():
+            old = before['results'].get(name)
+            if old is None:
+                continue
+            cells = [
+                f"{old[key]:g} -> {result[key]:g}"
+                for key in ('p50_ms', 'p99_ms', 'queries_mean')
+            ]
+            self.stderr.write(f"{name:<18}{cells[0]:>18}{cells[1]:>18}{cells[2]:>16}")
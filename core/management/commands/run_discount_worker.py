@@ -0,0 +1,101 @@
+"""
+core/management/commands/run_discount_worker.py
+
+Runs the background discount recalculation worker.
+
+Claims pending DiscountJob rows in batches and recomputes the orders'
+discounts in chunks across a pool of processes.
+"""
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from core.jobs import claim_jobs, finish_jobs, process_chunk, reclaim_stale_jobs
+from core.models import DiscountJob, Order
+
+
+class Command(BaseCommand):
+    help = "Process queued discount recalculation jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help="Worker processes (default: CPU count; 1 on SQLite, which serializes writers)."
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help="Orders recomputed per task (default: 100)."
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help="Seconds to wait when the queue is empty (default: 2)."
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help="Seconds after which a running job is assumed abandoned and requeued (default: 600)."
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty instead of polling."
+        )
+        parser.add_argument(
+            '--enqueue-open', action='store_true',
+            help="First queue every order whose discounts can still change "
+                 f"({', '.join(DiscountJob.RECALCULABLE_STATUSES)}), e.g. after a rule change."
+        )
+
+    def handle(self, *args, processes=None, chunk_size=100, poll_interval=2.0,
+               stale_after=600, once=False, enqueue_open=False, **options):
+        if processes is None:
+            processes = 1 if connection.vendor == 'sqlite' else (os.cpu_count() or 1)
+
+        if enqueue_open:
+            order_ids = Order.objects.filter(
+                status__in=DiscountJob.RECALCULABLE_STATUSES
+            ).values_list('id', flat=True)
+            queued = DiscountJob.enqueue(order_ids.iterator(chunk_size=5000))
+            self.stdout.write(f"Queued {queued} orders for recalculation.")
+
+        worker = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        pool = None
+        if processes > 1:
+            # Spawned (not forked) children never share the parent's connections
+            pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+
+        processed = failed_total = 0
+        try:
+            while True:
+                reclaim_stale_jobs(timedelta(seconds=stale_after))
+                jobs = claim_jobs(worker, chunk_size * processes)
+                if not jobs:
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+                results = pool.map(process_chunk, chunks) if pool else map(process_chunk, chunks)
+                for succeeded, failed in results:
+                    finish_jobs(succeeded, failed)
+                    processed += len(succeeded)
+                    failed_total += len(failed)
+                self.stdout.write(f"Recalculated {processed} orders ({failed_total} failures).")
+        finally:
+            if pool:
+                pool.shutdown()
+            connections.close_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Queue empty: recalculated {processed} orders ({failed_total} failures)."
+        ))
@@ -0,0 +1,267 @@
+"""
+core/management/commands/run_load_test.py
+
+Load-tests the order API end to end: builds the benchmark dataset in a
+throwaway database, boots server workers on order_engine.wsgi or
+order_engine.asgi (see benchmarks/server.py), drives a mix of signups,
+logins, order creation, list/retrieve and admin status updates at it over
+HTTP (see benchmarks/traffic.py) and checks throughput, latency percentiles
+and error rates against the declared SLOs (see benchmarks/slo.py).
+
+Unlike run_benchmarks, which calls views in-process one at a time, this
+shows how the whole stack behaves under concurrency: lock waits, connection
+setup, thread and worker counts. Runs offline on SQLite, or on PostgreSQL
+when ORDER_ENGINE_POSTGRES_DB is set. Exits with an error when an SLO is
+missed.
+"""
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timezone
+from importlib import import_module
+
+import django
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from benchmarks import traffic
+from benchmarks.dataset import DatasetConfig, build_dataset
+from benchmarks.runner import git_commit
+from benchmarks.slo import check, load_slos, summarize
+from core.models import CustomerLoyalty, Order
+
+# Password of the users the traffic signs up
+PASSWORD = 'load-test-password'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = "Load-test the order API over HTTP and check the results against the SLOs."
+
+    def add_arguments(self, parser):
+        defaults = DatasetConfig()
+        parser.add_argument('--interface', choices=['wsgi', 'asgi'], default='wsgi',
+                            help="Entry point the server workers run (default: wsgi).")
+        parser.add_argument('--workers', type=int, default=2, help="Server worker processes (default: 2).")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="Request threads per WSGI worker (default: 8).")
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help="Virtual users, each sending one request at a time (default: 32).")
+        parser.add_argument('--admins', type=int,
+                            help="How many of the virtual users are admins (default: one in eight).")
+        parser.add_argument('--driver-processes', type=int, default=1,
+                            help="Processes sharing the virtual users, each with its own event loop (default: 1).")
+        parser.add_argument('--duration', type=float, default=30, help="Measured seconds (default: 30).")
+        parser.add_argument('--warmup', type=float, default=5,
+                            help="Seconds of traffic before measuring starts (default: 5).")
+        parser.add_argument('--think-time', type=float, default=0,
+                            help="Mean seconds a virtual user waits between requests (default: 0).")
+        parser.add_argument('--timeout', type=float, default=30, help="Seconds before a request fails (default: 30).")
+        parser.add_argument('--open-orders', type=int, default=200,
+                            help="Orders the admins move between statuses (default: 200).")
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--products', type=int, default=defaults.products)
+        parser.add_argument('--orders-per-user', type=int, default=defaults.orders_per_user)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--slo', help="JSON file of SLOs overriding the defaults in benchmarks/slo.py.")
+        parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        admins = options['admins'] if options['admins'] is not None else max(1, concurrency // 8)
+        if not 0 <= admins <= concurrency:
+            raise CommandError("--admins must be between 0 and --concurrency.")
+        if not 1 <= options['driver_processes'] <= concurrency:
+            raise CommandError("--driver-processes must be between 1 and --concurrency.")
+        if options['workers'] < 1 or options['threads'] < 1:
+            raise CommandError("--workers and --threads must be at least 1.")
+        try:
+            slos = load_slos(options['slo'])
+        except (OSError, ValueError, TypeError) as exc:
+            raise CommandError(f"Could not read the SLOs: {exc}")
+        config = DatasetConfig(
+            users=options['users'],
+            products=options['products'],
+            orders_per_user=options['orders_per_user'],
+            seed=options['seed'],
+        )
+
+        # Never touch the real database. SQLite's test database is normally in
+        # memory, which the server workers could not share: use a file.
+        workdir = tempfile.mkdtemp(prefix='order-engine-load-')
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'load.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        database = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        servers = []
+        try:
+            cache.clear()
+            self.stderr.write(f"Building dataset: {config}")
+            dataset = build_dataset(config)
+            plan = self.prepare(dataset, concurrency, admins, options)
+            connections.close_all()
+
+            servers = self.start_servers(database, os.path.basename(workdir), plan.port, options)
+            results = self.drive(plan, concurrency, admins, options)
+        finally:
+            for server in servers:
+                server.terminate()
+            for server in servers:
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        summary = summarize(results, options['duration'])
+        missed = check(summary, slos)
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'interface': options['interface'],
+                'workers': options['workers'],
+                'threads': options['threads'] if options['interface'] == 'wsgi' else None,
+                'concurrency': concurrency,
+                'admins': admins,
+                'driver_processes': options['driver_processes'],
+                'duration_s': options['duration'],
+                'think_time_s': options['think_time'],
+                'dataset': vars(config),
+            },
+            'results': summary,
+            'slos': {operation: vars(slo) for operation, slo in slos.items()},
+            'missed': missed,
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        self.print_summary(summary)
+        if missed:
+            raise CommandError("SLOs missed:\n  " + "\n  ".join(missed))
+        self.stderr.write(self.style.SUCCESS("All SLOs met."))
+
+    def prepare(self, dataset, concurrency, admins, options):
+        """
+        Log every virtual user in and open some orders for the admins; returns
+        the traffic plan (split and timed later).
+        """
+        customers = [dataset.users[index % len(dataset.users)] for index in range(concurrency - admins)]
+        rng = random.Random(options['seed'])
+        open_ids = rng.sample(dataset.order_ids, min(options['open_orders'], len(dataset.order_ids)))
+        if admins and not open_ids:
+            raise CommandError("Admins need orders to update: raise --open-orders or --orders-per-user.")
+        Order.objects.filter(pk__in=open_ids).update(status='placed')
+        CustomerLoyalty.rebuild(list(Order.objects.filter(pk__in=open_ids).values_list('user_id', flat=True).distinct()))
+
+        return traffic.Plan(
+            port=free_port(),
+            customer_sessions=[self.login(user) for user in customers],
+            admin_sessions=[self.login(dataset.admin) for _ in range(admins)],
+            password=PASSWORD,
+            product_ids=dataset.product_ids,
+            open_order_ids=open_ids,
+            start_at=0,
+            measure_from=0,
+            stop_at=0,
+            think_time=options['think_time'],
+            timeout=options['timeout'],
+            seed=options['seed'],
+        )
+
+    def login(self, user):
+        """
+        Create a logged-in session for `user` the way django.test.Client.force_login
+        does; logging in over HTTP would hash a password per virtual user.
+        Returns the session key.
+        """
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    def start_servers(self, database, run, port, options):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'benchmarks.load_settings',
+            'ORDER_ENGINE_LOAD_DB': str(database),
+            'ORDER_ENGINE_LOAD_RUN': run,
+        }
+        command = [sys.executable, '-m', 'benchmarks.server', options['interface'], str(port),
+                   '--threads', str(options['threads'])]
+        self.stderr.write(f"Starting {options['workers']} {options['interface']} workers on port {port}...")
+        servers = []
+        for _ in range(options['workers']):
+            servers.append(subprocess.Popen(command, cwd=settings.BASE_DIR, env=env, stdout=subprocess.PIPE, text=True))
+            # Workers print "ready" once they listen; their errors go to our stderr
+            if servers[-1].stdout.readline().strip() != 'ready':
+                for server in servers:
+                    server.kill()
+                raise CommandError("A server worker failed to start; see its output above.")
+        return servers
+
+    def drive(self, plan, concurrency, admins, options):
+        """
+        Split the virtual users over the driver processes and run them; returns
+        the results of each.
+        """
+        processes = options['driver_processes']
+        # Leave the driver processes time to start before the traffic does
+        start_at = time.time() + 1 + 0.1 * processes
+        plans, first_user = [], 0
+        for index in range(processes):
+            customer_sessions = plan.customer_sessions[index::processes]
+            admin_sessions = plan.admin_sessions[index::processes]
+            plans.append(replace(
+                plan, customer_sessions=customer_sessions, admin_sessions=admin_sessions,
+                first_user=first_user, seed=plan.seed + index, start_at=start_at,
+                measure_from=start_at + options['warmup'], stop_at=start_at + options['warmup'] + options['duration'],
+            ))
+            first_user += len(customer_sessions) + len(admin_sessions)
+
+        self.stderr.write(
+            f"Driving {concurrency} virtual users ({admins} admins) for "
+            f"{options['warmup']:g}s warm-up + {options['duration']:g}s measured..."
+        )
+        if processes == 1:
+            return [traffic.run(plans[0])]
+        with ProcessPoolExecutor(processes) as pool:
+            return list(pool.map(traffic.run, plans))
+
+    def print_summary(self, summary):
+        self.stderr.write(
+            f"\n{'operation':<15}{'requests':>9}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}"
+        )
+        for operation, stats in summary.items():
+            self.stderr.write(
+                f"{operation:<15}{stats['requests']:>9}{stats['throughput_per_s']:>9g}{stats['p50_ms']:>10g}"
+                f"{stats['p95_ms']:>10g}{stats['p99_ms']:>10g}{stats['error_rate']:>9.2%}"
+            )
@@ -0,0 +1,32 @@
+"""
+core/management/commands/sweep_idempotency_keys.py
+
+Deletes stored Idempotency-Key responses older than their TTL.
+
+Run it periodically (e.g. hourly from cron); keys are replayed until swept.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.idempotency import sweep
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys older than settings.IDEMPOTENCY_KEY_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=None, metavar='SECONDS',
+            help=f"Age in seconds after which keys are deleted (default: {settings.IDEMPOTENCY_KEY_TTL})."
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help="Keys deleted per query (default: 10000)."
+        )
+
+    def handle(self, *args, older_than=None, batch_size=10000, **options):
+        age = timedelta(seconds=older_than) if older_than is not None else None
+        deleted = sweep(age, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys."))
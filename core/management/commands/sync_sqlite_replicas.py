@@ -0,0 +1,45 @@
+"""
+core/management/commands/sync_sqlite_replicas.py
+
+Copies the SQLite primary into the SQLite files standing in for read
+replicas (settings.DATABASE_REPLICAS), for trying replica routing locally.
+
+Replicas only see writes made before the last copy; run with
+--poll-interval to refresh them continuously, with that much lag.
+"""
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Copy the SQLite primary database into the SQLite replica files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help="Keep running, copying every this many seconds (default: copy once and exit)."
+        )
+
+    def handle(self, *args, poll_interval=None, **options):
+        aliases = ['default', *settings.DATABASE_REPLICAS]
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured; set ORDER_ENGINE_REPLICA_DBS.")
+        if any(connections[alias].vendor != 'sqlite' for alias in aliases):
+            raise CommandError("Only SQLite primaries and replicas can be copied; replicate other databases natively.")
+
+        while True:
+            # The online backup API copies a consistent snapshot, even while the primary is written to
+            with closing(sqlite3.connect(settings.DATABASES['default']['NAME'])) as source:
+                for alias in settings.DATABASE_REPLICAS:
+                    connections[alias].close()
+                    with closing(sqlite3.connect(settings.DATABASES[alias]['NAME'])) as target:
+                        source.backup(target)
+                    self.stdout.write(f"Copied the primary to {alias}.")
+            if poll_interval is None:
+                break
+            time.sleep(poll_interval)
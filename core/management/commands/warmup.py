@@ -0,0 +1,36 @@
+"""
+core/management/commands/warmup.py
+
+Loads the discount rules, the catalog entries of recently ordered products
+and the rendered most recent orders, reporting how long each step took.
+
+The rules and catalog live in each process, so this warms a worker only
+when run inside it (see core/warmup.py and ORDER_ENGINE_WARMUP); run as a
+deploy step, it fills a shared order cache (Redis, Memcached or file based)
+before the new workers take traffic.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.warmup import warm
+
+
+class Command(BaseCommand):
+    help = "Preload the discount rules, product catalog and recent orders into the caches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orders', type=int, default=settings.WARMUP_ORDERS,
+            help=f"Most recent orders to render into the order cache (default: {settings.WARMUP_ORDERS})."
+        )
+        parser.add_argument(
+            '--products', type=int, default=settings.CATALOG_CACHE_SIZE,
+            help=f"Recently ordered products to load into the catalog (default: {settings.CATALOG_CACHE_SIZE})."
+        )
+
+    def handle(self, *args, orders=None, products=None, **options):
+        results = warm(orders=orders, products=products)
+        for step, (count, seconds) in results.items():
+            self.stdout.write(f"{step:<10}{count:>8}  {seconds * 1000:>9.1f} ms")
+        total = sum(seconds for _, seconds in results.values())
+        self.stdout.write(self.style.SUCCESS(f"Warm-up finished in {total * 1000:.1f} ms."))
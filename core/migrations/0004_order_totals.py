@@ -0,0 +1,72 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:11
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    """
+    Compute the new columns of every existing order from its item and
+    discount rows, in a single UPDATE (like Order.objects.recompute_totals).
+    """
+    Order = apps.get_model('core', 'Order')
+    OrderItem = apps.get_model('core', 'OrderItem')
+    Discount = apps.get_model('core', 'Discount')
+    money = models.DecimalField(max_digits=12, decimal_places=2)
+
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    discounts = Discount.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    subtotal = Coalesce(
+        Subquery(items.annotate(total=Sum(F('price_at_purchase') * F('quantity'))).values('total')),
+        Decimal('0'), output_field=money
+    )
+    discount_total = Coalesce(
+        Subquery(discounts.annotate(total=Sum('amount')).values('total')),
+        Decimal('0'), output_field=money
+    )
+    quantity = Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0)
+    Order.objects.update(
+        subtotal=subtotal,
+        discount_total=discount_total,
+        final_total=subtotal - discount_total,
+        total_quantity=quantity,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_category_discountrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='final_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('placed', 'Placed'), ('shipped', 'Shipped'), ('completed', 'Completed'), ('delayed', 'Delayed'), ('cancelled', 'Cancelled'), ('returned', 'Returned')], default='placed', max_length=20),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
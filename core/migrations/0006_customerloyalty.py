@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+# Order.LOYALTY_STATUSES when this migration was written
+LOYALTY_STATUSES = ('completed', 'shipped')
+
+
+def backfill_loyalty(apps, schema_editor):
+    """
+    Count the qualifying orders and spend of every user who has any, like
+    `manage.py rebuild_loyalty_stats`, so loyal customers keep their discount
+    from the first request after the deploy.
+    """
+    Order = apps.get_model('core', 'Order')
+    CustomerLoyalty = apps.get_model('core', 'CustomerLoyalty')
+    stats = (
+        Order.objects.filter(status__in=LOYALTY_STATUSES)
+        .order_by().values('user_id')
+        .annotate(orders=Count('id'), spend=Sum('final_total'))
+    )
+    CustomerLoyalty.objects.bulk_create(
+        (
+            CustomerLoyalty(user_id=row['user_id'], qualifying_orders=row['orders'], lifetime_spend=row['spend'] or 0)
+            for row in stats.iterator(chunk_size=2000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0005_order_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLoyalty',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loyalty', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('qualifying_orders', models.PositiveIntegerField(default=0)),
+                ('lifetime_spend', models.DecimalField(decimal_places=2, default=0, help_text='Sum of final totals of qualifying orders, as of when they qualified', max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Customer Loyalty',
+                'verbose_name_plural': 'Customer Loyalty',
+            },
+        ),
+        migrations.RunPython(backfill_loyalty, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_customerloyalty'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Bumped on every change to the order, its items or discounts; part of its cache key'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_order_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('worker', models.CharField(blank=True, help_text='Token of the worker that claimed the job', max_length=64)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discount_jobs', to='core.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='discountjob_status_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The choices Product.category used to be limited to: (stored value, label)
+LEGACY_CATEGORIES = [
+    ('electronics', 'Electronics'),
+    ('fashion', 'Fashion'),
+    ('home', 'Home & Living'),
+]
+
+
+def link_categories(apps, schema_editor):
+    """
+    Point every product at the Category matching its old string value, by
+    name (case-insensitively) or by the value's old label; categories that
+    do not exist yet are created.
+    """
+    Category = apps.get_model('core', 'Category')
+    Product = apps.get_model('core', 'Product')
+    labels = dict(LEGACY_CATEGORIES)
+
+    values = Product.objects.order_by().values_list('category_name', flat=True).distinct()
+    for value in values:
+        label = labels.get(value, value)
+        category = (
+            Category.objects.filter(name__iexact=value).order_by('pk').first()
+            or Category.objects.filter(name__iexact=label).order_by('pk').first()
+            or Category.objects.create(name=value or 'Uncategorized')
+        )
+        Product.objects.filter(category_name=value).update(category=category)
+
+
+def unlink_categories(apps, schema_editor):
+    Category = apps.get_model('core', 'Category')
+    Product = apps.get_model('core', 'Product')
+    values = {label.lower(): value for value, label in LEGACY_CATEGORIES}
+
+    for category in Category.objects.filter(products__isnull=False).distinct():
+        value = values.get(category.name.lower(), category.name.lower())
+        Product.objects.filter(category=category).update(category_name=value)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_discountjob'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='product',
+            old_name='category',
+            new_name='category_name',
+        ),
+        # Nullable while both columns exist, so migrating backwards can re-add it
+        migrations.AlterField(
+            model_name='product',
+            name='category_name',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='products', to='core.category'),
+        ),
+        migrations.RunPython(link_categories, unlink_categories),
+        migrations.RemoveField(
+            model_name='product',
+            name='category_name',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='products', to='core.category'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'product'], name='orderitem_order_product_idx'),
+        ),
+    ]
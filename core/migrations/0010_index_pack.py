@@ -0,0 +1,64 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_product_category_fk'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discount',
+            index=models.Index(fields=['order'], include=('amount', 'discount_type'), name='discount_order_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='discountrule',
+            index=models.Index(condition=models.Q(('active', True)), fields=['rule_type'], name='discountrule_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'product'], include=('quantity', 'price_at_purchase'), name='orderitem_order_cover_idx'),
+        ),
+        # The composite indexes above lead with these columns, so their own indexes go
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='orderitem_order_product_idx',
+        ),
+        migrations.AlterField(
+            model_name='discount',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='discounts', to='core.order'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.order'),
+        ),
+        migrations.AddConstraint(
+            model_name='discountrule',
+            constraint=models.CheckConstraint(condition=models.Q(('percentage__isnull', True), models.Q(('percentage__gte', 0), ('percentage__lte', 100)), _connector='OR'), name='discountrule_percentage_range'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.CheckConstraint(condition=models.Q(('quantity__gte', 1)), name='orderitem_quantity_positive'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discountrule',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, help_text='Stops applying to orders placed from this time on (empty: no end)', null=True),
+        ),
+        migrations.AddField(
+            model_name='discountrule',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, help_text='Applies to orders placed from this time on (empty: no start)', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='discountrule',
+            constraint=models.CheckConstraint(condition=models.Q(('starts_at__isnull', True), ('ends_at__isnull', True), ('ends_at__gt', models.F('starts_at')), _connector='OR'), name='discountrule_window_order'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_discountrule_window'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discountrule',
+            name='bundle_categories',
+            field=models.ManyToManyField(blank=True, help_text='Categories that must all be in the order (for bundle discount)', related_name='bundle_rules', to='core.category'),
+        ),
+        migrations.AddField(
+            model_name='discountrule',
+            name='free_quantity',
+            field=models.PositiveIntegerField(blank=True, help_text='Units given free for every min_quantity bought (for buy X get Y)', null=True),
+        ),
+        migrations.AddField(
+            model_name='discountrule',
+            name='stacking_group',
+            field=models.CharField(blank=True, help_text="Discounts in the same group exclude each other and only the largest applies (empty: the rule type's default group)", max_length=50),
+        ),
+        migrations.AddField(
+            model_name='discountrule',
+            name='user',
+            field=models.ForeignKey(blank=True, help_text='Customer the coupon belongs to (for personal coupon)', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='discount_rules', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='discountrule',
+            name='min_quantity',
+            field=models.PositiveIntegerField(blank=True, help_text='Minimum quantity required for category-based discount (per category for bundles; units to buy for buy X get Y)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='discountrule',
+            name='rule_type',
+            field=models.CharField(choices=[('percentage', 'Percentage Discount'), ('flat', 'Flat Discount'), ('category_based', 'Category-Based Discount'), ('buy_x_get_y', 'Buy X Get Y Free'), ('bundle', 'Bundle Discount'), ('coupon', 'Personal Coupon')], max_length=20),
+        ),
+    ]
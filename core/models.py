@@ -5,9 +5,15 @@ Models for Category, Product, Order, OrderItem, Discount and DiscountRule.
 
 """
 
-from django.db import models
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models import Sum, F
+from django.db.models import Sum, F, DecimalField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 
 class Category(models.Model):
     """
@@ -21,22 +27,186 @@ class Product(models.Model):
     """
     Defines the products available for purchase.
     """
-    CATEGORY_CHOICES = [
-        ('electronics', 'Electronics'),
-        ('fashion', 'Fashion'),
-        ('home', 'Home & Living'),
-    ]
-    
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
+    category = models.ForeignKey(Category, related_name='products', on_delete=models.PROTECT)
 
     def __str__(self):
         return self.name
 
+def _split_sources(status):
+    # Statuses that may move to `status`, split by whether the move changes
+    # the user's loyalty (see Order.LOYALTY_STATUSES)
+    loyal = status in Order.LOYALTY_STATUSES
+    sources = Order.allowed_from(status)
+    steady = tuple(source for source in sources if (source in Order.LOYALTY_STATUSES) == loyal)
+    crossing = tuple(source for source in sources if (source in Order.LOYALTY_STATUSES) != loyal)
+    return steady, crossing
+
+def _computed_totals():
+    # Correlated subqueries aggregating an order's items and discounts
+    money = DecimalField(max_digits=12, decimal_places=2)
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    discounts = Discount.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    subtotal = Coalesce(
+        Subquery(items.annotate(total=Sum(F('price_at_purchase') * F('quantity'))).values('total')),
+        Decimal('0'), output_field=money
+    )
+    discount_total = Coalesce(
+        Subquery(discounts.annotate(total=Sum('amount')).values('total')),
+        Decimal('0'), output_field=money
+    )
+    quantity = Coalesce(Subquery(items.annotate(total=Sum('quantity')).values('total')), 0)
+    return subtotal, discount_total, quantity
+
+def display_prefetches():
+    """
+    Prefetch lookups for everything OrderSerializer renders below the order:
+    items, their products joined with their categories, and discounts.
+    """
+    return (
+        Prefetch('items__product', queryset=Product.objects.select_related('category')),
+        'discounts',
+    )
+
+class OrderQuerySet(models.QuerySet):
+    def for_display(self):
+        """
+        Fetch everything OrderSerializer renders up front: the user in the
+        same query, items, products (with their categories) and discounts in
+        one query each.
+        """
+        return self.select_related('user').prefetch_related(*display_prefetches())
+
+    def with_computed_totals(self):
+        """
+        Annotate each order with its totals aggregated from the item and
+        discount rows, for checking the denormalized columns against.
+        """
+        subtotal, discount_total, quantity = _computed_totals()
+        return self.annotate(
+            computed_subtotal=subtotal,
+            computed_discount_total=discount_total,
+            computed_quantity=quantity,
+        )
+
+    def recompute_totals(self):
+        """
+        Rewrite the denormalized totals from the item and discount rows in a
+        single UPDATE.
+        """
+        subtotal, discount_total, quantity = _computed_totals()
+        return self.update(
+            subtotal=subtotal,
+            discount_total=discount_total,
+            final_total=subtotal - discount_total,
+            total_quantity=quantity,
+            version=F('version') + 1,
+        )
+
+    def touch(self):
+        """
+        Bump the version of these orders in a single UPDATE, so their cached
+        representations are rendered again (see core/order_cache.py).
+        """
+        return self.update(version=F('version') + 1)
+
+    def containing_products(self, product_ids):
+        """
+        The orders with an item of any of `product_ids`.
+        """
+        return self.filter(pk__in=OrderItem.objects.filter(product_id__in=product_ids).values('order_id'))
+
+    def transition_order(self, pk, status):
+        """
+        Move order `pk` (if it is in this queryset) to `status` with a
+        conditional UPDATE that only matches when its current status allows
+        the move, so concurrent changes cannot interleave. Sources that do not
+        change the user's loyalty are tried first, in a single statement; the
+        loyalty stats are only touched when the order moved into or out of
+        Order.LOYALTY_STATUSES.
+
+        Orders moving to Order.NON_REVENUE_STATUSES leave the revenue rollups
+        in the same transaction.
+
+        Returns True if the order moved.
+        """
+        if status in Order.NON_REVENUE_STATUSES:
+            with transaction.atomic(using=self.db):
+                moved = self._transition_order(pk, status)
+                if moved:
+                    RollupEntry.record(RollupEntry.for_orders([pk], sign=-1))
+            return moved
+        return self._transition_order(pk, status)
+
+    def _transition_order(self, pk, status):
+        steady, crossing = _split_sources(status)
+        order = self.filter(pk=pk)
+        if steady and order.filter(status__in=steady).update(status=status, version=F('version') + 1):
+            return True
+        if not crossing:
+            return False
+
+        with transaction.atomic(using=self.db):
+            if not order.filter(status__in=crossing).update(status=status, version=F('version') + 1):
+                return False
+            # The row is locked by the UPDATE above; read its user and total in the adjustment
+            moved = Order.objects.filter(pk=pk)
+            final_total = Subquery(moved.values('final_total'))
+            if status in Order.LOYALTY_STATUSES:
+                changes = {'qualifying_orders': F('qualifying_orders') + 1,
+                           'lifetime_spend': F('lifetime_spend') + final_total}
+            else:
+                changes = {'qualifying_orders': Greatest(F('qualifying_orders') - 1, 0),
+                           'lifetime_spend': F('lifetime_spend') - final_total}
+            updated = CustomerLoyalty.objects.filter(pk__in=moved.values('user_id')).update(**changes)
+            if not updated:
+                CustomerLoyalty.rebuild(list(moved.values_list('user_id', flat=True)))
+        return True
+
+    def transition(self, status):
+        """
+        Move every order in this queryset whose status allows it to `status`,
+        in one UPDATE, and adjust the loyalty stats of the users whose orders
+        moved into or out of Order.LOYALTY_STATUSES in one batch. Orders moving
+        to Order.NON_REVENUE_STATUSES leave the revenue rollups.
+
+        Returns the ids of the orders that moved.
+        """
+        steady, crossing = _split_sources(status)
+        with transaction.atomic(using=self.db):
+            # Lock the candidates so none changes status between the read and the UPDATE
+            rows = list(
+                self.filter(status__in=steady + crossing).select_for_update()
+                .values_list('pk', 'user_id', 'status', 'final_total')
+            )
+            moved = [pk for pk, _, _, _ in rows]
+            if not moved:
+                return moved
+            Order.objects.filter(pk__in=moved).update(status=status, version=F('version') + 1)
+            if status in Order.NON_REVENUE_STATUSES:
+                RollupEntry.record(RollupEntry.for_orders(moved, sign=-1))
+
+            sign = 1 if status in Order.LOYALTY_STATUSES else -1
+            deltas = {}
+            for _, user_id, source, final_total in rows:
+                if source in crossing:
+                    orders, spend = deltas.get(user_id, (0, Decimal('0')))
+                    deltas[user_id] = (orders + sign, spend + sign * final_total)
+            if deltas:
+                CustomerLoyalty.adjust_many(deltas)
+        return moved
+
 class Order(models.Model):
     """
     Defines orders placed by users.
+
+    subtotal, discount_total, final_total and total_quantity are denormalized
+    from the order's items and discounts; they are kept up to date as those
+    rows change (see core/signals.py) and can be rebuilt with
+    `manage.py recompute_order_totals`. Every such write also bumps `version`,
+    which invalidates the order's cached representation (see core/order_cache.py),
+    and so do edits to the products, categories and user it shows.
     """
     STATUS_CHOICES = [
         ('placed', 'Placed'),
@@ -46,40 +216,144 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
         ('returned', 'Returned'),
     ]
+    # Orders in these statuses count towards the user's loyalty (see CustomerLoyalty)
+    LOYALTY_STATUSES = ('completed', 'shipped')
+    # Orders in these statuses are left out of the revenue rollups. Both are
+    # final, so orders only ever leave the rollups by changing status.
+    NON_REVENUE_STATUSES = ('cancelled', 'returned')
+    # Status changes allowed through the API: current status -> statuses it may move to
+    STATUS_TRANSITIONS = {
+        'placed': ('shipped', 'delayed', 'cancelled'),
+        'delayed': ('placed', 'shipped', 'cancelled'),
+        'shipped': ('completed', 'returned'),
+        'completed': ('returned',),
+        'cancelled': (),
+        'returned': (),
+    }
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Indexed through the (user, ...) composite indexes below
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='placed')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    discount_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    final_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped on every change to the order, its items or discounts; part of its cache key"
+    )
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Cursor pagination and export order by (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            # A non-admin user's order list, same ordering
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            # Loyalty counts: a user's orders in Order.LOYALTY_STATUSES
+            models.Index(fields=['user', 'status'], name='order_user_status_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        # Keep the order and the user's loyalty stats in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
     
+    @classmethod
+    def allowed_from(cls, status):
+        """
+        Statuses an order may move to `status` from.
+        """
+        return tuple(source for source, targets in cls.STATUS_TRANSITIONS.items() if status in targets)
+
+    def clean(self):
+        stored = getattr(self, '_stored_status', None)
+        if stored and stored != self.status and stored not in self.allowed_from(self.status):
+            raise ValidationError({'status': f"An order cannot move from '{stored}' to '{self.status}'."})
+
     def get_total_price(self):
         # Sum of all order items (price * quantity)
-        total = self.items.aggregate(
-            total=Sum(F('price_at_purchase') * F('quantity'))
-        )['total'] or 0
-        return total
+        return self.subtotal
 
     def get_final_price(self):
-        total = self.get_total_price()
-        discounts = self.discounts.aggregate(
-            total_discount=Sum('amount')
-        )['total_discount'] or 0
-        return total - discounts
+        return self.final_total
+
+    @classmethod
+    def adjust_totals(cls, order_id, subtotal=0, discount=0, quantity=0):
+        """
+        Shift the stored totals of an order by the given deltas in a single
+        UPDATE, without reading the row first.
+        """
+        changes = {
+            'final_total': F('final_total') + (subtotal - discount),
+            'version': F('version') + 1,
+        }
+        if subtotal:
+            changes['subtotal'] = F('subtotal') + subtotal
+        if discount:
+            changes['discount_total'] = F('discount_total') + discount
+        if quantity:
+            changes['total_quantity'] = F('total_quantity') + quantity
+        cls.objects.filter(pk=order_id).update(**changes)
 
 class OrderItem(models.Model):
     """
     Defines relationship between order and product.
     """
-    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    # Indexed through orderitem_order_cover_idx
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, db_index=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # An order's items with their products. On backends with covering
+            # indexes (PostgreSQL) the totals and per-category summary are
+            # answered from the index alone; elsewhere `include` is dropped.
+            models.Index(
+                fields=['order', 'product'], include=['quantity', 'price_at_purchase'],
+                name='orderitem_order_cover_idx',
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(quantity__gte=1), name='orderitem_quantity_positive'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name} (Order #{self.order.id})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the order's totals currently include for this row
+        instance._stored_values = (instance.__dict__.get('quantity'), instance.__dict__.get('price_at_purchase'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Keep the row and the order's totals in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
     def get_total_price(self):
         return self.price_at_purchase * self.quantity
 
@@ -87,27 +361,70 @@ class Discount(models.Model):
     """
     Defines table to keep track of all the discounts per order.
     """
-    order = models.ForeignKey(Order, related_name='discounts', on_delete=models.CASCADE)
+    # Indexed through discount_order_cover_idx
+    order = models.ForeignKey(Order, related_name='discounts', on_delete=models.CASCADE, db_index=False)
     discount_type = models.CharField(max_length=50)  # e.g., 'percentage', 'flat', 'category_based'
     description = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            # Discount totals per order, from the index alone where covering indexes exist
+            models.Index(fields=['order'], include=['amount', 'discount_type'], name='discount_order_cover_idx'),
+        ]
     
     def __str__(self):
         return f"{self.discount_type} - ₹{self.amount} (Order #{self.order.id})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_amount = instance.__dict__.get('amount')
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
+
+class DiscountRuleQuerySet(models.QuerySet):
+    def live_at(self, moment):
+        """
+        Active rules whose validity window contains `moment`.
+        """
+        return self.filter(
+            models.Q(starts_at__isnull=True) | models.Q(starts_at__lte=moment),
+            models.Q(ends_at__isnull=True) | models.Q(ends_at__gt=moment),
+            active=True,
+        )
+
 
 class DiscountRule(models.Model):
     """
     Defines the discount rules, more can be added.
+
+    A rule applies to orders placed within [starts_at, ends_at); an empty
+    bound leaves that side of the window open.
     """
     PERCENTAGE = 'percentage'
     FLAT = 'flat'
     CATEGORY_BASED = 'category_based'
+    BUY_X_GET_Y = 'buy_x_get_y'
+    BUNDLE = 'bundle'
+    COUPON = 'coupon'
 
+    # Each type is evaluated by the RuleType registered for it in core/rule_types.py
     RULE_TYPE_CHOICES = [
         (PERCENTAGE, 'Percentage Discount'),
         (FLAT, 'Flat Discount'),
         (CATEGORY_BASED, 'Category-Based Discount'),
+        (BUY_X_GET_Y, 'Buy X Get Y Free'),
+        (BUNDLE, 'Bundle Discount'),
+        (COUPON, 'Personal Coupon'),
     ]
 
     rule_type = models.CharField(max_length=20, choices=RULE_TYPE_CHOICES)
@@ -129,16 +446,422 @@ class DiscountRule(models.Model):
     )
     min_quantity = models.PositiveIntegerField(
         null=True, blank=True,
-        help_text="Minimum quantity required for category-based discount"
+        help_text="Minimum quantity required for category-based discount (per category for bundles; "
+                  "units to buy for buy X get Y)"
+    )
+    free_quantity = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Units given free for every min_quantity bought (for buy X get Y)"
+    )
+    bundle_categories = models.ManyToManyField(
+        Category, blank=True, related_name='bundle_rules',
+        help_text="Categories that must all be in the order (for bundle discount)"
+    )
+    user = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.CASCADE, related_name='discount_rules',
+        help_text="Customer the coupon belongs to (for personal coupon)"
+    )
+    stacking_group = models.CharField(
+        max_length=50, blank=True,
+        help_text="Discounts in the same group exclude each other and only the largest applies "
+                  "(empty: the rule type's default group)"
     )
     active = models.BooleanField(default=True)
+    starts_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Applies to orders placed from this time on (empty: no start)"
+    )
+    ends_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Stops applying to orders placed from this time on (empty: no end)"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DiscountRuleQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.get_rule_type_display()} rule"
 
+    def clean(self):
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': "The rule must end after it starts."})
+
+    def is_live_at(self, moment):
+        return (
+            self.active
+            and (self.starts_at is None or self.starts_at <= moment)
+            and (self.ends_at is None or moment < self.ends_at)
+        )
+
     class Meta:
         verbose_name = "Discount Rule"
-        verbose_name_plural = "Discount Rules"
\ No newline at end of file
+        verbose_name_plural = "Discount Rules"
+        indexes = [
+            # Only active rules are ever compiled, and they are a small share of the table
+            models.Index(fields=['rule_type'], condition=models.Q(active=True), name='discountrule_active_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(percentage__isnull=True) | models.Q(percentage__gte=0, percentage__lte=100),
+                name='discountrule_percentage_range',
+            ),
+            models.CheckConstraint(
+                condition=models.Q(starts_at__isnull=True) | models.Q(ends_at__isnull=True)
+                | models.Q(ends_at__gt=models.F('starts_at')),
+                name='discountrule_window_order',
+            ),
+        ]
+
+
+class CustomerLoyalty(models.Model):
+    """
+    Per-user loyalty stats, so the discount path can check loyalty with a
+    primary key lookup instead of counting the user's order history.
+
+    Kept up to date as orders move into or out of Order.LOYALTY_STATUSES
+    (see core/signals.py) and rebuilt with `manage.py rebuild_loyalty_stats`.
+    """
+    user = models.OneToOneField(User, primary_key=True, on_delete=models.CASCADE, related_name='loyalty')
+    qualifying_orders = models.PositiveIntegerField(default=0)
+    lifetime_spend = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Sum of final totals of qualifying orders, as of when they qualified"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.qualifying_orders} qualifying orders"
+
+    class Meta:
+        verbose_name = "Customer Loyalty"
+        verbose_name_plural = "Customer Loyalty"
+
+    @classmethod
+    def adjust(cls, user_id, orders, spend, rebuild_missing=True):
+        """
+        Shift a user's counters by the given deltas in a single UPDATE; users
+        without a row yet get one rebuilt from their order history.
+        """
+        updated = cls.objects.filter(pk=user_id).update(
+            qualifying_orders=Greatest(F('qualifying_orders') + orders, 0),
+            lifetime_spend=F('lifetime_spend') + spend,
+        )
+        if not updated and rebuild_missing:
+            cls.rebuild([user_id])
+
+    @classmethod
+    def adjust_many(cls, deltas):
+        """
+        Apply {user id: (orders, spend)} deltas: the existing rows are locked,
+        shifted in memory and written back with one bulk_update; users without
+        a row get one rebuilt from their order history.
+        """
+        now = timezone.now()
+        rows = list(cls.objects.filter(pk__in=deltas).select_for_update())
+        for row in rows:
+            orders, spend = deltas[row.pk]
+            row.qualifying_orders = max(row.qualifying_orders + orders, 0)
+            row.lifetime_spend += spend
+            row.updated_at = now
+        cls.objects.bulk_update(rows, ['qualifying_orders', 'lifetime_spend', 'updated_at'])
+
+        missing = set(deltas) - {row.pk for row in rows}
+        if missing:
+            cls.rebuild(list(missing))
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """
+        Recompute the stats for `user_ids` from their orders and upsert them.
+        """
+        stats = {
+            row['user_id']: row
+            for row in Order.objects.filter(user_id__in=user_ids, status__in=Order.LOYALTY_STATUSES)
+            .values('user_id')
+            .annotate(orders=models.Count('id'), spend=Sum('final_total'))
+        }
+        cls.objects.bulk_create(
+            [
+                cls(
+                    user_id=user_id,
+                    qualifying_orders=stats.get(user_id, {}).get('orders', 0),
+                    lifetime_spend=stats.get(user_id, {}).get('spend') or 0,
+                )
+                for user_id in user_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['qualifying_orders', 'lifetime_spend', 'updated_at'],
+        )
+
+
+class DiscountJob(models.Model):
+    """
+    A queued discount (re)calculation for one order, processed in the
+    background by `manage.py run_discount_worker` (see core/jobs.py).
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+    # Orders whose discounts may still change when the rules do
+    RECALCULABLE_STATUSES = ('placed', 'delayed')
+
+    order = models.ForeignKey(Order, related_name='discount_jobs', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=64, blank=True, help_text="Token of the worker that claimed the job")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Discount job #{self.id} for Order #{self.order_id} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest pending jobs first
+            models.Index(fields=['status', 'id'], name='discountjob_status_id_idx'),
+        ]
+
+    @classmethod
+    def enqueue(cls, order_ids):
+        """
+        Queue recalculation for `order_ids`, skipping orders that already have
+        a pending job. Returns the number of jobs created.
+        """
+        order_ids = set(order_ids)
+        queued = set(
+            cls.objects.filter(order_id__in=order_ids, status=cls.PENDING)
+            .values_list('order_id', flat=True)
+        )
+        jobs = cls.objects.bulk_create(
+            [cls(order_id=order_id) for order_id in sorted(order_ids - queued)],
+            batch_size=1000,
+        )
+        return len(jobs)
+
+
+class DailyRevenue(models.Model):
+    """
+    Revenue of the orders created on one day (in settings.TIME_ZONE), leaving
+    out Order.NON_REVENUE_STATUSES. Folded from RollupEntry rows (see core/rollups.py).
+    """
+    day = models.DateField(unique=True)
+    orders = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.orders} orders, ₹{self.gross - self.discount}"
+
+
+class DailyCategoryRevenue(models.Model):
+    """
+    Items sold per category on one day, for the same orders as DailyRevenue.
+    `orders` counts the orders with at least one item in the category.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, related_name='daily_revenue', on_delete=models.PROTECT)
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='dailycategoryrevenue_day_category_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.category_id}: ₹{self.gross}"
+
+
+class DailyDiscountTotal(models.Model):
+    """
+    Discounts given per discount type on one day, for the same orders as
+    DailyRevenue. `orders` counts the orders with a discount of the type.
+    """
+    day = models.DateField()
+    discount_type = models.CharField(max_length=50)
+    orders = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'discount_type'], name='dailydiscounttotal_day_type_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.discount_type}: ₹{self.amount}"
+
+
+class RollupEntry(models.Model):
+    """
+    A pending change to one revenue rollup row: DailyCategoryRevenue when
+    `category` is set, DailyDiscountTotal when `discount_type` is, otherwise
+    DailyRevenue.
+
+    Order writes only ever insert these, so checkouts never wait on each
+    other for the current day's rollup rows; `manage.py fold_rollups` adds
+    them to the rollups in batches and deletes them.
+    """
+    day = models.DateField()
+    category = models.ForeignKey(Category, null=True, blank=True, related_name='+', on_delete=models.PROTECT)
+    discount_type = models.CharField(max_length=50, blank=True)
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    gross = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    discount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "Rollup entries"
+
+    def __str__(self):
+        return f"{self.day} {self.category_id or self.discount_type or 'day'}"
+
+    @staticmethod
+    def day_of(order):
+        return timezone.localdate(order.created_at)
+
+    @classmethod
+    def for_items(cls, order, items, sign=1):
+        """
+        Entries adding (or with sign=-1, removing) an order and its items,
+        given as (category id, quantity, price) tuples.
+        """
+        day = cls.day_of(order)
+        gross = Decimal('0')
+        categories = {}
+        for category_id, quantity, price in items:
+            entry = categories.setdefault(category_id, cls(day=day, category_id=category_id, orders=sign))
+            entry.quantity += sign * quantity
+            entry.gross += sign * price * quantity
+            gross += sign * price * quantity
+        return [cls(day=day, orders=sign, gross=gross), *categories.values()]
+
+    @classmethod
+    def for_discounts(cls, order, discounts, sign=1):
+        """
+        Entries adding (or removing) an order's discounts, given as
+        (discount type, amount) pairs.
+        """
+        day = cls.day_of(order)
+        types = {}
+        for discount_type, amount in discounts:
+            entry = types.setdefault(discount_type, cls(day=day, discount_type=discount_type, orders=sign))
+            entry.discount += sign * amount
+        if not types:
+            return []
+        return [cls(day=day, discount=sum(entry.discount for entry in types.values())), *types.values()]
+
+    @classmethod
+    def for_orders(cls, order_ids, sign, items=True):
+        """
+        Entries adding (or removing) stored orders as they are now, read with
+        one query per table. With items=False only their discounts are covered.
+        """
+        orders = Order.objects.only('created_at').in_bulk(order_ids)
+        if not orders:
+            return []
+        item_rows, discount_rows = {}, {}
+        if items:
+            for order_id, *item in OrderItem.objects.filter(order_id__in=orders).values_list(
+                'order_id', 'product__category_id', 'quantity', 'price_at_purchase'
+            ):
+                item_rows.setdefault(order_id, []).append(item)
+        for order_id, *discount in Discount.objects.filter(order_id__in=orders).values_list(
+            'order_id', 'discount_type', 'amount'
+        ):
+            discount_rows.setdefault(order_id, []).append(discount)
+
+        entries = []
+        for order_id, order in orders.items():
+            if items:
+                entries += cls.for_items(order, item_rows.get(order_id, ()), sign)
+            entries += cls.for_discounts(order, discount_rows.get(order_id, ()), sign)
+        return entries
+
+    @classmethod
+    def record(cls, entries):
+        """
+        Combine entries for the same rollup row and insert the ones that
+        change anything, in one query.
+        """
+        merged = {}
+        for entry in entries:
+            key = (entry.day, entry.category_id, entry.discount_type)
+            total = merged.setdefault(key, cls(day=entry.day, category_id=entry.category_id,
+                                                discount_type=entry.discount_type))
+            total.orders += entry.orders
+            total.quantity += entry.quantity
+            total.gross += entry.gross
+            total.discount += entry.discount
+        changes = [entry for entry in merged.values()
+                   if entry.orders or entry.quantity or entry.gross or entry.discount]
+        if changes:
+            cls.objects.bulk_create(changes, batch_size=1000)
+
+
+class CacheVersion(models.Model):
+    """
+    The current version token of state cached in every process, such as the
+    compiled discount rules (see core/versions.py).
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    token = models.CharField(max_length=32)
+
+    def __str__(self):
+        return f"{self.name}: {self.token}"
+
+
+class CatalogChange(models.Model):
+    """
+    A product whose cached catalog entry every process must drop, or with
+    no product, the whole catalog (see core/catalog.py). Rows are recorded
+    in the transaction of the edit and deleted after a day.
+    """
+    product_id = models.IntegerField(null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Processes read the changes recorded since they last looked
+            models.Index(fields=['changed_at'], name='catalogchange_changed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id or 'all products'} at {self.changed_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to an order submission sent with an Idempotency-Key
+    header, replayed when the client retries with the same key (see
+    core/idempotency.py). Rows are only committed together with the orders
+    they created; `manage.py sweep_idempotency_keys` deletes expired ones.
+    """
+    user = models.ForeignKey(User, related_name='idempotency_keys', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the request method, path and body")
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotencykey_user_key_uniq'),
+        ]
+        indexes = [
+            # The sweeper deletes the oldest keys first
+            models.Index(fields=['created_at'], name='idempotencykey_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
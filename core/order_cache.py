@@ -0,0 +1,68 @@
+"""
+core/order_cache.py
+
+Cache of rendered orders.
+
+Each order is cached under a key that includes its `version` column, which
+every write to the order, its items or its discounts bumps in the same
+UPDATE. Edits to what an order embeds (its products, their categories and
+its user) bump the version of every order showing them (see
+core/signals.py). Invalidation is therefore just that version bump: entries
+for old versions are never read again and expire on their own, which keeps
+every worker consistent when the cache is shared. A page of orders is read
+with one get_many and written back with one set_many.
+"""
+from django.core.cache import cache
+
+from .instrumentation import phase, record_cache
+
+ORDER_CACHE_TIMEOUT = 300  # Cache for 5 mins
+
+
+def order_cache_key(order):
+    return f"order_{order.pk}_v{order.version}"
+
+
+def get_orders(orders):
+    """
+    Return {order id: cached representation} for the orders that are cached
+    at their current version.
+    """
+    keys = {order_cache_key(order): order.pk for order in orders}
+    with phase('order_cache'):
+        found = cache.get_many(keys)
+    record_cache(len(found), len(keys) - len(found))
+    return {keys[key]: data for key, data in found.items()}
+
+
+def set_orders(orders, data):
+    """
+    Cache the representations in `data` ({order id: representation}).
+    """
+    with phase('order_cache'):
+        cache.set_many(
+            {order_cache_key(order): data[order.pk] for order in orders},
+            timeout=ORDER_CACHE_TIMEOUT,
+        )
+
+
+async def aget_orders(orders):
+    """
+    Async version of get_orders.
+    """
+    keys = {order_cache_key(order): order.pk for order in orders}
+    with phase('order_cache'):
+        found = await cache.aget_many(keys)
+    record_cache(len(found), len(keys) - len(found))
+    return {keys[key]: data for key, data in found.items()}
+
+
+async def aset_orders(orders, data):
+    """
+    Async version of set_orders.
+    """
+    with phase('order_cache'):
+        await cache.aset_many(
+            {order_cache_key(order): data[order.pk] for order in orders},
+            timeout=ORDER_CACHE_TIMEOUT,
+        )
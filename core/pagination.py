@@ -0,0 +1,135 @@
+"""
+core/pagination.py
+
+Keyset (cursor) pagination for order listings.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Newest first; `order_created_id_idx` covers both directions
+ORDERING = ('-created_at', '-id')
+REVERSE_ORDERING = ('created_at', 'id')
+
+
+def encode_position(order, reverse=False):
+    """
+    Opaque cursor for the page after (or with `reverse`, before) `order`: its
+    (created_at, id) and the direction.
+    """
+    position = f"{order.created_at.isoformat()}|{order.pk}"
+    if reverse:
+        position += '|r'
+    return urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_position(cursor):
+    """
+    Inverse of encode_position: returns (created_at, id, reverse); raises
+    ValueError for a malformed cursor.
+    """
+    try:
+        created_at, pk, *direction = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        moment = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+    if moment is None or direction not in ([], ['r']):
+        raise ValueError('Invalid cursor')
+    return moment, pk, bool(direction)
+
+
+def after_position(queryset, created_at, pk, reverse=False):
+    """
+    The orders of `queryset` past (created_at, pk) in ORDERING, or before it
+    with `reverse` (nearest first), as a single range condition on the index.
+    """
+    if reverse:
+        return queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        ).order_by(*REVERSE_ORDERING)
+    return queryset.filter(
+        Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+    ).order_by(*ORDERING)
+
+
+class OrderCursorPagination(BasePagination):
+    """
+    Pages through orders newest first on the (created_at, id) keyset, backed
+    by the `order_created_id_idx` index, so every page costs the same no
+    matter how deep into the table it is, even when many orders share a
+    timestamp (bulk creation). Same response shape as DRF's CursorPagination.
+    """
+    cursor_query_param = 'cursor'
+    ordering = ORDERING
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        reverse = False
+        if cursor:
+            try:
+                created_at, pk, reverse = decode_position(cursor)
+            except ValueError:
+                raise NotFound('Invalid cursor')
+            queryset = after_position(queryset, created_at, pk, reverse)
+        else:
+            queryset = queryset.order_by(*ORDERING)
+
+        page = list(queryset[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+
+        # Coming back from a later page there is always a next one; coming
+        # forward from an earlier page there is always a previous one
+        self.next_order = page[-1] if page and (reverse or has_more) else None
+        self.previous_order = page[0] if page and cursor and (has_more or not reverse) else None
+        return page
+
+    def link(self, order, reverse=False):
+        if order is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_position(order, reverse))
+
+    def get_next_link(self):
+        return self.link(self.next_order)
+
+    def get_previous_link(self):
+        return self.link(self.previous_order, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
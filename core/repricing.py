@@ -0,0 +1,200 @@
+"""
+core/repricing.py
+
+Batch re-pricing of historical orders.
+
+Orders are processed in primary key chunks. For each chunk the database
+reduces the items to one row per (order, category) with the quantity and
+line total summed, so Python only sees a handful of rows per order; each
+order is then evaluated against the RuleSet live when it was placed, taken
+from one RuleSchedule for the whole run. Results are either
+written back with bulk operations or, in a dry run, only aggregated into a
+RepriceReport (e.g. "what would 15% off electronics have cost last quarter").
+
+Loyalty is judged on the users' current qualifying order counts, as
+apply_discounts does.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import DecimalField, F, Max, Min, Sum
+
+from .discounts import (
+    CENT, OrderSummary, RuleSchedule, discount_rows, evaluate, get_rules_version,
+    qualifies_for_loyalty, qualifying_order_counts, set_totals,
+)
+from .models import Discount, DiscountRule, Order, OrderItem, RollupEntry
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+@dataclass
+class RepriceReport:
+    """
+    Aggregate impact of re-pricing a set of orders.
+    """
+    orders: int = 0
+    changed: int = 0
+    subtotal: Decimal = Decimal('0')
+    discount_before: Decimal = Decimal('0')
+    discount_after: Decimal = Decimal('0')
+    before_by_type: dict = field(default_factory=dict)
+    after_by_type: dict = field(default_factory=dict)
+
+    @property
+    def delta(self):
+        return self.discount_after - self.discount_before
+
+
+def chunk_summaries(orders):
+    """
+    Return {order id: OrderSummary} for the orders in `orders`, using one
+    grouped query over their items.
+    """
+    rows = (
+        OrderItem.objects.filter(order__in=orders)
+        .values('order_id', 'product__category_id')
+        .annotate(
+            category_quantity=Sum('quantity'),
+            category_total=Sum(F('price_at_purchase') * F('quantity'), output_field=MONEY),
+            category_min_price=Min('price_at_purchase'),
+        )
+        .values_list('order_id', 'product__category_id', 'category_quantity', 'category_total', 'category_min_price')
+        .order_by()
+    )
+    summaries = {}
+    for order_id, category_id, quantity, total, min_price in rows:
+        summary = summaries.get(order_id)
+        if summary is None:
+            summary = summaries[order_id] = OrderSummary(Decimal('0'), 0, {}, {})
+        summary.total += total
+        summary.quantity += quantity
+        summary.category_quantities[category_id] = summary.category_quantities.get(category_id, 0) + quantity
+        summary.category_totals[category_id] = summary.category_totals.get(category_id, Decimal('0')) + total
+        summary.category_min_prices[category_id] = min(summary.category_min_prices.get(category_id, min_price), min_price)
+    return summaries
+
+
+def _add(totals, key, amount):
+    totals[key] = totals.get(key, Decimal('0')) + amount
+
+
+def what_if_schedule(extra_rules=(), drop_rule_ids=()):
+    """
+    Schedule of every active rule, including ones that ended long ago,
+    minus `drop_rule_ids`, plus hypothetical unsaved DiscountRule instances
+    in `extra_rules`.
+    """
+    rules = list(
+        DiscountRule.objects.filter(active=True).exclude(pk__in=drop_rule_ids)
+        .select_related('category').prefetch_related('bundle_categories')
+    )
+    # Negative ids keep hypothetical rules distinct from every saved rule
+    for index, rule in enumerate(extra_rules, start=1):
+        rule.id = -index
+        rules.append(rule)
+    return RuleSchedule(rules, get_rules_version())
+
+
+def hypothetical_rule(rule_type, *, percentage=None, threshold=None, flat_amount=None,
+                      category=None, min_quantity=None, free_quantity=None):
+    # `category` is a Category instance
+    return DiscountRule(
+        rule_type=rule_type,
+        percentage=percentage,
+        threshold=threshold,
+        flat_amount=flat_amount,
+        category=category,
+        min_quantity=min_quantity,
+        free_quantity=free_quantity,
+    )
+
+
+def delete_discounts(order_ids):
+    """
+    Delete the discounts of `order_ids` with one DELETE statement.
+
+    QuerySet.delete() would load every row to send post_delete, and the
+    totals receiver (core/signals.py) would then UPDATE the order once per
+    discount; the caller rewrites the totals of these orders anyway.
+    """
+    if not order_ids:
+        return
+    connection = connections[router.db_for_write(Discount)]
+    table = connection.ops.quote_name(Discount._meta.db_table)
+    column = connection.ops.quote_name(Discount._meta.get_field('order').column)
+    placeholders = ', '.join(['%s'] * len(order_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({placeholders})", order_ids)
+
+
+def reprice(queryset, schedule=None, chunk_size=2000, dry_run=False):
+    """
+    Re-evaluate the discounts of every order in `queryset` against the
+    rules of `schedule` (the active rules by default) live at its creation.
+
+    Unless `dry_run` is set, each chunk's discounts and totals are replaced
+    in one transaction, with a fixed number of statements per chunk.
+    Returns a RepriceReport.
+    """
+    schedule = schedule or what_if_schedule()
+    report = RepriceReport()
+
+    bounds = queryset.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return report
+
+    # Walk the table in primary key ranges so each chunk is an index range scan
+    for start in range(bounds['first'] - 1, bounds['last'], chunk_size):
+        chunk = queryset.filter(pk__gt=start, pk__lte=start + chunk_size).order_by()
+        orders = list(chunk.values_list('pk', 'user_id', 'status', 'discount_total', 'created_at'))
+        if not orders:
+            continue
+
+        summaries = chunk_summaries(chunk)
+        counts = qualifying_order_counts({user_id for _, user_id, _, _, _ in orders})
+        for discount_type, amount in (
+            Discount.objects.filter(order__in=chunk).values('discount_type')
+            .annotate(total=Sum('amount')).values_list('discount_type', 'total').order_by()
+        ):
+            _add(report.before_by_type, discount_type, amount)
+
+        updated, new_discounts, rollup_entries = [], [], []
+        for pk, user_id, status, discount_before, created_at in orders:
+            summary = summaries.get(pk) or OrderSummary(Decimal('0'), 0, {}, {})
+            loyalty_user = qualifies_for_loyalty(counts.get(user_id, 0), status)
+            lines = evaluate(schedule.at(created_at), summary, loyalty_user, user_id)
+
+            order = Order(pk=pk, created_at=created_at)
+            set_totals(order, summary, lines)
+            report.orders += 1
+            report.subtotal += order.subtotal
+            report.discount_before += discount_before
+            report.discount_after += order.discount_total
+            if order.discount_total.quantize(CENT) != discount_before:
+                report.changed += 1
+            for line in lines:
+                _add(report.after_by_type, line.discount_type, line.amount)
+
+            if not dry_run:
+                order.version = F('version') + 1
+                updated.append(order)
+                rows = discount_rows(order, lines)
+                new_discounts += rows
+                if status not in Order.NON_REVENUE_STATUSES:
+                    rollup_entries += RollupEntry.for_discounts(
+                        order, ((row.discount_type, row.amount) for row in rows)
+                    )
+
+        if not dry_run:
+            with transaction.atomic():
+                counted = [pk for pk, _, status, _, _ in orders if status not in Order.NON_REVENUE_STATUSES]
+                RollupEntry.record(RollupEntry.for_orders(counted, sign=-1, items=False) + rollup_entries)
+                delete_discounts([order.pk for order in updated])
+                Discount.objects.bulk_create(new_discounts)
+                Order.objects.bulk_update(
+                    updated, ['subtotal', 'discount_total', 'final_total', 'total_quantity', 'version']
+                )
+
+    return report
@@ -0,0 +1,251 @@
+"""
+core/rollups.py
+
+Daily revenue rollups: per day (DailyRevenue), per day and category
+(DailyCategoryRevenue) and per day and discount type (DailyDiscountTotal).
+
+Order writes record their effect as RollupEntry rows (see RollupEntry.record
+and its callers): orders and items when an order is created, discounts
+whenever they are (re)applied, and the removal of everything when an order
+moves to one of Order.NON_REVENUE_STATUSES or is deleted. `fold` adds
+pending entries to the rollups in batches; `rebuild_shard` recomputes a
+range of days from the orders themselves. Reports read the rollups plus any
+entries not folded yet, so they are current without touching order tables.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Category, DailyCategoryRevenue, DailyDiscountTotal, DailyRevenue, Discount, Order, OrderItem,
+    RollupEntry,
+)
+
+# rollup model: (key fields, {rollup field: RollupEntry field})
+ROLLUPS = {
+    DailyRevenue: (('day',), {'orders': 'orders', 'gross': 'gross', 'discount': 'discount'}),
+    DailyCategoryRevenue: (('day', 'category_id'), {'orders': 'orders', 'quantity': 'quantity', 'gross': 'gross'}),
+    DailyDiscountTotal: (('day', 'discount_type'), {'orders': 'orders', 'amount': 'discount'}),
+}
+ENTRY_FIELDS = ('day', 'category_id', 'discount_type', 'orders', 'quantity', 'gross', 'discount')
+
+
+def _rollup_of(entry):
+    if entry['category_id'] is not None:
+        return DailyCategoryRevenue
+    if entry['discount_type']:
+        return DailyDiscountTotal
+    return DailyRevenue
+
+
+def _pending_totals(entries):
+    # Sum pending entries per rollup row: {model: {key: {rollup field: delta}}}
+    totals = {model: {} for model in ROLLUPS}
+    for entry in entries:
+        model = _rollup_of(entry)
+        key_fields, fields = ROLLUPS[model]
+        row = totals[model].setdefault(tuple(entry[name] for name in key_fields), dict.fromkeys(fields, 0))
+        for field, source in fields.items():
+            row[field] += entry[source]
+    return totals
+
+
+def _apply(model, deltas):
+    """
+    Add {key: {field: delta}} to the rows of `model`: missing rows are
+    created empty first, then the rows are locked, shifted in memory and
+    written back with one bulk_update.
+    """
+    if not deltas:
+        return
+    key_fields, fields = ROLLUPS[model]
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key in deltas], ignore_conflicts=True, batch_size=1000
+    )
+    # Lock in a fixed order so concurrent folds cannot deadlock
+    rows = model.objects.filter(day__in={key[0] for key in deltas}).order_by('pk').select_for_update()
+    changed = []
+    for row in rows:
+        delta = deltas.get(tuple(getattr(row, name) for name in key_fields))
+        if delta is not None:
+            for field, value in delta.items():
+                setattr(row, field, getattr(row, field) + value)
+            changed.append(row)
+    model.objects.bulk_update(changed, list(fields), batch_size=1000)
+
+
+def fold(batch_size=5000):
+    """
+    Add pending RollupEntry rows to the rollups and delete them, oldest
+    first, one batch per transaction. Concurrent folds take disjoint batches
+    where the database supports SKIP LOCKED. Returns the number folded.
+    """
+    folded = 0
+    while True:
+        with transaction.atomic():
+            pending = RollupEntry.objects.order_by('pk')
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            entries = list(pending.values('pk', *ENTRY_FIELDS)[:batch_size])
+            if not entries:
+                return folded
+            for model, deltas in _pending_totals(entries).items():
+                _apply(model, deltas)
+            RollupEntry.objects.filter(pk__in=[entry['pk'] for entry in entries]).delete()
+        folded += len(entries)
+        if len(entries) < batch_size:
+            return folded
+
+
+def _day_bounds(first_day, last_day):
+    # [start of first_day, start of the day after last_day) in the current time zone
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(first_day, time.min, tzinfo=tz),
+        datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+def shards(first_day, last_day, days):
+    """
+    Split [first_day, last_day] into consecutive (first, last) ranges of at
+    most `days` days.
+    """
+    start = first_day
+    while start <= last_day:
+        end = min(start + timedelta(days=days - 1), last_day)
+        yield start, end
+        start = end + timedelta(days=1)
+
+
+def rebuild_shard(first_day, last_day):
+    """
+    Recompute the rollups of [first_day, last_day] from the orders with
+    three grouped queries, replacing the rollup rows and pending entries of
+    those days in one transaction.
+
+    Runs inside pool processes (see `manage.py rebuild_rollups`), so it only
+    takes and returns plain values: returns the number of orders counted.
+    Entries recorded by order writes that commit while this runs may be
+    counted twice or not at all; rebuild quiet days, or re-run the shard.
+    """
+    start, end = _day_bounds(first_day, last_day)
+    window = {'created_at__gte': start, 'created_at__lt': end}
+    related = {f'order__{lookup}': value for lookup, value in window.items()}
+    non_revenue = Order.NON_REVENUE_STATUSES
+
+    with transaction.atomic():
+        days = {
+            row['day']: DailyRevenue(day=row['day'], orders=row['orders'])
+            for row in Order.objects.filter(**window).exclude(status__in=non_revenue)
+            .annotate(day=TruncDate('created_at')).values('day')
+            .annotate(orders=Count('pk')).order_by()
+        }
+        categories = [
+            DailyCategoryRevenue(
+                day=row['day'], category_id=row['product__category_id'], orders=row['orders'],
+                quantity=row['units'], gross=row['total'],
+            )
+            for row in OrderItem.objects.filter(**related).exclude(order__status__in=non_revenue)
+            .annotate(day=TruncDate('order__created_at')).values('day', 'product__category_id')
+            .annotate(
+                orders=Count('order_id', distinct=True),
+                units=Sum('quantity'),
+                total=Sum(F('price_at_purchase') * F('quantity')),
+            )
+            .order_by()
+        ]
+        discounts = [
+            DailyDiscountTotal(**row)
+            for row in Discount.objects.filter(**related).exclude(order__status__in=non_revenue)
+            .annotate(day=TruncDate('order__created_at')).values('day', 'discount_type')
+            .annotate(orders=Count('order_id', distinct=True), amount=Sum('amount'))
+            .order_by()
+        ]
+        for row in categories:
+            days[row.day].gross += row.gross
+        for row in discounts:
+            days[row.day].discount += row.amount
+
+        for model in (DailyRevenue, DailyCategoryRevenue, DailyDiscountTotal, RollupEntry):
+            model.objects.filter(day__gte=first_day, day__lte=last_day).delete()
+        DailyRevenue.objects.bulk_create(days.values(), batch_size=1000)
+        DailyCategoryRevenue.objects.bulk_create(categories, batch_size=1000)
+        DailyDiscountTotal.objects.bulk_create(discounts, batch_size=1000)
+
+    return sum(row.orders for row in days.values())
+
+
+def money(amount):
+    return f"{Decimal(amount):.2f}"
+
+
+def report(since, until):
+    """
+    Rollups for the days in [since, until], including entries not folded yet.
+    """
+    pending = list(
+        RollupEntry.objects.filter(day__gte=since, day__lte=until)
+        .values('day', 'category_id', 'discount_type')
+        .annotate(
+            orders=Sum('orders'), quantity=Sum('quantity'), gross=Sum('gross'), discount=Sum('discount')
+        )
+        .order_by()
+    )
+    rows = {}
+    for model, deltas in _pending_totals(pending).items():
+        key_fields, fields = ROLLUPS[model]
+        stored = model.objects.filter(day__gte=since, day__lte=until).values(*key_fields, *fields)
+        totals = {tuple(row[name] for name in key_fields): row for row in stored}
+        for key, delta in deltas.items():
+            row = totals.setdefault(key, {**dict(zip(key_fields, key)), **dict.fromkeys(fields, 0)})
+            for field, value in delta.items():
+                row[field] += value
+        rows[model] = sorted(totals.values(), key=lambda row: tuple(str(row[name]) for name in key_fields))
+
+    names = Category.objects.in_bulk({row['category_id'] for row in rows[DailyCategoryRevenue]})
+    days = rows[DailyRevenue]
+    return {
+        'since': since,
+        'until': until,
+        'totals': {
+            'orders': sum(row['orders'] for row in days),
+            'gross': money(sum(row['gross'] for row in days)),
+            'discount': money(sum(row['discount'] for row in days)),
+            'net': money(sum(row['gross'] - row['discount'] for row in days)),
+        },
+        'days': [
+            {
+                'day': row['day'],
+                'orders': row['orders'],
+                'gross': money(row['gross']),
+                'discount': money(row['discount']),
+                'net': money(row['gross'] - row['discount']),
+            }
+            for row in days
+        ],
+        'categories': [
+            {
+                'day': row['day'],
+                'category_id': row['category_id'],
+                'category': getattr(names.get(row['category_id']), 'name', None),
+                'orders': row['orders'],
+                'quantity': row['quantity'],
+                'gross': money(row['gross']),
+            }
+            for row in rows[DailyCategoryRevenue]
+        ],
+        'discount_types': [
+            {
+                'day': row['day'],
+                'discount_type': row['discount_type'],
+                'orders': row['orders'],
+                'amount': money(row['amount']),
+            }
+            for row in rows[DailyDiscountTotal]
+        ],
+    }
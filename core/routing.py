@@ -0,0 +1,139 @@
+"""
+core/routing.py
+
+Read-replica routing.
+
+Writes, and reads by default, go to the `default` (primary) database. Views
+whose reads may be served by a replica (order list, retrieve and export,
+reports, and their async versions) call `read_from_replica` once the user is
+known; the rest of that request's reads then go to one of
+settings.DATABASE_REPLICAS, picked at random. A user who wrote within the
+last settings.READ_YOUR_WRITES_SECONDS is kept on the primary, so replica
+lag never hides their own changes from them (`pin_to_primary`).
+
+The pin travels with the client as a signed, timestamped cookie, so it holds
+whichever worker serves the next request and needs no shared cache. Clients
+that drop cookies get no read-your-writes guarantee.
+
+The choice is kept in a context variable, which ReplicaRoutingMiddleware
+resets after every request; it also sets the pin cookie on the response.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+PIN_SALT = 'core.routing.primary_pin'
+
+# Database alias for the current request's reads; None means the primary
+_reads = ContextVar('read_database', default=None)
+# {'user_id': ...} once the current request pinned its user; set per request
+# by the middleware (a mutable holder, so pins made in a sync view running in
+# another thread under ASGI are seen too)
+_pin = ContextVar('primary_pin', default=None)
+
+
+def pin_to_primary(user):
+    """
+    Serve `user`'s reads from the primary for the next
+    settings.READ_YOUR_WRITES_SECONDS, e.g. because they are about to write.
+    """
+    pin = _pin.get()
+    if (pin is not None and settings.DATABASE_REPLICAS and settings.READ_YOUR_WRITES_SECONDS
+            and user.is_authenticated):
+        pin['user_id'] = user.pk
+
+
+def is_pinned(request):
+    """
+    True if `request`'s user wrote within settings.READ_YOUR_WRITES_SECONDS,
+    according to the signed pin cookie.
+    """
+    pinned_user = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT, max_age=settings.READ_YOUR_WRITES_SECONDS
+    )
+    return pinned_user is not None and pinned_user == str(request.user.pk)
+
+
+def read_from_replica(request):
+    """
+    Route the rest of this request's reads to a replica, unless there are
+    none or its user wrote recently. Returns the alias reads now go to.
+    """
+    if settings.DATABASE_REPLICAS and not is_pinned(request):
+        _reads.set(random.choice(settings.DATABASE_REPLICAS))
+    return read_database()
+
+
+def read_database():
+    return _reads.get() or DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the replica chosen for the current request (if any) and
+    everything else to the primary. Replicas are copies of the primary, so
+    migrations only run there.
+    """
+    def db_for_read(self, model, **hints):
+        alias = _reads.get()
+        # Reads inside a transaction on the primary must see its writes
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Also for objects that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def _set_pin_cookie(response, pin):
+    if pin:
+        response.set_signed_cookie(
+            PIN_COOKIE, str(pin['user_id']), salt=PIN_SALT, max_age=settings.READ_YOUR_WRITES_SECONDS,
+            secure=settings.SESSION_COOKIE_SECURE, httponly=True, samesite='Lax',
+        )
+    return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Starts every request with reads on the primary and forgets the replica
+    chosen by the view afterwards; sets the pin cookie when the view pinned
+    its user to the primary. Supports both sync and async stacks.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, pin_token = _reads.set(None), _pin.set({})
+        try:
+            return _set_pin_cookie(self.get_response(request), _pin.get())
+        finally:
+            _reads.reset(token)
+            _pin.reset(pin_token)
+
+    async def __acall__(self, request):
+        token, pin_token = _reads.set(None), _pin.set({})
+        try:
+            return _set_pin_cookie(await self.get_response(request), _pin.get())
+        finally:
+            _reads.reset(token)
+            _pin.reset(pin_token)
@@ -0,0 +1,344 @@
+"""
+core/rule_types.py
+
+Registry of discount rule types.
+
+Every DiscountRule.rule_type is handled by a RuleType registered here. A
+RuleType compiles the live rules of its type into an index once per RuleSet
+and, for each order, offers candidate discounts read from the order's
+OrderSummary, so adding a type never adds a pass over the order items.
+
+Which candidates apply is decided in one place, `select`: candidates in the
+same stacking group exclude each other and the largest wins, ungrouped ones
+stack, and the total is capped at settings.DISCOUNT_CAP_PERCENT of the order
+total, trimming the lowest priority discounts first.
+
+To add a promotion type, add its code to DiscountRule.RULE_TYPE_CHOICES
+(plus any fields it needs) and register a RuleType subclass for it.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import DiscountRule
+
+CENT = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """
+    A single live discount rule, flattened to plain values.
+    """
+    id: int
+    rule_type: str
+    threshold: Decimal
+    percentage: Decimal
+    flat_amount: Decimal
+    category_id: int
+    min_quantity: int
+    description: str
+    free_quantity: int = None
+    bundle: tuple = ()
+    user_id: int = None
+    group: str = None
+
+
+@dataclass(frozen=True)
+class DiscountLine:
+    """
+    A discount to be applied to an order, before it is persisted.
+    """
+    discount_type: str
+    description: str
+    amount: Decimal
+
+
+@dataclass(frozen=True)
+class OrderContext:
+    """
+    What a RuleType may look at when offering discounts for an order.
+    """
+    summary: object
+    loyalty_user: bool
+    user_id: int = None
+
+
+def percent_of(amount, percentage):
+    return (amount * percentage / 100).quantize(CENT)
+
+
+class RuleType:
+    """
+    Base class for rule types.
+
+    `priority` orders the applied discounts (higher first) and protects them
+    from the cap (lower is trimmed first). `group` is the default stacking
+    group of the type's rules; None stacks with everything. `per_user` types
+    give different discounts to different users for the same cart.
+    """
+    code = None
+    priority = 0
+    group = None
+    per_user = False
+
+    def applicable(self, rule):
+        # Incomplete rules are dropped once, at compile time
+        return True
+
+    def describe(self, rule):
+        raise NotImplementedError
+
+    def index(self, rules):
+        """
+        Build the lookup structure `candidates` reads from `rules` (a list of
+        CompiledRule, sorted by id).
+        """
+        return tuple(rules)
+
+    def candidates(self, index, order):
+        """
+        Yield (CompiledRule, amount) for every rule in `index` that qualifies
+        for `order` (an OrderContext).
+        """
+        raise NotImplementedError
+
+
+RULE_TYPES = {}
+
+
+def register(rule_type):
+    """
+    Class decorator adding a RuleType to the registry under its code.
+    """
+    RULE_TYPES[rule_type.code] = rule_type()
+    return rule_type
+
+
+@register
+class CategoryRule(RuleType):
+    """
+    Percentage off a category's items when the order has at least
+    min_quantity of them. Stacks across categories and rules.
+    """
+    code = DiscountRule.CATEGORY_BASED
+    priority = 30
+
+    def applicable(self, rule):
+        return bool(rule.category_id and rule.percentage and rule.min_quantity)
+
+    def describe(self, rule):
+        return f"{rule.percentage}% off on {rule.category.name} (min {rule.min_quantity} items)"
+
+    def index(self, rules):
+        by_category = {}
+        for rule in rules:
+            by_category.setdefault(rule.category_id, []).append(rule)
+        return {category_id: tuple(rules) for category_id, rules in by_category.items()}
+
+    def candidates(self, index, order):
+        # Only categories present in the order can match, so walk those
+        summary = order.summary
+        for category_id, quantity in summary.category_quantities.items():
+            for rule in index.get(category_id, ()):
+                if quantity >= rule.min_quantity:
+                    yield rule, percent_of(summary.category_totals[category_id], rule.percentage)
+
+
+@register
+class BuyXGetYRule(CategoryRule):
+    """
+    For every min_quantity units bought in a category, free_quantity more
+    are free, valued at the cheapest unit price in that category.
+    """
+    code = DiscountRule.BUY_X_GET_Y
+    priority = 40
+
+    def applicable(self, rule):
+        return bool(rule.category_id and rule.min_quantity and rule.free_quantity)
+
+    def describe(self, rule):
+        return f"Buy {rule.min_quantity} get {rule.free_quantity} free on {rule.category.name}"
+
+    def candidates(self, index, order):
+        summary = order.summary
+        for category_id, quantity in summary.category_quantities.items():
+            for rule in index.get(category_id, ()):
+                free = quantity // (rule.min_quantity + rule.free_quantity) * rule.free_quantity
+                if free:
+                    yield rule, (free * summary.category_min_prices[category_id]).quantize(CENT)
+
+
+@register
+class BundleRule(RuleType):
+    """
+    Percentage off the items of every bundle category when the order has at
+    least min_quantity (default 1) units of each of them.
+    """
+    code = DiscountRule.BUNDLE
+    priority = 30
+
+    def applicable(self, rule):
+        return bool(rule.percentage) and len(rule.bundle_categories.all()) > 1
+
+    def describe(self, rule):
+        names = ' + '.join(sorted(category.name for category in rule.bundle_categories.all()))
+        return f"{rule.percentage}% off the {names} bundle"
+
+    def index(self, rules):
+        # Keyed by the bundle's first category, which every matching order has
+        by_category = {}
+        for rule in rules:
+            by_category.setdefault(rule.bundle[0], []).append(rule)
+        return {category_id: tuple(rules) for category_id, rules in by_category.items()}
+
+    def candidates(self, index, order):
+        summary = order.summary
+        quantities = summary.category_quantities
+        for category_id in quantities:
+            for rule in index.get(category_id, ()):
+                minimum = rule.min_quantity or 1
+                if all(quantities.get(member, 0) >= minimum for member in rule.bundle):
+                    total = sum(summary.category_totals[member] for member in rule.bundle)
+                    yield rule, percent_of(total, rule.percentage)
+
+
+@register
+class PercentageRule(RuleType):
+    """
+    Tiered percentage off the order total: the tier with the highest
+    threshold the total reaches applies (ties go to the newest rule).
+    """
+    code = DiscountRule.PERCENTAGE
+    priority = 20
+    group = 'percentage'
+
+    def applicable(self, rule):
+        return bool(rule.percentage)
+
+    def describe(self, rule):
+        return f"{rule.percentage}% off orders above ₹{rule.threshold}"
+
+    def index(self, rules):
+        tiers = sorted(rules, key=lambda rule: (rule.threshold, rule.id))
+        return tuple(rule.threshold for rule in tiers), tuple(tiers)
+
+    def candidates(self, index, order):
+        thresholds, tiers = index
+        position = bisect_right(thresholds, order.summary.total)
+        if position:
+            rule = tiers[position - 1]
+            yield rule, percent_of(order.summary.total, rule.percentage)
+
+
+@register
+class CouponRule(RuleType):
+    """
+    Personal coupon: a percentage or flat amount off every order its user
+    places while the rule is live. Only the best of a user's coupons applies.
+    """
+    code = DiscountRule.COUPON
+    priority = 15
+    group = 'coupon'
+    per_user = True
+
+    def applicable(self, rule):
+        return bool(rule.user_id and (rule.percentage or rule.flat_amount))
+
+    def describe(self, rule):
+        if rule.percentage:
+            return f"Coupon: {rule.percentage}% off"
+        return f"Coupon: ₹{rule.flat_amount} off"
+
+    def index(self, rules):
+        by_user = {}
+        for rule in rules:
+            by_user.setdefault(rule.user_id, []).append(rule)
+        return {user_id: tuple(rules) for user_id, rules in by_user.items()}
+
+    def candidates(self, index, order):
+        for rule in index.get(order.user_id, ()):
+            if rule.percentage:
+                yield rule, percent_of(order.summary.total, rule.percentage)
+            else:
+                yield rule, rule.flat_amount
+
+
+@register
+class FlatRule(RuleType):
+    """
+    Flat amount off for loyal users, on top of other discounts; the newest
+    flat rule applies.
+    """
+    code = DiscountRule.FLAT
+    priority = 10
+    group = 'loyalty'
+
+    def applicable(self, rule):
+        return bool(rule.flat_amount)
+
+    def describe(self, rule):
+        return f"Flat ₹{rule.flat_amount} off for loyalty program"
+
+    def index(self, rules):
+        return rules[-1]
+
+    def candidates(self, index, order):
+        if order.loyalty_user:
+            yield index, index.flat_amount
+
+
+def compile_rule(rule, rule_type):
+    return CompiledRule(
+        id=rule.id,
+        rule_type=rule.rule_type,
+        threshold=rule.threshold or Decimal('0'),
+        percentage=rule.percentage,
+        flat_amount=rule.flat_amount,
+        category_id=rule.category_id,
+        min_quantity=rule.min_quantity,
+        description=rule_type.describe(rule),
+        free_quantity=rule.free_quantity,
+        bundle=tuple(sorted(category.pk for category in rule.bundle_categories.all()))
+        if rule_type.code == DiscountRule.BUNDLE else (),
+        user_id=rule.user_id,
+        group=rule.stacking_group or rule_type.group,
+    )
+
+
+def select(candidates, total):
+    """
+    Turn (RuleType, CompiledRule, amount) candidates into the DiscountLines
+    to apply, in priority order.
+
+    Keeping the largest candidate of each stacking group plus every
+    ungrouped one maximises the total discount (each group contributes
+    independently), so one pass is the whole search. The cap then trims
+    from the lowest priority end.
+    """
+    stacked, best = [], {}
+    for candidate in candidates:
+        rule_type, rule, amount = candidate
+        if amount <= 0:
+            continue
+        if rule.group is None:
+            stacked.append(candidate)
+            continue
+        current = best.get(rule.group)
+        # Ties go to the higher priority type, then the earlier candidate
+        if current is None or (amount, rule_type.priority) > (current[2], current[0].priority):
+            best[rule.group] = candidate
+    chosen = stacked + list(best.values())
+    chosen.sort(key=lambda candidate: -candidate[0].priority)
+
+    remaining = (total * Decimal(settings.DISCOUNT_CAP_PERCENT) / 100).quantize(CENT)
+    lines = []
+    for _, rule, amount in chosen:
+        amount = min(amount, remaining)
+        if amount <= 0:
+            break
+        lines.append(DiscountLine(rule.rule_type, rule.description, amount))
+        remaining -= amount
+    return lines
@@ -7,14 +7,28 @@ Defines
 3. Discount Serializer
 4. Order Item Serializer
 5. Order Serializer
+6. Bulk Order Serializer
+7. Bulk Status Serializer
+8. Quote Serializer
 
 for handling API serialization, validation and responses.
 """
-from django.core.cache import cache
+from decimal import Decimal
+from django.db import connection
 from rest_framework import serializers
-from .models import Product, Order, OrderItem, Discount, User
+from .models import Product, Order, OrderItem, Discount, RollupEntry, User
+from .discounts import discount_rows, evaluate_bulk, summarize
+from . import catalog
+from .instrumentation import instrumented
+
+# Upper bound on orders accepted by a single bulk request
+BULK_ORDER_LIMIT = 5000
+# Upper bound on orders moved by a single bulk status update
+BULK_STATUS_LIMIT = 10000
 
 class ProductSerializer(serializers.ModelSerializer):
+    category = serializers.CharField(source='category.name', read_only=True)
+
     class Meta:
         model = Product
         fields = ['id', 'name', 'price', 'category']
@@ -31,13 +45,14 @@ class UserSerializer(serializers.ModelSerializer):
 
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(), write_only=True, source='product'
-    )
+    # Resolved for all items at once in OrderSerializer.validate_items
+    product_id = serializers.IntegerField(min_value=1, write_only=True)
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'product_id', 'quantity', 'price_at_purchase']
+        # Mirrors the orderitem_quantity_positive constraint
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
@@ -50,43 +65,189 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'created_at', 'status', 'user' , 'items', 'total_quantity', 'discounts', 'total_price', 'final_price']
-        read_only_fields = ['user', 'created_at']
+        # Status only changes through the update-status actions (see Order.STATUS_TRANSITIONS)
+        read_only_fields = ['user', 'created_at', 'status']
+
+    def validate_items(self, items):
+        # One catalog lookup for the whole cart
+        products = catalog.resolve(item['product_id'] for item in items)
+        missing = sorted({item['product_id'] for item in items} - products.keys())
+        if missing:
+            raise serializers.ValidationError(f"Invalid product ids: {', '.join(map(str, missing))}")
+        for item in items:
+            item['product'] = products[item['product_id']]
+        return items
 
+    @instrumented('order_create')
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         user = validated_data.pop('user')
-        order = Order.objects.create(user=user, **validated_data)
 
-        for item in items_data:
-            OrderItem.objects.create(
+        # Totals are known up front; discounts are added by apply_discounts
+        subtotal = sum((item['product'].price * item['quantity'] for item in items_data), Decimal('0'))
+        order = Order.objects.create(
+            user=user,
+            subtotal=subtotal,
+            final_total=subtotal,
+            total_quantity=sum(item['quantity'] for item in items_data),
+            **validated_data
+        )
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                product=item['product'],
+                product_id=item['product'].id,
                 quantity=item['quantity'],
                 price_at_purchase=item['product'].price
             )
+            for item in items_data
+        ])
+        RollupEntry.record(RollupEntry.for_items(
+            order, ((item['product'].category_id, item['quantity'], item['product'].price) for item in items_data)
+        ))
 
         return order
     
+    @instrumented('total_price')
     def get_total_price(self, obj):
-        cache_key = f"order_{obj.id}_total_price"
-        value = cache.get(cache_key)
-        if value is None:
-            value = f"{obj.get_total_price():.2f}"
-            cache.set(cache_key, value, timeout=300)  # Cache for 5 mins
-        return value
+        return f"{obj.subtotal:.2f}"
 
+    @instrumented('final_price')
     def get_final_price(self, obj):
-        cache_key = f"order_{obj.id}_final_price"
-        value = cache.get(cache_key)
-        if value is None:
-            value = f"{obj.get_final_price():.2f}"
-            cache.set(cache_key, value, timeout=300)
-        return value
+        return f"{obj.final_total:.2f}"
     
+    @instrumented('total_quantity')
     def get_total_quantity(self, obj):
-        cache_key = f"order_{obj.id}_total_quantity"
-        value = cache.get(cache_key)
-        if value is None:
-            value = sum(item.quantity for item in obj.items.all())
-            cache.set(cache_key, value, timeout=300)
-        return value
+        return obj.total_quantity
+
+class CartItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+class BulkOrderEntrySerializer(serializers.Serializer):
+    items = CartItemSerializer(many=True, allow_empty=False)
+
+class BulkOrderSerializer(serializers.Serializer):
+    """
+    Creates many orders at once.
+
+    Products for the whole batch are resolved through the catalog, orders
+    and items are written with `bulk_create` and discounts are evaluated for
+    the batch together, so the query count does not grow with the batch size.
+    """
+    orders = BulkOrderEntrySerializer(many=True, allow_empty=False, max_length=BULK_ORDER_LIMIT)
+
+    def validate(self, attrs):
+        product_ids = {
+            item['product_id'] for order in attrs['orders'] for item in order['items']
+        }
+        products = catalog.resolve(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(
+                {'orders': f"Invalid product ids: {', '.join(map(str, missing))}"}
+            )
+        attrs['products'] = products
+        return attrs
+
+    def create(self, validated_data):
+        user = validated_data['user']
+        products = validated_data['products']
+        orders_data = validated_data['orders']
+
+        summaries = [
+            summarize(
+                (products[item['product_id']].category_id, item['quantity'], products[item['product_id']].price)
+                for item in order_data['items']
+            )
+            for order_data in orders_data
+        ]
+
+        # Discounts only depend on the summaries, so every total is known
+        # before anything is written.
+        orders = [Order(user=user) for _ in orders_data]
+        discounts = evaluate_bulk(orders, summaries)
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            Order.objects.bulk_create(orders, batch_size=1000)
+        else:
+            # Primary keys are needed for the items below
+            for order in orders:
+                order.save()
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product_id=item['product_id'],
+                quantity=item['quantity'],
+                price_at_purchase=products[item['product_id']].price
+            )
+            for order, order_data in zip(orders, orders_data)
+            for item in order_data['items']
+        ], batch_size=1000)
+        discount_rows_by_order = [discount_rows(order, lines) for order, lines in zip(orders, discounts)]
+        Discount.objects.bulk_create(
+            [row for rows in discount_rows_by_order for row in rows], batch_size=1000
+        )
+        # Every order's items and discounts are known here, so the rollup
+        # entries need no queries of their own
+        entries = []
+        for order, order_data, rows in zip(orders, orders_data, discount_rows_by_order):
+            entries += RollupEntry.for_items(order, (
+                (products[item['product_id']].category_id, item['quantity'], products[item['product_id']].price)
+                for item in order_data['items']
+            ))
+            entries += RollupEntry.for_discounts(order, ((row.discount_type, row.amount) for row in rows))
+        RollupEntry.record(entries)
+
+        return list(zip(orders, discounts))
+
+    def to_representation(self, instance):
+        results = []
+        for order, lines in instance:
+            results.append({
+                'id': order.id,
+                'created_at': serializers.DateTimeField().to_representation(order.created_at),
+                'status': order.status,
+                'total_quantity': order.total_quantity,
+                'discounts': discount_lines_representation(lines),
+                'total_price': f"{order.subtotal:.2f}",
+                'final_price': f"{order.final_total:.2f}",
+            })
+        return {'created': len(results), 'orders': results}
+
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    Validates a bulk status update; transitions are checked per order.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=BULK_STATUS_LIMIT
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+class QuoteSerializer(serializers.Serializer):
+    """
+    Validates a cart for a price preview; nothing is written.
+    """
+    items = CartItemSerializer(many=True, allow_empty=False)
+
+def discount_lines_representation(lines):
+    # Same shape as DiscountSerializer, for lines that are not saved rows
+    return [
+        {
+            'discount_type': line.discount_type,
+            'description': line.description,
+            'amount': f"{line.amount:.2f}"
+        }
+        for line in lines
+    ]
+
+def quote_representation(summary, lines):
+    discount_total = sum(line.amount for line in lines)
+    return {
+        'total_quantity': summary.quantity,
+        'discounts': discount_lines_representation(lines),
+        'total_price': f"{summary.total:.2f}",
+        'discount_total': f"{discount_total:.2f}",
+        'final_price': f"{summary.total - discount_total:.2f}",
+    }
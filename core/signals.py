@@ -1,20 +1,135 @@
-from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.core.cache import cache
-from .models import OrderItem, Discount
+from .models import Order, OrderItem, Discount, DiscountRule, Category, CustomerLoyalty, Product, RollupEntry
+from .discounts import bump_rules_version
+from .catalog import product_changed
 
-def invalidate_order_cache(order_id):
-    cache.delete(f"order_{order_id}_total_price")
-    cache.delete(f"order_{order_id}_final_price")
-    cache.delete(f"order_{order_id}_total_quantity")
+# Order totals are maintained incrementally: each receiver shifts the stored
+# totals by the difference the saved/deleted row makes. Rows saved without a
+# known previous value fall back to recomputing the order from scratch.
 
 @receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, created, **kwargs):
+    quantity, price = instance.quantity, instance.price_at_purchase
+    if created:
+        Order.adjust_totals(instance.order_id, subtotal=price * quantity, quantity=quantity)
+    else:
+        old_quantity, old_price = getattr(instance, '_stored_values', (None, None))
+        if old_quantity is None or old_price is None:
+            Order.objects.filter(pk=instance.order_id).recompute_totals()
+        else:
+            Order.adjust_totals(
+                instance.order_id,
+                subtotal=price * quantity - old_price * old_quantity,
+                quantity=quantity - old_quantity,
+            )
+    instance._stored_values = (quantity, price)
+
 @receiver(post_delete, sender=OrderItem)
-def order_item_changed(sender, instance, **kwargs):
-    invalidate_order_cache(instance.order.id)
+def order_item_deleted(sender, instance, **kwargs):
+    quantity, price = getattr(instance, '_stored_values', (instance.quantity, instance.price_at_purchase))
+    if quantity is None or price is None:
+        Order.objects.filter(pk=instance.order_id).recompute_totals()
+    else:
+        Order.adjust_totals(instance.order_id, subtotal=-(price * quantity), quantity=-quantity)
 
 @receiver(post_save, sender=Discount)
+def discount_saved(sender, instance, created, **kwargs):
+    if created:
+        Order.adjust_totals(instance.order_id, discount=instance.amount)
+    else:
+        old_amount = getattr(instance, '_stored_amount', None)
+        if old_amount is None:
+            Order.objects.filter(pk=instance.order_id).recompute_totals()
+        else:
+            Order.adjust_totals(instance.order_id, discount=instance.amount - old_amount)
+    instance._stored_amount = instance.amount
+
 @receiver(post_delete, sender=Discount)
-def discount_changed(sender, instance, **kwargs):
-    if instance.order_id:
-        invalidate_order_cache(instance.order_id)
\ No newline at end of file
+def discount_deleted(sender, instance, **kwargs):
+    amount = getattr(instance, '_stored_amount', instance.amount)
+    if amount is None:
+        Order.objects.filter(pk=instance.order_id).recompute_totals()
+    else:
+        Order.adjust_totals(instance.order_id, discount=-amount)
+
+# Loyalty stats follow orders into and out of the loyalty statuses.
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    if created:
+        was_loyal = False
+    elif getattr(instance, '_stored_status', None) is None:
+        # Previous status unknown, so recount this user's orders instead
+        CustomerLoyalty.rebuild([instance.user_id])
+        instance._stored_status = instance.status
+        return
+    else:
+        was_loyal = instance._stored_status in Order.LOYALTY_STATUSES
+        # New orders enter the revenue rollups once their items are written;
+        # saves (e.g. from the admin) that change whether they count move them
+        was_counted = instance._stored_status not in Order.NON_REVENUE_STATUSES
+        is_counted = instance.status not in Order.NON_REVENUE_STATUSES
+        if was_counted != is_counted:
+            RollupEntry.record(RollupEntry.for_orders([instance.pk], sign=1 if is_counted else -1))
+
+    is_loyal = instance.status in Order.LOYALTY_STATUSES
+    if was_loyal != is_loyal:
+        sign = 1 if is_loyal else -1
+        CustomerLoyalty.adjust(instance.user_id, sign, sign * instance.final_total)
+    instance._stored_status = instance.status
+
+# Deleted orders leave the revenue rollups; read before the items and discounts go
+@receiver(pre_delete, sender=Order)
+def order_deleting(sender, instance, **kwargs):
+    if instance.status not in Order.NON_REVENUE_STATUSES:
+        RollupEntry.record(RollupEntry.for_orders([instance.pk], sign=-1))
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    if instance.status in Order.LOYALTY_STATUSES:
+        # The user may be going away too, so never recreate a missing row here
+        CustomerLoyalty.adjust(instance.user_id, -1, -instance.final_total, rebuild_missing=False)
+
+# Category names are baked into compiled category rules, so renames count too.
+# The bump is part of the edit's transaction, so the new version becomes
+# visible to other workers together with the edited rows.
+@receiver(post_save, sender=DiscountRule)
+@receiver(post_delete, sender=DiscountRule)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def discount_rules_changed(sender, **kwargs):
+    bump_rules_version()
+
+@receiver(m2m_changed, sender=DiscountRule.bundle_categories.through)
+def bundle_categories_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_rules_version()
+
+# Prices and categories are cached per process (see core/catalog.py); the
+# change is recorded in the edit's transaction, like the rules version.
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    product_changed(instance.pk)
+
+# Cached orders embed their items' products (with category names) and their
+# user, so edits to those re-render the orders that show them. Creating or
+# deleting a product, category or user changes no existing order's output
+# (deleting cascades through the order's own rows).
+@receiver(post_save, sender=Product)
+def product_displayed_changed(sender, instance, created, **kwargs):
+    if not created:
+        Order.objects.containing_products([instance.pk]).touch()
+
+@receiver(post_save, sender=Category)
+def category_displayed_changed(sender, instance, created, **kwargs):
+    if not created:
+        products = Product.objects.filter(category=instance).values('pk')
+        Order.objects.containing_products(products).touch()
+
+@receiver(post_save, sender=User)
+def user_displayed_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only save last_login
+    if not created and (update_fields is None or 'username' in update_fields):
+        Order.objects.filter(user=instance).touch()
@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core import catalog, versions
+from core.models import Category, Product
+
+
+class EngineTestCase(TestCase):
+    """
+    A customer with an API client, and a product in each of two categories.
+    """
+
+    def setUp(self):
+        # Caches outlive the rolled back transaction of each test
+        cache.clear()
+        catalog.clear()
+        versions.expire()
+        self.electronics = Category.objects.get_or_create(name='electronics')[0]
+        self.fashion = Category.objects.get_or_create(name='fashion')[0]
+        self.tv = Product.objects.create(name='TV', price=Decimal('3000.00'), category=self.electronics)
+        self.shirt = Product.objects.create(name='Shirt', price=Decimal('10.55'), category=self.fashion)
+        self.user = User.objects.create_user('customer', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_order(self, *items, **headers):
+        """
+        POST an order of (product, quantity) pairs; returns the response.
+        """
+        return self.client.post('/api/orders/', {'items': [
+            {'product_id': product.pk, 'quantity': quantity, 'price_at_purchase': '0'}
+            for product, quantity in items
+        ]}, format='json', **headers)
@@ -0,0 +1,89 @@
+from base64 import b64encode
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+
+from core.models import DiscountRule, Order
+from core.pagination import encode_position
+
+from .base import EngineTestCase
+
+
+class AsyncViewTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics,
+                                    percentage=5, min_quantity=3)
+        self.async_client.force_login(self.user)
+
+    async def acreate_order(self, quantity):
+        return (await sync_to_async(self.create_order)((self.tv, quantity))).data['id']
+
+    async def aget_sync(self, path):
+        return (await sync_to_async(self.client.get)(path)).data
+
+    async def test_list_matches_the_sync_list(self):
+        for quantity in range(1, 6):
+            await self.acreate_order(quantity)
+        expected = (await self.aget_sync('/api/orders/?page_size=2'))['results']
+        response = await self.async_client.get('/api/async/orders/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        page = response.json()
+        self.assertEqual(page['results'], expected)
+
+        seen = [order['id'] for order in page['results']]
+        while page['next']:
+            page = (await self.async_client.get(page['next'])).json()
+            seen += [order['id'] for order in page['results']]
+        ids = [pk async for pk in Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True)]
+        self.assertEqual(seen, ids)
+
+    async def test_cursors(self):
+        order = await Order.objects.acreate(user=self.user)
+        response = await self.async_client.get('/api/async/orders/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+        # The list only links forward
+        response = await self.async_client.get('/api/async/orders/', {'cursor': encode_position(order, reverse=True)})
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get('/api/async/orders/', {'cursor': encode_position(order)})
+        self.assertEqual(response.json(), {'next': None, 'results': []})
+
+    async def test_detail(self):
+        pk = await self.acreate_order(3)
+        response = await self.async_client.get(f'/api/async/orders/{pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), await self.aget_sync(f'/api/orders/{pk}/'))
+        self.assertEqual(response.json()['discounts'][0]['amount'], '450.00')
+
+    async def test_detail_of_another_users_order(self):
+        other = await User.objects.acreate(username='other')
+        order = await Order.objects.acreate(user=other)
+        response = await self.async_client.get(f'/api/async/orders/{order.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_quote(self):
+        response = await self.async_client.post('/api/async/orders/quote/', {'items': [
+            {'product_id': self.tv.pk, 'quantity': 3}, {'product_id': self.shirt.pk, 'quantity': 1},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['discount_total'], response.json()['final_price']), ('450.00', '8560.55'))
+        self.assertFalse(await Order.objects.aexists())
+
+        response = await self.async_client.post('/api/async/orders/quote/', {'items': [
+            {'product_id': 0, 'quantity': 1},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_authentication(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get('/api/async/orders/')).status_code, 401)
+        credentials = b64encode(b'customer:password').decode()
+        response = await client.get('/api/async/orders/', headers={'Authorization': f'Basic {credentials}'})
+        self.assertEqual(response.status_code, 200)
+
+        # Session users must pass the CSRF check on unsafe methods, like DRF
+        client = AsyncClient(enforce_csrf_checks=True)
+        await client.aforce_login(self.user)
+        response = await client.post('/api/async/orders/quote/', {'items': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
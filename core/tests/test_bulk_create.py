@@ -0,0 +1,60 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Discount, DiscountRule, Order, RollupEntry
+from core.serializers import BULK_ORDER_LIMIT
+
+from .base import EngineTestCase
+
+
+class BulkCreateTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        DiscountRule.objects.create(rule_type='percentage', threshold=5000, percentage=10)
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics, percentage=5, min_quantity=3)
+
+    def bulk_create(self, carts):
+        return self.client.post('/api/orders/bulk/', {'orders': [
+            {'items': [{'product_id': product.pk, 'quantity': quantity} for product, quantity in cart]}
+            for cart in carts
+        ]}, format='json')
+
+    def test_orders_and_discounts(self):
+        response = self.bulk_create([[(self.tv, 3), (self.shirt, 1)], [(self.shirt, 2)]])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['created'], 2)
+        big, small = response.data['orders']
+        self.assertEqual((big['total_price'], big['final_price']), ('9010.55', '7659.49'))
+        self.assertEqual([line['discount_type'] for line in big['discounts']], ['category_based', 'percentage'])
+        self.assertEqual((small['total_price'], small['discounts']), ('21.10', []))
+
+        for order in Order.objects.with_computed_totals():
+            self.assertEqual(order.subtotal, order.computed_subtotal)
+            self.assertEqual(order.discount_total, order.computed_discount_total)
+            self.assertEqual(order.total_quantity, order.computed_quantity)
+        self.assertEqual(Discount.objects.count(), 2)
+        self.assertTrue(RollupEntry.objects.exists())
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def queries(count):
+            with CaptureQueriesContext(connection) as context:
+                response = self.bulk_create([[(self.tv, 3), (self.shirt, 1)]] * count)
+            self.assertEqual(response.status_code, 201)
+            return len(context)
+
+        # The first batch also fills the rule set and catalog caches
+        queries(1)
+        self.assertEqual(queries(2), queries(50))
+
+    def test_invalid_product_writes_nothing(self):
+        response = self.client.post('/api/orders/bulk/', {'orders': [
+            {'items': [{'product_id': self.tv.pk, 'quantity': 1}]},
+            {'items': [{'product_id': 0, 'quantity': 1}]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_limits(self):
+        self.assertEqual(self.client.post('/api/orders/bulk/', {'orders': []}, format='json').status_code, 400)
+        self.assertEqual(self.bulk_create([[]]).status_code, 400)
+        self.assertEqual(self.bulk_create([[(self.shirt, 1)]] * (BULK_ORDER_LIMIT + 1)).status_code, 400)
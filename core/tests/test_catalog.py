@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+from django.test import override_settings
+from django.utils import timezone
+
+from core import catalog
+from core.catalog import CHANGE_GRACE, CHANGE_RETENTION, ProductLRU
+from core.models import CatalogChange, Product
+
+from .base import EngineTestCase
+
+
+class CatalogTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [self.tv, self.shirt]
+
+    def resolve(self):
+        return catalog.resolve(product.pk for product in self.products)
+
+    def test_cached(self):
+        self.resolve()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve()[self.tv.pk].price, Decimal('3000.00'))
+
+    def test_product_edit_keeps_the_others(self):
+        self.resolve()
+        self.tv.price = Decimal('2500.00')
+        self.tv.save()
+        hits = catalog.stats()['hits']
+        with self.assertNumQueries(1):
+            entries = self.resolve()
+        self.assertEqual(entries[self.tv.pk].price, Decimal('2500.00'))
+        # Only the edited product was reloaded
+        self.assertEqual(catalog.stats()['hits'], hits + 1)
+
+    def test_deleted_product(self):
+        self.resolve()
+        self.shirt.delete()
+        self.assertEqual(set(self.resolve()), {self.tv.pk})
+
+    @override_settings(VERSION_CHECK_INTERVAL=60)
+    def test_change_by_another_process(self):
+        self.resolve()
+        # Another worker's edit only reaches this one through its change row
+        Product.objects.filter(pk=self.tv.pk).update(price=Decimal('2500.00'))
+        CatalogChange.objects.create(product_id=self.tv.pk)
+        self.assertEqual(self.resolve()[self.tv.pk].price, Decimal('3000.00'))
+        with override_settings(VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(self.resolve()[self.tv.pk].price, Decimal('2500.00'))
+            # Each change is applied once
+            with self.assertNumQueries(1):
+                self.resolve()
+
+    @override_settings(VERSION_CHECK_INTERVAL=0)
+    def test_change_committed_late(self):
+        self.resolve()
+        self.resolve()
+        # Recorded before the last read, but committed after it
+        Product.objects.filter(pk=self.tv.pk).update(price=Decimal('2500.00'))
+        CatalogChange.objects.create(product_id=self.tv.pk, changed_at=timezone.now() - CHANGE_GRACE / 2)
+        self.assertEqual(self.resolve()[self.tv.pk].price, Decimal('2500.00'))
+
+    @override_settings(VERSION_CHECK_INTERVAL=0)
+    def test_bulk_edit(self):
+        self.resolve()
+        Product.objects.update(price=Decimal('1.00'))
+        catalog.bump_catalog_version()
+        self.assertEqual({entry.price for entry in self.resolve().values()}, {Decimal('1.00')})
+
+    @override_settings(VERSION_CHECK_INTERVAL=0)
+    def test_not_synced_for_too_long(self):
+        self.resolve()
+        catalog._changes.synced_at -= CHANGE_RETENTION
+        with self.assertNumQueries(2):
+            self.resolve()
+
+    def test_old_changes_are_deleted(self):
+        old = CatalogChange.objects.create(product_id=self.tv.pk, changed_at=timezone.now() - CHANGE_RETENTION * 2)
+        self.tv.save()
+        self.assertFalse(CatalogChange.objects.filter(pk=old.pk).exists())
+        self.assertTrue(CatalogChange.objects.filter(product_id=self.tv.pk).exists())
+
+    def test_lru(self):
+        lru = ProductLRU(2)
+        entries = [catalog.CatalogEntry(index, Decimal('1'), 1) for index in range(3)]
+        found, missing, generation = lru.get_many([0, 1, 2])
+        lru.set_many(entries, generation)
+        self.assertEqual(lru.stats()['evictions'], 1)
+        self.assertEqual(set(lru.get_many([0, 1, 2])[0]), {1, 2})
+        # Entries read before a product changed are not cached
+        generation = lru.get_many([0])[2]
+        lru.discard([1])
+        lru.set_many(entries[:1], generation)
+        self.assertEqual(lru.get_many([0])[1], [0])
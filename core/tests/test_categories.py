@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import ProtectedError
+from django.test import TransactionTestCase
+
+from core.discounts import get_rule_set
+from core.models import Category, DiscountRule, Product
+
+from .base import EngineTestCase
+
+
+class CategoryTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics,
+                                    percentage=Decimal('5'), min_quantity=3)
+
+    def test_rules_are_indexed_by_category_id(self):
+        index = next(index for rule_type, index in get_rule_set().indexes if rule_type.code == 'category_based')
+        self.assertEqual(list(index), [self.electronics.pk])
+
+    def test_renamed_category_keeps_its_rules(self):
+        self.electronics.name = 'Electronics & TV'
+        self.electronics.save()
+        order = self.create_order((self.tv, 3)).data
+        self.assertEqual(order['discounts'][0]['amount'], '450.00')
+        self.assertEqual(order['items'][0]['product']['category'], 'Electronics & TV')
+
+    def test_same_name_in_another_case(self):
+        # Only the rule's own category matches, whatever the names
+        other = Category.objects.create(name='Electronics')
+        radio = Product.objects.create(name='Radio', price=Decimal('100.00'), category=other)
+        self.assertEqual(self.create_order((radio, 3)).data['discounts'], [])
+
+    def test_categories_in_use_are_protected(self):
+        with self.assertRaises(ProtectedError):
+            self.fashion.delete()
+
+
+class CategoryMigrationTests(TransactionTestCase):
+    before = [('core', '0008_discountjob')]
+    after = [('core', '0009_product_category_fk')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_links_products_to_categories(self):
+        apps = self.migrate(self.before)
+        Category = apps.get_model('core', 'Category')
+        Product = apps.get_model('core', 'Product')
+        Category.objects.create(name='Electronics')
+        home = Category.objects.create(name='home & living')
+        for name, value in [('TV', 'electronics'), ('Sofa', 'home'), ('Mug', 'kitchen')]:
+            Product.objects.create(name=name, price=Decimal('1.00'), category=value)
+
+        apps = self.migrate(self.after)
+        Product = apps.get_model('core', 'Product')
+        linked = dict(Product.objects.values_list('name', 'category__name'))
+        self.assertEqual(linked, {'TV': 'Electronics', 'Sofa': 'home & living', 'Mug': 'kitchen'})
+        self.assertEqual(Product.objects.get(name='Sofa').category_id, home.pk)
+
+        # And back to the old values
+        apps = self.migrate(self.before)
+        Product = apps.get_model('core', 'Product')
+        self.assertEqual(dict(Product.objects.values_list('name', 'category')),
+                         {'TV': 'electronics', 'Sofa': 'home', 'Mug': 'kitchen'})
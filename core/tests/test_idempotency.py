@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+
+from core import idempotency
+from core.models import IdempotencyKey, Order
+
+from .base import EngineTestCase
+
+
+class IdempotencyTests(EngineTestCase):
+    def test_replay(self):
+        first = self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(first.status_code, 201, first.content)
+        with self.assertNumQueries(1):
+            replayed = self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_fingerprint_mismatch(self):
+        self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        response = self.create_order((self.tv, 2), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.client.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_errors_are_not_stored(self):
+        response = self.client.post('/api/orders/', {'items': [{'product_id': 0, 'quantity': 1}]},
+                                    format='json', HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='checkout-1').status_code, 201)
+
+    def test_invalid_key(self):
+        self.assertEqual(self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='x' * 256).status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_bulk_replay(self):
+        body = {'orders': [{'items': [{'product_id': self.tv.pk, 'quantity': 1}]}] * 3}
+        first = self.client.post('/api/orders/bulk/', body, format='json', HTTP_IDEMPOTENCY_KEY='bulk-1')
+        replayed = self.client.post('/api/orders/bulk/', body, format='json', HTTP_IDEMPOTENCY_KEY='bulk-1')
+        self.assertEqual(replayed.json(), first.json())
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_sweep(self):
+        self.create_order((self.tv, 1), HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(idempotency.sweep(timedelta(days=1)), 0)
+        self.assertEqual(idempotency.sweep(timedelta(0)), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
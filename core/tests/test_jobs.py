@@ -0,0 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+
+from core import versions
+from core.discounts import get_rule_set
+from core.jobs import MAX_ATTEMPTS, claim_jobs, finish_jobs, process_chunk, reclaim_stale_jobs
+from core.models import CacheVersion, DiscountJob, DiscountRule, Order
+
+from .base import EngineTestCase
+
+
+@override_settings(DISCOUNTS_ASYNC=True)
+class DiscountJobTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rule = DiscountRule.objects.create(rule_type='percentage', threshold=5000, percentage=10)
+        response = self.create_order((self.tv, 3))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.order = Order.objects.get(pk=response.data['id'])
+
+    def run_worker(self, *args):
+        call_command('run_discount_worker', '--once', *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_created_orders_are_queued(self):
+        self.assertEqual(self.order.final_total, Decimal('9000.00'))
+        self.assertEqual(list(DiscountJob.objects.values_list('order_id', flat=True)), [self.order.pk])
+        self.run_worker()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.final_total, Decimal('8100.00'))
+        self.assertFalse(DiscountJob.objects.exists())
+
+    def test_enqueue_skips_pending_orders(self):
+        self.assertEqual(DiscountJob.enqueue([self.order.pk]), 0)
+        self.assertEqual(DiscountJob.objects.count(), 1)
+
+    def test_enqueue_open_orders(self):
+        self.run_worker()
+        shipped = Order.objects.create(user=self.user, status='shipped')
+        self.rule.percentage = 20
+        self.rule.save()
+        self.run_worker('--enqueue-open')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.final_total, Decimal('7200.00'))
+        self.assertFalse(DiscountJob.objects.filter(order=shipped).exists())
+
+    def test_claims_are_exclusive(self):
+        jobs = claim_jobs('worker-1', 10)
+        self.assertEqual([order_id for _, order_id in jobs], [self.order.pk])
+        self.assertEqual(claim_jobs('worker-2', 10), [])
+        self.assertEqual(reclaim_stale_jobs(timedelta(hours=1)), 0)
+        self.assertEqual(reclaim_stale_jobs(timedelta(0)), 1)
+        self.assertEqual(len(claim_jobs('worker-2', 10)), 1)
+
+    def test_failed_jobs_are_retried(self):
+        for _ in range(MAX_ATTEMPTS):
+            jobs = claim_jobs('worker', 10)
+            self.assertEqual(len(jobs), 1)
+            finish_jobs([], {jobs[0][0]: 'RuntimeError: boom'})
+        job = DiscountJob.objects.get()
+        self.assertEqual((job.status, job.attempts, job.error), (DiscountJob.FAILED, MAX_ATTEMPTS, 'RuntimeError: boom'))
+        self.assertEqual(claim_jobs('worker', 10), [])
+
+    @override_settings(VERSION_CHECK_INTERVAL=60)
+    def test_chunks_reload_the_rules(self):
+        get_rule_set()
+        # Another process edits the rule: only the database changes
+        DiscountRule.objects.filter(pk=self.rule.pk).update(percentage=20)
+        CacheVersion.objects.filter(name=versions.RULES).update(token='edited-elsewhere')
+        succeeded, failed = process_chunk(claim_jobs('worker', 10))
+        self.assertEqual((len(succeeded), failed), (1, {}))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.final_total, Decimal('7200.00'))
+
+
+class RecalculateButtonTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.placed = Order.objects.create(user=self.user)
+        self.shipped = Order.objects.create(user=self.user, status='shipped')
+
+    def test_queues_open_orders(self):
+        self.assertContains(self.client.get('/admin/core/discountrule/'), 'Recalculate all open orders')
+        response = self.client.post('/admin/core/discountrule/recalculate/')
+        self.assertRedirects(response, '/admin/core/discountrule/')
+        self.assertEqual(list(DiscountJob.objects.values_list('order_id', flat=True)), [self.placed.pk])
+
+    def test_post_only(self):
+        self.assertEqual(self.client.get('/admin/core/discountrule/recalculate/').status_code, 405)
+        self.assertFalse(DiscountJob.objects.exists())
+
+    def test_needs_change_permission(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.post('/admin/core/discountrule/recalculate/').status_code, 403)
+        self.assertFalse(DiscountJob.objects.exists())
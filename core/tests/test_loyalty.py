@@ -0,0 +1,92 @@
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from core.discounts import is_loyal, loyal_user_ids, qualifying_order_count
+from core.models import CustomerLoyalty, DiscountRule, Order, OrderItem
+
+from .base import EngineTestCase
+
+
+class LoyaltyCounterTests(EngineTestCase):
+    def place(self, status='placed', user=None):
+        # Orders are placed first and move on once their totals are known
+        order = Order.objects.create(user=user or self.user)
+        OrderItem.objects.create(order=order, product=self.shirt, quantity=2, price_at_purchase=self.shirt.price)
+        order.refresh_from_db()
+        if status != 'placed':
+            order.status = status
+            order.save()
+        return order
+
+    def stats(self, user=None):
+        loyalty = CustomerLoyalty.objects.get(user=user or self.user)
+        return loyalty.qualifying_orders, loyalty.lifetime_spend
+
+    def assertStatsRebuilt(self):
+        stats = {row.pk: (row.qualifying_orders, row.lifetime_spend) for row in CustomerLoyalty.objects.all()}
+        CustomerLoyalty.rebuild(list(User.objects.values_list('pk', flat=True)))
+        zero = (0, Decimal('0'))
+        self.assertEqual(
+            {row.pk: stats.get(row.pk, zero) for row in CustomerLoyalty.objects.all()},
+            {row.pk: (row.qualifying_orders, row.lifetime_spend) for row in CustomerLoyalty.objects.all()},
+        )
+
+    def test_status_changes(self):
+        order = self.place()
+        self.assertEqual(qualifying_order_count(self.user.pk), 0)
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(self.stats(), (1, Decimal('21.10')))
+        order.status = 'completed'
+        order.save()
+        self.assertEqual(self.stats(), (1, Decimal('21.10')))
+        order.status = 'returned'
+        order.save()
+        self.assertEqual(self.stats(), (0, Decimal('0')))
+        self.assertStatsRebuilt()
+
+    def test_delete(self):
+        self.place('completed').delete()
+        self.place('completed')
+        self.assertEqual(self.stats()[0], 1)
+        self.assertStatsRebuilt()
+
+    def test_lookup_is_one_query(self):
+        for _ in range(5):
+            self.place('completed')
+        order = self.place()
+        with self.assertNumQueries(1):
+            self.assertTrue(is_loyal(order))
+        # An order never counts towards its own loyalty
+        self.assertFalse(is_loyal(Order.objects.filter(user=self.user, status='completed').first()))
+        other = User.objects.create_user('other')
+        with self.assertNumQueries(1):
+            self.assertEqual(loyal_user_ids([self.user.pk, other.pk]), {self.user.pk})
+
+    def test_loyalty_discount(self):
+        DiscountRule.objects.create(rule_type='flat', flat_amount=Decimal('5'))
+        for _ in range(5):
+            self.place('shipped')
+        response = self.create_order((self.shirt, 1))
+        self.assertEqual([line['discount_type'] for line in response.data['discounts']], ['flat'])
+
+    def test_rebuild_command(self):
+        for status in ('completed', 'shipped', 'placed'):
+            self.place(status)
+        CustomerLoyalty.objects.all().delete()
+        call_command('rebuild_loyalty_stats', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.stats(), (2, Decimal('42.20')))
+
+    def test_migration_backfill(self):
+        for status in ('completed', 'shipped', 'placed'):
+            self.place(status)
+        self.place('completed', user=User.objects.create_user('other'))
+        CustomerLoyalty.objects.all().delete()
+        import_module('core.migrations.0006_customerloyalty').backfill_loyalty(apps, None)
+        self.assertEqual(self.stats(), (2, Decimal('42.20')))
+        self.assertEqual(CustomerLoyalty.objects.count(), 2)
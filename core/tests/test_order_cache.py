@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.contrib.auth.signals import user_logged_in
+
+from core import order_cache
+from core.models import Order
+
+from .base import EngineTestCase
+
+
+class OrderCacheTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order_id = self.create_order((self.tv, 1), (self.shirt, 2)).data['id']
+
+    def retrieve(self):
+        response = self.client.get(f'/api/orders/{self.order_id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cached_under_the_version(self):
+        self.retrieve()
+        order = Order.objects.get(pk=self.order_id)
+        self.assertIn(self.order_id, order_cache.get_orders([order]))
+        # Only the order row itself is read
+        with self.assertNumQueries(1):
+            self.retrieve()
+
+        item = order.items.get(product=self.shirt)
+        item.quantity = 5
+        item.save()
+        order.refresh_from_db()
+        self.assertNotIn(self.order_id, order_cache.get_orders([order]))
+        self.assertEqual(self.retrieve()['total_quantity'], 6)
+
+    def test_list_reads_the_page_at_once(self):
+        for _ in range(4):
+            self.create_order((self.shirt, 1))
+        self.client.get('/api/orders/')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get('/api/orders/').data['results']), 5)
+
+    def test_product_edits(self):
+        self.retrieve()
+        self.shirt.name = 'Linen shirt'
+        self.shirt.price = Decimal('12.00')
+        self.shirt.save()
+        products = {item['product']['name']: item['product']['price'] for item in self.retrieve()['items']}
+        self.assertEqual(products['Linen shirt'], '12.00')
+
+    def test_category_edits(self):
+        self.retrieve()
+        self.fashion.name = 'Apparel'
+        self.fashion.save()
+        categories = {item['product']['category'] for item in self.retrieve()['items']}
+        self.assertEqual(categories, {'electronics', 'Apparel'})
+
+    def test_user_edits(self):
+        self.retrieve()
+        version = Order.objects.get(pk=self.order_id).version
+        # Logging in only saves last_login
+        user_logged_in.send(sender=type(self.user), request=None, user=self.user)
+        self.assertEqual(Order.objects.get(pk=self.order_id).version, version)
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.retrieve()['user']['username'], 'renamed')
+
+    def test_other_orders_are_kept(self):
+        other_id = self.create_order((self.tv, 1)).data['id']
+        version = Order.objects.get(pk=other_id).version
+        self.shirt.save()
+        self.assertEqual(Order.objects.get(pk=other_id).version, version)
@@ -0,0 +1,93 @@
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Order
+
+from .base import EngineTestCase
+
+
+class CursorPaginationTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        Order.objects.bulk_create([Order(user=self.user) for _ in range(12)])
+        # Bulk created orders share their timestamp; give a few older ones too
+        now = timezone.now()
+        self.ids = list(Order.objects.order_by('-id').values_list('id', flat=True))
+        Order.objects.update(created_at=now)
+        Order.objects.filter(pk__in=self.ids[-3:]).update(created_at=now - timedelta(days=1))
+
+    def page(self, url='/api/orders/?page_size=5'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_walks_every_order_once(self):
+        seen, data = [], self.page()
+        self.assertIsNone(data['previous'])
+        while True:
+            seen += [order['id'] for order in data['results']]
+            if not data['next']:
+                break
+            data = self.page(data['next'])
+        self.assertEqual(seen, self.ids)
+
+    def test_previous_links(self):
+        first = self.page()
+        second = self.page(first['next'])
+        third = self.page(second['next'])
+        self.assertIsNone(third['next'])
+        back = self.page(third['previous'])
+        self.assertEqual(back['results'], second['results'])
+        back = self.page(back['previous'])
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+        self.assertEqual(self.page(back['next'])['results'], second['results'])
+
+    def test_pages_are_keyset_queries(self):
+        first = self.page()
+        with CaptureQueriesContext(connection) as queries:
+            self.page(first['next'])
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('OFFSET', sql)
+
+    def test_page_size(self):
+        self.assertEqual(len(self.page('/api/orders/?page_size=2')['results']), 2)
+        self.assertEqual(len(self.page('/api/orders/?page_size=0')['results']), 12)
+        self.assertEqual(len(self.page('/api/orders/?page_size=x')['results']), 12)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/orders/?cursor=nope').status_code, 404)
+
+    def test_only_own_orders(self):
+        other = Order.objects.create(user=self.user.__class__.objects.create_user('other'))
+        self.assertNotIn(other.pk, [order['id'] for order in self.page('/api/orders/')['results']])
+
+
+class ExportTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        for quantity in (1, 2, 3):
+            self.create_order((self.shirt, quantity))
+        self.ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/orders/export/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_streams_orders_oldest_first(self):
+        lines = self.export()
+        self.assertEqual([line['id'] for line in lines], self.ids)
+        self.assertEqual(lines[2]['total_quantity'], 3)
+        self.assertEqual(lines[0]['items'][0]['product']['name'], 'Shirt')
+
+    def test_time_window(self):
+        Order.objects.filter(pk=self.ids[0]).update(created_at=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual([line['id'] for line in self.export(f'?since={since.replace("+", "%2B")}')], self.ids[1:])
+        self.assertEqual(self.client.get('/api/orders/export/?until=yesterday').status_code, 400)
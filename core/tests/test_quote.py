@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from core.models import DiscountRule, Order
+
+from .base import EngineTestCase
+
+
+class QuoteTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics,
+                                    percentage=Decimal('5'), min_quantity=3)
+
+    def quote(self, *items):
+        response = self.client.post('/api/orders/quote/', {'items': [
+            {'product_id': product.pk, 'quantity': quantity} for product, quantity in items
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_matches_the_order(self):
+        quote = self.quote((self.tv, 3), (self.shirt, 2))
+        self.assertFalse(Order.objects.exists())
+        order = self.create_order((self.tv, 3), (self.shirt, 2)).data
+        self.assertEqual(quote['discounts'], order['discounts'])
+        self.assertEqual((quote['total_price'], quote['final_price']), (order['total_price'], order['final_price']))
+        self.assertEqual((quote['discount_total'], quote['total_quantity']), ('450.00', 5))
+
+    def test_cached_per_cart(self):
+        self.quote((self.tv, 1), (self.tv, 2))
+        # Equivalent carts share the cached quote: only the loyalty lookup runs
+        with self.assertNumQueries(1):
+            self.assertEqual(self.quote((self.tv, 3))['discount_total'], '450.00')
+
+    def test_rule_edits_invalidate(self):
+        self.assertEqual(self.quote((self.tv, 3))['discount_total'], '450.00')
+        rule = DiscountRule.objects.get()
+        rule.percentage = Decimal('10')
+        rule.save()
+        self.assertEqual(self.quote((self.tv, 3))['discount_total'], '900.00')
+
+    def test_personal_rules(self):
+        DiscountRule.objects.create(rule_type='coupon', user=self.user, flat_amount=Decimal('7'))
+        self.assertEqual(self.quote((self.shirt, 1))['discount_total'], '7.00')
+        self.client.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(self.quote((self.shirt, 1))['discount_total'], '0.00')
+
+    def test_invalid_cart(self):
+        response = self.client.post('/api/orders/quote/', {'items': [{'product_id': 0, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/api/orders/quote/', {'items': []}, format='json').status_code, 400)
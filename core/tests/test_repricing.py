@@ -0,0 +1,65 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.discounts import apply_discounts
+from core.models import Discount, DiscountRule, Order, OrderItem
+from core.repricing import hypothetical_rule, reprice, what_if_schedule
+
+from .base import EngineTestCase
+
+
+class RepricingTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        DiscountRule.objects.create(rule_type='percentage', threshold=5000, percentage=10)
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics, percentage=5, min_quantity=3)
+        for index in range(50):
+            order = Order.objects.create(user=self.user)
+            OrderItem.objects.create(order=order, product=self.tv, quantity=index % 2 + 2, price_at_purchase=self.tv.price)
+            OrderItem.objects.create(order=order, product=self.shirt, quantity=1, price_at_purchase=self.shirt.price)
+            apply_discounts(order)
+        self.priced = self.snapshot()
+
+    def snapshot(self):
+        return {
+            order.pk: (order.subtotal, order.discount_total, order.final_total,
+                       sorted(order.discounts.values_list('discount_type', 'amount')))
+            for order in Order.objects.all()
+        }
+
+    def test_rewrites_discounts_and_totals(self):
+        Discount.objects.filter(order_id__in=list(self.priced)[::2]).delete()
+        report = reprice(Order.objects.all(), chunk_size=7)
+        self.assertEqual((report.orders, report.changed), (50, 25))
+        self.assertEqual(self.snapshot(), self.priced)
+
+    def test_statements_per_chunk(self):
+        def statements(orders):
+            with CaptureQueriesContext(connection) as queries:
+                reprice(orders)
+            return [query['sql'] for query in queries]
+
+        sql = statements(Order.objects.all())
+        self.assertEqual(Discount.objects.count(), 75)
+        self.assertEqual(len([statement for statement in sql if statement.startswith('UPDATE "core_order"')]), 1)
+        self.assertEqual(len([statement for statement in sql if statement.startswith('DELETE FROM "core_discount"')]), 1)
+        # The same statements whatever the chunk's size
+        self.assertEqual(len(sql), len(statements(Order.objects.filter(pk__in=list(self.priced)[:5]))))
+        self.assertEqual(self.snapshot(), self.priced)
+
+    def test_dry_run(self):
+        schedule = what_if_schedule(extra_rules=[hypothetical_rule('flat', flat_amount=Decimal('100'))])
+        report = reprice(Order.objects.all(), schedule=schedule, dry_run=True)
+        self.assertEqual(report.orders, 50)
+        self.assertEqual(self.snapshot(), self.priced)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('reprice_orders', '--dry-run', '--add-rule', 'category:fashion:50:1', stdout=out)
+        self.assertEqual(self.snapshot(), self.priced)
+        call_command('reprice_orders', stdout=out)
+        self.assertEqual(self.snapshot(), self.priced)
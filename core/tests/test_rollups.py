@@ -0,0 +1,85 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import rollups
+from core.models import DailyRevenue, DiscountRule, Order, RollupEntry
+
+from .base import EngineTestCase
+
+
+class RollupTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics,
+                                    percentage=Decimal('5'), min_quantity=3)
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+        self.today = timezone.localdate()
+
+    def report(self, **params):
+        response = self.admin_client.get('/api/reports/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_orders_are_counted(self):
+        order = self.create_order((self.tv, 3), (self.shirt, 1)).data
+        self.create_order((self.shirt, 2))
+        report = self.report()
+        self.assertEqual(report['totals'], {'orders': 2, 'gross': '9031.65', 'discount': '450.00', 'net': '8581.65'})
+        self.assertEqual(report['days'][0]['day'], self.today)
+        self.assertEqual(
+            [(row['category'], row['orders'], row['quantity'], row['gross']) for row in report['categories']],
+            [('electronics', 1, 3, '9000.00'), ('fashion', 2, 3, '31.65')],
+        )
+        self.assertEqual(
+            [(row['discount_type'], row['orders'], row['amount']) for row in report['discount_types']],
+            [(order['discounts'][0]['discount_type'], 1, '450.00')],
+        )
+
+    def test_fold(self):
+        self.create_order((self.tv, 3), (self.shirt, 1))
+        report = self.report()
+        self.assertGreater(rollups.fold(batch_size=2), 0)
+        self.assertFalse(RollupEntry.objects.exists())
+        self.assertEqual(DailyRevenue.objects.get(day=self.today).orders, 1)
+        self.assertEqual(self.report(), report)
+
+    def test_cancelled_and_returned_orders_leave(self):
+        self.create_order((self.shirt, 1))
+        pk = self.create_order((self.tv, 3)).data['id']
+        rollups.fold()
+        response = self.admin_client.patch(f'/api/orders/{pk}/update-status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.report()['totals'], {'orders': 1, 'gross': '10.55', 'discount': '0.00', 'net': '10.55'})
+
+        Order.objects.get(pk=pk).delete()
+        Order.objects.exclude(pk=pk).get().delete()
+        self.assertEqual(self.report()['totals']['orders'], 0)
+
+    def test_rebuild_matches(self):
+        self.create_order((self.tv, 3), (self.shirt, 1))
+        self.create_order((self.shirt, 2))
+        report = self.report()
+        DailyRevenue.objects.all().delete()
+        RollupEntry.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertFalse(RollupEntry.objects.exists())
+        self.assertEqual(self.report(), report)
+
+    def test_date_range(self):
+        self.create_order((self.shirt, 1))
+        yesterday = self.today - timedelta(days=1)
+        self.assertEqual(self.report(since=yesterday, until=yesterday)['days'], [])
+        for params in ({'since': 'soon'}, {'since': self.today, 'until': yesterday},
+                       {'since': self.today - timedelta(days=1000)}):
+            self.assertEqual(self.admin_client.get('/api/reports/', params).status_code, 400)
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get('/api/reports/').status_code, 403)
@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import routing
+from core.models import Order
+
+from .base import EngineTestCase
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(EngineTestCase):
+    def reads_from(self, path, client=None):
+        """
+        GET `path`; returns the database its view chose for its reads.
+        """
+        choices = []
+        read_from_replica = routing.read_from_replica
+
+        def spy(request):
+            choices.append(read_from_replica(request))
+            return choices[-1]
+
+        with mock.patch.object(routing, 'read_from_replica', spy):
+            response = (client or self.client).get(path)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(choices), 1)
+        return choices[0]
+
+    def test_reads_go_to_a_replica(self):
+        order = Order.objects.create(user=self.user)
+        self.assertEqual(self.reads_from('/api/orders/'), 'replica')
+        self.assertEqual(self.reads_from(f'/api/orders/{order.pk}/'), 'replica')
+        # The middleware forgets the choice after the request
+        self.assertEqual(routing.read_database(), 'default')
+
+    def test_writers_read_their_writes(self):
+        response = self.create_order((self.shirt, 1))
+        self.assertIn(routing.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.reads_from('/api/orders/'), 'default')
+
+        # The pin is signed for its user only
+        other = User.objects.create_user('other')
+        client = APIClient()
+        client.force_authenticate(other)
+        client.cookies[routing.PIN_COOKIE] = response.cookies[routing.PIN_COOKIE].value
+        self.assertEqual(self.reads_from('/api/orders/', client), 'replica')
+        client.cookies[routing.PIN_COOKIE] = str(other.pk)
+        self.assertEqual(self.reads_from('/api/orders/', client), 'replica')
+
+    def test_quotes_do_not_pin(self):
+        response = self.client.post('/api/orders/quote/', {'items': [
+            {'product_id': self.shirt.pk, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(routing.PIN_COOKIE, response.cookies)
+
+    @override_settings(READ_YOUR_WRITES_SECONDS=0)
+    def test_pinning_disabled(self):
+        self.assertNotIn(routing.PIN_COOKIE, self.create_order((self.shirt, 1)).cookies)
+        self.assertEqual(self.reads_from('/api/orders/'), 'replica')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertNotIn(routing.PIN_COOKIE, self.create_order((self.shirt, 1)).cookies)
+        self.assertEqual(self.reads_from('/api/orders/'), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routing.ReplicaRouter()
+        token = routing._reads.set('replica')
+        self.addCleanup(routing._reads.reset, token)
+
+    def test_reads(self):
+        self.assertEqual(self.router.db_for_read(Order), 'replica')
+        # Reads inside a transaction must see its writes
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            self.assertIsNone(self.router.db_for_read(Order))
+
+    def test_writes_and_migrations(self):
+        self.assertEqual(self.router.db_for_write(Order), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
@@ -0,0 +1,89 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.discounts import SCHEDULE_LOOKBACK, apply_discounts, get_rule_set, get_schedule
+from core.models import DiscountRule, Order, OrderItem
+
+from .base import EngineTestCase
+
+
+def rule_types(rule_set):
+    return {rule_type.code for rule_type, _ in rule_set.indexes}
+
+
+class RuleScheduleTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        DiscountRule.objects.create(rule_type='percentage', threshold=0, percentage=10)
+        self.flash = DiscountRule.objects.create(
+            rule_type='category_based', category=self.electronics, percentage=Decimal('5'), min_quantity=1,
+            starts_at=self.now - timedelta(hours=1), ends_at=self.now + timedelta(hours=1),
+        )
+
+    def place(self, created_at):
+        order = Order.objects.create(user=self.user)
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        order.refresh_from_db()
+        OrderItem.objects.create(order=order, product=self.tv, quantity=1, price_at_purchase=self.tv.price)
+        apply_discounts(order)
+        return sorted(order.discounts.values_list('discount_type', flat=True))
+
+    def quote(self):
+        response = self.client.post('/api/orders/quote/', {'items': [
+            {'product_id': self.tv.pk, 'quantity': 1},
+        ]}, format='json')
+        return sorted(line['discount_type'] for line in response.data['discounts'])
+
+    def test_segments(self):
+        schedule = get_schedule()
+        self.assertEqual(schedule.boundaries, (self.flash.starts_at, self.flash.ends_at))
+        self.assertEqual(rule_types(schedule.at(self.now - timedelta(hours=2))), {'percentage'})
+        self.assertEqual(rule_types(schedule.at(self.now)), {'percentage', 'category_based'})
+        self.assertEqual(rule_types(schedule.at(self.flash.ends_at)), {'percentage'})
+        # Each segment is compiled once
+        with self.assertNumQueries(0):
+            self.assertIs(get_rule_set(self.now + timedelta(minutes=30)), schedule.at(self.now))
+
+    def test_live_at_matches_the_schedule(self):
+        for moment in (self.flash.starts_at - timedelta(seconds=1), self.flash.starts_at, self.flash.ends_at):
+            live = {rule.pk for rule in DiscountRule.objects.live_at(moment)}
+            self.assertEqual(live, {rule.pk for rule in DiscountRule.objects.all() if rule.is_live_at(moment)})
+
+    def test_orders_use_the_rules_live_when_placed(self):
+        self.assertEqual(self.place(self.now), ['category_based', 'percentage'])
+        self.assertEqual(self.place(self.now - timedelta(hours=2)), ['percentage'])
+        self.assertEqual(self.place(self.now + timedelta(hours=2)), ['percentage'])
+
+    def test_orders_before_the_lookback(self):
+        placed = self.now - SCHEDULE_LOOKBACK * 2
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics, percentage=1,
+                                    min_quantity=1, starts_at=placed - timedelta(hours=1), ends_at=placed + timedelta(hours=1))
+        self.assertFalse(get_schedule().covers(placed))
+        self.assertEqual(self.place(placed), ['category_based', 'percentage'])
+
+    def test_quotes_use_the_live_rules(self):
+        self.assertEqual(self.quote(), ['category_based', 'percentage'])
+        self.flash.ends_at = self.now - timedelta(minutes=1)
+        self.flash.save()
+        self.assertEqual(self.quote(), ['percentage'])
+
+    def test_window_must_not_be_empty(self):
+        self.flash.ends_at = self.flash.starts_at
+        with self.assertRaises(ValidationError):
+            self.flash.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.flash.save()
+
+    def test_admin_preview(self):
+        admin = User.objects.create_superuser('admin')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/core/discountrule/', {'live_at': '1d'})
+        self.assertEqual(list(response.context['cl'].queryset), [DiscountRule.objects.get(rule_type='percentage')])
+        response = self.client.get('/admin/core/discountrule/', {'live_at': 'later'})
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from django.test import override_settings
+
+from core.discounts import evaluate, get_rule_set, summarize
+from core.models import DiscountRule
+
+from .base import EngineTestCase
+
+
+class StackingTests(EngineTestCase):
+    def evaluate(self, rows, loyalty_user=False):
+        lines = evaluate(get_rule_set(), summarize(rows), loyalty_user, self.user.pk)
+        return [(line.discount_type, line.amount) for line in lines]
+
+    def test_largest_of_a_group_applies(self):
+        DiscountRule.objects.create(rule_type='percentage', percentage=10, threshold=0, stacking_group='sitewide')
+        DiscountRule.objects.create(rule_type='coupon', user=self.user, flat_amount=Decimal('30'),
+                                    stacking_group='sitewide')
+        self.assertEqual(self.evaluate([(self.electronics.pk, 1, Decimal('200'))]), [('coupon', Decimal('30'))])
+        self.assertEqual(self.evaluate([(self.electronics.pk, 1, Decimal('1000'))]),
+                         [('percentage', Decimal('100.00'))])
+
+    def test_ungrouped_rules_stack(self):
+        DiscountRule.objects.create(rule_type='buy_x_get_y', category=self.fashion, min_quantity=2, free_quantity=1)
+        DiscountRule.objects.create(rule_type='category_based', category=self.fashion, percentage=5, min_quantity=3)
+        self.assertEqual(self.evaluate([(self.fashion.pk, 3, Decimal('10.55'))]),
+                         [('buy_x_get_y', Decimal('10.55')), ('category_based', Decimal('1.58'))])
+
+    def test_cap(self):
+        DiscountRule.objects.create(rule_type='percentage', percentage=10, threshold=0)
+        DiscountRule.objects.create(rule_type='flat', flat_amount=Decimal('500'))
+        rows = [(self.electronics.pk, 1, Decimal('200'))]
+        self.assertEqual(self.evaluate(rows, loyalty_user=True),
+                         [('percentage', Decimal('20.00')), ('flat', Decimal('180.00'))])
+        with override_settings(DISCOUNT_CAP_PERCENT='50'):
+            self.assertEqual(self.evaluate(rows, loyalty_user=True),
+                             [('percentage', Decimal('20.00')), ('flat', Decimal('80.00'))])
+
+
+class RuleTypeTests(EngineTestCase):
+    def evaluate(self, rows, user_id=None):
+        return {
+            line.discount_type: line.amount
+            for line in evaluate(get_rule_set(), summarize(rows), False, user_id or self.user.pk)
+        }
+
+    def test_buy_x_get_y_takes_the_cheapest_units(self):
+        DiscountRule.objects.create(rule_type='buy_x_get_y', category=self.fashion, min_quantity=2, free_quantity=1)
+        amounts = self.evaluate([(self.fashion.pk, 3, Decimal('10.55')), (self.fashion.pk, 3, Decimal('3.333'))])
+        # Six units give two free, priced at the cheapest unit and rounded to the cent
+        self.assertEqual(amounts['buy_x_get_y'], Decimal('6.67'))
+
+    def test_bundle_needs_every_category(self):
+        bundle = DiscountRule.objects.create(rule_type='bundle', percentage=10)
+        bundle.bundle_categories.set([self.electronics, self.fashion])
+        self.assertNotIn('bundle', self.evaluate([(self.electronics.pk, 1, Decimal('1000'))]))
+        amounts = self.evaluate([(self.electronics.pk, 1, Decimal('1000')), (self.fashion.pk, 1, Decimal('100'))])
+        self.assertEqual(amounts['bundle'], Decimal('110.00'))
+
+    def test_coupons_are_personal(self):
+        DiscountRule.objects.create(rule_type='coupon', user=self.user, flat_amount=Decimal('50'))
+        DiscountRule.objects.create(rule_type='coupon', user=self.user, percentage=Decimal('2'))
+        rows = [(self.electronics.pk, 1, Decimal('3000'))]
+        # The best of the user's coupons applies
+        self.assertEqual(self.evaluate(rows)['coupon'], Decimal('60.00'))
+        self.assertNotIn('coupon', self.evaluate(rows, user_id=self.user.pk + 1000))
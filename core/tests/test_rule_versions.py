@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.test import override_settings
+
+from core import versions
+from core.discounts import get_rule_set
+from core.models import CacheVersion, DiscountRule
+
+from .base import EngineTestCase
+
+
+def rule_types(rule_set):
+    return {rule_type.code for rule_type, _ in rule_set.indexes}
+
+
+class RuleVersionTests(EngineTestCase):
+    def test_edits_recompile(self):
+        rule = DiscountRule.objects.create(rule_type='flat', flat_amount=Decimal('5'))
+        rule_set = get_rule_set()
+        self.assertEqual(rule_set.version, CacheVersion.objects.get(name=versions.RULES).token)
+
+        rule.flat_amount = Decimal('7')
+        rule.save()
+        self.assertNotEqual(get_rule_set().version, rule_set.version)
+        self.assertEqual(next(index for rule_type, index in get_rule_set().indexes
+                              if rule_type.code == 'flat').flat_amount, Decimal('7'))
+
+        rule.delete()
+        self.assertNotIn('flat', rule_types(get_rule_set()))
+
+    def test_unchanged_rules_are_not_recompiled(self):
+        DiscountRule.objects.create(rule_type='flat', flat_amount=Decimal('5'))
+        rule_set = get_rule_set()
+        with self.assertNumQueries(0):
+            self.assertIs(get_rule_set().indexes, rule_set.indexes)
+
+    def test_category_edits_recompile(self):
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics,
+                                    percentage=5, min_quantity=3)
+        version = get_rule_set().version
+        self.electronics.name = 'Electronics'
+        self.electronics.save()
+        self.assertNotEqual(get_rule_set().version, version)
+
+    def test_rolled_back_edit(self):
+        DiscountRule.objects.create(rule_type='flat', flat_amount=Decimal('5'))
+        version = get_rule_set().version
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            DiscountRule.objects.create(rule_type='percentage', percentage=10, threshold=0)
+            raise RuntimeError
+        # The token is never reused, so the rolled back rule cannot look current
+        self.assertEqual(get_rule_set().version, version)
+        self.assertNotIn('percentage', rule_types(get_rule_set()))
+
+    @override_settings(VERSION_CHECK_INTERVAL=60)
+    def test_edit_by_another_process(self):
+        rule_set = get_rule_set()
+        # Another worker's edit only changes the token in the database
+        CacheVersion.objects.update_or_create(name=versions.RULES, defaults={'token': 'other-worker'})
+        self.assertEqual(get_rule_set().version, rule_set.version)
+        with override_settings(VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(get_rule_set().version, 'other-worker')
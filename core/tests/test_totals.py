@@ -0,0 +1,107 @@
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.test import override_settings
+
+from core.models import Discount, DiscountJob, DiscountRule, Order, OrderItem, RollupEntry
+from core.views import OrderViewSet
+
+from .base import EngineTestCase
+
+
+class OrderTotalsTests(EngineTestCase):
+    """
+    The totals stored on an order follow every change to its items and discounts.
+    """
+
+    def setUp(self):
+        super().setUp()
+        DiscountRule.objects.create(rule_type='category_based', category=self.electronics,
+                                    percentage=Decimal('5'), min_quantity=3)
+        response = self.create_order((self.tv, 3), (self.shirt, 2))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.order = Order.objects.get(pk=response.data['id'])
+
+    def assertTotalsStored(self):
+        order = Order.objects.with_computed_totals().get(pk=self.order.pk)
+        self.assertEqual(order.subtotal, order.computed_subtotal)
+        self.assertEqual(order.discount_total, order.computed_discount_total)
+        self.assertEqual(order.final_total, order.computed_subtotal - order.computed_discount_total)
+        self.assertEqual(order.total_quantity, order.computed_quantity)
+        return order
+
+    def test_created_order(self):
+        order = self.assertTotalsStored()
+        self.assertEqual(order.subtotal, Decimal('9021.10'))
+        self.assertEqual(order.discount_total, Decimal('450.00'))
+        self.assertEqual(order.total_quantity, 5)
+
+    def test_item_edits(self):
+        item = self.order.items.get(product=self.shirt)
+        item.quantity = 7
+        item.save()
+        self.assertEqual(self.assertTotalsStored().total_quantity, 10)
+
+        item.price_at_purchase = Decimal('9.99')
+        item.save()
+        self.assertEqual(self.assertTotalsStored().subtotal, Decimal('9069.93'))
+
+        OrderItem.objects.create(order=self.order, product=self.shirt, quantity=2, price_at_purchase=Decimal('1.11'))
+        self.assertTotalsStored()
+
+        item.delete()
+        self.assertEqual(self.assertTotalsStored().subtotal, Decimal('9002.22'))
+
+    def test_item_saved_without_loading(self):
+        # No previous values to diff against, so the order is recomputed
+        item = OrderItem.objects.only('pk', 'order_id').get(order=self.order, product=self.tv)
+        item.quantity, item.price_at_purchase, item.product_id = 1, Decimal('2500.00'), self.tv.pk
+        item.save()
+        self.assertEqual(self.assertTotalsStored().subtotal, Decimal('2521.10'))
+
+    def test_discount_edits(self):
+        discount = self.order.discounts.get()
+        discount.amount = Decimal('3.33')
+        discount.save()
+        self.assertEqual(self.assertTotalsStored().discount_total, Decimal('3.33'))
+
+        Discount.objects.create(order=self.order, discount_type='flat', description='Goodwill', amount=Decimal('20'))
+        self.assertEqual(self.assertTotalsStored().discount_total, Decimal('23.33'))
+
+        discount.delete()
+        self.assertEqual(self.assertTotalsStored().discount_total, Decimal('20.00'))
+
+        self.order.discounts.all().delete()
+        order = self.assertTotalsStored()
+        self.assertEqual(order.final_total, order.subtotal)
+
+    def test_recompute(self):
+        Order.objects.filter(pk=self.order.pk).update(subtotal=0, discount_total=0, final_total=0, total_quantity=0)
+        Order.objects.filter(pk=self.order.pk).recompute_totals()
+        self.assertEqual(self.assertTotalsStored().subtotal, Decimal('9021.10'))
+
+    def test_migration_backfill(self):
+        Order.objects.update(subtotal=0, discount_total=0, final_total=0, total_quantity=0)
+        import_module('core.migrations.0004_order_totals').backfill_totals(apps, None)
+        order = self.assertTotalsStored()
+        self.assertEqual((order.subtotal, order.discount_total), (Decimal('9021.10'), Decimal('450.00')))
+
+
+class OrderCreationTests(EngineTestCase):
+    def test_failed_discounting_writes_nothing(self):
+        with mock.patch.object(OrderViewSet, 'apply_discounts', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.create_order((self.tv, 3))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(RollupEntry.objects.exists())
+
+    @override_settings(DISCOUNTS_ASYNC=True)
+    def test_failed_enqueue_writes_nothing(self):
+        with mock.patch.object(DiscountJob, 'enqueue', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.create_order((self.tv, 3))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(RollupEntry.objects.exists())
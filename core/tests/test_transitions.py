@@ -0,0 +1,66 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from core.models import CustomerLoyalty, Order, OrderItem
+
+from .base import EngineTestCase
+
+
+class StatusTransitionTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+        self.order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=self.order, product=self.shirt, quantity=1, price_at_purchase=self.shirt.price)
+
+    def update_status(self, status, pk=None):
+        return self.admin_client.patch(f'/api/orders/{pk or self.order.pk}/update-status/',
+                                       {'status': status}, format='json')
+
+    def test_allowed_transitions(self):
+        for status in ('shipped', 'completed', 'returned'):
+            response = self.update_status(status)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.order.refresh_from_db()
+            self.assertEqual(self.order.status, status)
+
+    def test_single_statement(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.update_status('delayed').status_code, 200)
+
+    def test_conflict(self):
+        self.assertEqual(self.update_status('shipped').status_code, 200)
+        response = self.update_status('placed')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['error'], f"Order {self.order.pk} cannot move from 'shipped' to 'placed'.")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'shipped')
+
+    def test_unknown_order(self):
+        self.assertEqual(self.update_status('shipped', pk=self.order.pk + 1000).status_code, 404)
+        self.assertEqual(self.update_status('shipped', pk='abc').status_code, 404)
+
+    def test_invalid_status(self):
+        self.assertEqual(self.update_status('lost').status_code, 400)
+
+    def test_customers_cannot_update(self):
+        response = self.client.patch(f'/api/orders/{self.order.pk}/update-status/', {'status': 'shipped'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_loyalty_follows_transitions(self):
+        self.update_status('shipped')
+        self.assertEqual(CustomerLoyalty.objects.get(user=self.user).qualifying_orders, 1)
+        self.update_status('returned')
+        self.assertEqual(CustomerLoyalty.objects.get(user=self.user).qualifying_orders, 0)
+
+    def test_bulk_update(self):
+        other = Order.objects.create(user=self.user, status='completed')
+        response = self.admin_client.patch('/api/orders/update-status/', {
+            'ids': [self.order.pk, other.pk, self.order.pk + 1000], 'status': 'shipped',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'updated': 1, 'skipped': sorted([other.pk, self.order.pk + 1000])})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'shipped')
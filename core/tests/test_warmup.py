@@ -0,0 +1,66 @@
+import gc
+import importlib
+import sys
+from unittest import mock
+
+from django.test import override_settings
+
+from core import order_cache, warmup
+from core.models import Order
+
+from .base import EngineTestCase
+
+
+class WarmupTests(EngineTestCase):
+    def test_warm(self):
+        self.create_order((self.tv, 1), (self.shirt, 2))
+        self.create_order((self.shirt, 1))
+        results = warmup.warm(orders=10, products=1)
+        self.assertEqual({name: count for name, (count, _) in results.items()},
+                         {'rules': 0, 'catalog': 1, 'orders': 2})
+        self.assertEqual(len(order_cache.get_orders(list(Order.objects.all()))), 2)
+        # Orders cached at their current version are not rendered again
+        self.assertEqual(warmup.warm(orders=10, products=1)['orders'][0], 0)
+
+
+class WorkerReadyTests(EngineTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(gc.unfreeze)
+        self.addCleanup(gc.enable)
+
+    def test_collection_paused_while_booting(self):
+        enabled = []
+        get_resolver = warmup.get_resolver
+
+        def resolver():
+            enabled.append(gc.isenabled())
+            return get_resolver()
+
+        with mock.patch.object(warmup, 'get_resolver', resolver):
+            warmup.worker_ready()
+        self.assertEqual(enabled, [False])
+        self.assertTrue(gc.isenabled())
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    def test_collection_left_off(self):
+        gc.disable()
+        warmup.worker_ready()
+        self.assertFalse(gc.isenabled())
+
+    @override_settings(WARMUP_ON_STARTUP=True)
+    def test_failed_warmup(self):
+        with mock.patch.object(warmup, 'warm', side_effect=RuntimeError) as warm, \
+                self.assertLogs('core.warmup', 'ERROR'):
+            warmup.worker_ready()
+        warm.assert_called_once_with()
+        self.assertTrue(gc.isenabled())
+
+    def test_entry_points(self):
+        for module in ('order_engine.wsgi', 'order_engine.asgi'):
+            sys.modules.pop(module, None)
+            with self.subTest(module), mock.patch.object(warmup, 'worker_ready') as worker_ready:
+                importlib.import_module(module)
+                worker_ready.assert_called_once_with()
+                # Importing the entry point never leaves collection off
+                self.assertTrue(gc.isenabled())
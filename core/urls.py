@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import OrderViewSet, signup
+from . import async_views
+from .views import OrderViewSet, metrics, reports, signup
 
 router = DefaultRouter()
 router.register(r'orders', OrderViewSet, basename='orders')
@@ -8,5 +9,10 @@ router.register(r'orders', OrderViewSet, basename='orders')
 urlpatterns = [
     path('', include(router.urls)),
     path('signup/', signup),
+    path('metrics/', metrics),
+    path('reports/', reports),
+    path('async/orders/', async_views.order_list),
+    path('async/orders/quote/', async_views.order_quote),
+    path('async/orders/<int:pk>/', async_views.order_detail),
     path('auth/', include('rest_framework.urls')),
 ]
\ No newline at end of file
@@ -0,0 +1,81 @@
+"""
+core/versions.py
+
+Version tokens for the state each process caches for itself, such as the
+compiled discount rules (core/discounts.py).
+
+A token is a CacheVersion row that `bump` overwrites with a fresh random
+value in the same transaction as the edit it announces. Every process sees
+the new token exactly when it can see the edited rows, whatever cache
+backend is configured, and a token is never reused, so a rolled back edit
+or a lost cache entry can never make stale state look current.
+
+Reading a token costs a query, so each process re-reads it at most once per
+settings.VERSION_CHECK_INTERVAL seconds: other processes pick up an edit
+within that interval, the process that made it as soon as it commits.
+"""
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import CacheVersion
+
+RULES = 'discount_rules'
+
+# {name: (token, monotonic time it was read)}
+_tokens = {}
+_lock = threading.Lock()
+
+
+def get(name):
+    """
+    Return the current token of `name` ('' until it is first bumped).
+    """
+    cached = _tokens.get(name)
+    if cached is not None and time.monotonic() - cached[1] < settings.VERSION_CHECK_INTERVAL:
+        return cached[0]
+    token = CacheVersion.objects.filter(name=name).values_list('token', flat=True).first() or ''
+    with _lock:
+        _tokens[name] = (token, time.monotonic())
+    return token
+
+
+async def aget(name):
+    """
+    Async version of get; only a re-read leaves the event loop.
+    """
+    cached = _tokens.get(name)
+    if cached is not None and time.monotonic() - cached[1] < settings.VERSION_CHECK_INTERVAL:
+        return cached[0]
+    return await sync_to_async(get)(name)
+
+
+def expire(name=None):
+    """
+    Make the next `get` in this process re-read `name` (default: every token).
+    """
+    with _lock:
+        if name is None:
+            _tokens.clear()
+        else:
+            _tokens.pop(name, None)
+
+
+def bump(name):
+    """
+    Give `name` a new token, inside the caller's transaction if there is one.
+    """
+    token = uuid.uuid4().hex
+    if not CacheVersion.objects.filter(name=name).update(token=token):
+        try:
+            with transaction.atomic():
+                CacheVersion.objects.create(name=name, token=token)
+        except IntegrityError:
+            # Created concurrently; overwrite it instead
+            CacheVersion.objects.filter(name=name).update(token=token)
+    expire(name)
+    transaction.on_commit(lambda: expire(name))
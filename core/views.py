@@ -1,13 +1,28 @@
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, action
+from rest_framework.decorators import api_view, action, permission_classes
 from django.contrib.auth.models import User
-from .models import Order
-from .serializers import OrderSerializer
-from decimal import Decimal
-from django.db.models import Sum, F, Q
-from core.models import Discount, Order, DiscountRule
+from django.conf import settings
+from .models import DiscountJob, Order, display_prefetches
+import json
+from functools import partial
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .pagination import OrderCursorPagination
+from . import catalog, idempotency, order_cache, rollups, routing
+from .instrumentation import phase, registry
+from django.core.cache import cache
+from .serializers import OrderSerializer, BulkOrderSerializer, BulkStatusSerializer, QuoteSerializer, quote_representation
+from core.discounts import (
+    LOYALTY_MIN_ORDERS, QUOTE_CACHE_TIMEOUT, apply_discounts, evaluate, get_rule_set,
+    normalize_cart, qualifying_order_count, quote_cache_key, summarize,
+)
 
 """This function let's the user signup to the website.
 Arguments:
@@ -29,9 +44,67 @@ def signup(request):
     user = User.objects.create_user(username=username, password=password)
     return Response({'message': 'User created successfully'}, status=status.HTTP_201_CREATED)
 
+"""This function returns the request metrics collected by the instrumentation
+middleware in this process: latency, SQL and per-phase histograms per endpoint.
+Admin only.
+"""
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    return Response({
+        'sample_rate': settings.INSTRUMENTATION_SAMPLE_RATE,
+        'endpoints': registry.snapshot(),
+        'catalog': catalog.stats(),
+    })
+
+REPORT_MAX_DAYS = 366
+
+"""This function returns revenue, discount and order totals per day, per day and
+category, and per day and discount type, read from the rollup tables (see core/rollups.py)
+instead of aggregating orders. Cancelled and returned orders are left out. Admin only.
+
+Route: GET /reports/?since=<date>&until=<date>   (default: the last 30 days)
+"""
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def reports(request):
+    until = timezone.localdate()
+    since = until - timedelta(days=29)
+    for name in ('since', 'until'):
+        value = request.query_params.get(name)
+        if value:
+            day = parse_date(value)
+            if day is None:
+                return Response({'error': f"Invalid {name} date: '{value}'"}, status=status.HTTP_400_BAD_REQUEST)
+            if name == 'since':
+                since = day
+            else:
+                until = day
+    if since > until:
+        return Response({'error': 'since must not be after until'}, status=status.HTTP_400_BAD_REQUEST)
+    if (until - since).days >= REPORT_MAX_DAYS:
+        return Response({'error': f"At most {REPORT_MAX_DAYS} days per report"}, status=status.HTTP_400_BAD_REQUEST)
+    routing.read_from_replica(request)
+    return Response(rollups.report(since, until))
+
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
+
+    # Orders fetched per query while streaming an export
+    export_chunk_size = 2000
+    # Actions whose reads may be served by a replica (see core/routing.py)
+    replica_actions = ('list', 'retrieve', 'export')
+    # Unsafe actions that do not write, so they need not pin the user to the primary
+    read_only_actions = ('quote',)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            routing.read_from_replica(request)
+        elif request.method not in permissions.SAFE_METHODS and self.action not in self.read_only_actions:
+            routing.pin_to_primary(request.user)
 
     """This function gets all the orders placed by the user logged in to the website.
     If the user is admin, then all orders across the website will be displayed.
@@ -42,8 +115,49 @@ class OrderViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Only return orders for the logged-in user or admin
         if self.request.user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(user=self.request.user)
+            queryset = Order.objects.all()
+        else:
+            queryset = Order.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            # Items and discounts are prefetched only for orders missing from the cache
+            queryset = queryset.select_related('user')
+        elif self.action == 'export':
+            # Totals are stored columns; prefetch the rest to avoid N+1 queries
+            queryset = queryset.for_display()
+        return queryset
+
+    """This function renders orders through the order cache: one get_many for all of them,
+    then the misses are prefetched in bulk, serialized and stored with one set_many.
+
+    Arguments:
+        orders - list of orders with their user joined in
+    """
+    def serialize_orders(self, orders):
+        data = order_cache.get_orders(orders)
+        misses = [order for order in orders if order.pk not in data]
+        if misses:
+            with phase('serialize'):
+                prefetch_related_objects(misses, *display_prefetches())
+                fresh = {order.pk: self.get_serializer(order).data for order in misses}
+            order_cache.set_orders(misses, fresh)
+            data.update(fresh)
+        return [data[order.pk] for order in orders]
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(self.serialize_orders(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize_orders([self.get_object()])[0])
+
+    def get_serializer_class(self):
+        if self.action == 'bulk':
+            return BulkOrderSerializer
+        if self.action == 'quote':
+            return QuoteSerializer
+        if self.action == 'bulk_update_status':
+            return BulkStatusSerializer
+        return OrderSerializer
 
     """This function applies the applicable discount on the order.
     The following discounts can be applied:
@@ -58,122 +172,20 @@ class OrderViewSet(viewsets.ModelViewSet):
         Riya Jha <jhariya.1912@gmail.com>
     """
     def apply_discounts(self, order):
-        # Clear existing discounts (in case of re-calculation)
-        order.discounts.all().delete()
-
-        total_order_value = order.items.aggregate(
-            total=Sum(F('price_at_purchase') * F('quantity'))
-        )['total'] or Decimal('0')
-
-        user = order.user
-        discounts = []
-
-        # Fetch active discount rules
-        rules = DiscountRule.objects.filter(active=True)
-
-        # Initialize discount amounts
-        percent_discount = None
-        flat_discount = None
-        category_discounts = []
-
-        # Check loyalty eligibility once
-        eligible_orders = Order.objects.filter(
-            user=user,
-            status__in=['completed', 'shipped']
-        ).exclude(id=order.id).count()
-
-        loyalty_user = eligible_orders >= 5
-
-        for rule in rules:
-            if rule.rule_type == DiscountRule.PERCENTAGE:
-                # Check threshold for percentage discount
-                if total_order_value >= (rule.threshold or 0) and rule.percentage:
-                    amount = total_order_value * (rule.percentage / 100)
-                    percent_discount = {
-                        'amount': amount,
-                        'description': f"{rule.percentage}% off orders above ₹{rule.threshold}"
-                    }
-
-            elif rule.rule_type == DiscountRule.FLAT:
-                # Apply flat discount only if user is loyal (based on your existing logic)
-                if loyalty_user and rule.flat_amount:
-                    flat_discount = {
-                        'amount': rule.flat_amount,
-                        'description': f"Flat ₹{rule.flat_amount} off for loyalty program"
-                    }
-
-            elif rule.rule_type == DiscountRule.CATEGORY_BASED:
-                # Calculate category-based discount
-                if rule.category and rule.percentage and rule.min_quantity:
-                    cat_items = order.items.filter(product__category=rule.category)
-                    total_qty = cat_items.aggregate(total_qty=Sum('quantity'))['total_qty'] or 0
-
-                    if total_qty >= rule.min_quantity:
-                        cat_total = cat_items.aggregate(
-                            total=Sum(F('price_at_purchase') * F('quantity'))
-                        )['total'] or Decimal('0')
-                        amount = cat_total * (rule.percentage / 100)
-                        category_discounts.append({
-                            'amount': amount,
-                            'description': f"{rule.percentage}% off on {rule.category.name} (min {rule.min_quantity} items)"
-                        })
-
-        # Stack discounts as per your original logic
-
-        # Apply category discounts first (stackable)
-        for cat_discount in category_discounts:
-            discounts.append(Discount(
-                order=order,
-                discount_type='category_based',
-                description=cat_discount['description'],
-                amount=cat_discount['amount']
-            ))
-
-        # Decide between percentage and flat discount
-        if flat_discount and percent_discount:
-            if loyalty_user:
-                # Apply both
-                discounts.append(Discount(
-                    order=order,
-                    discount_type='percentage',
-                    description=percent_discount['description'],
-                    amount=percent_discount['amount']
-                ))
-                discounts.append(Discount(
-                    order=order,
-                    discount_type='flat',
-                    description=flat_discount['description'],
-                    amount=flat_discount['amount']
-                ))
-            else:
-                # Apply the better discount only
-                better = flat_discount if flat_discount['amount'] > percent_discount['amount'] else percent_discount
-                discount_type = 'flat' if better == flat_discount else 'percentage'
-                discounts.append(Discount(
-                    order=order,
-                    discount_type=discount_type,
-                    description=better['description'],
-                    amount=better['amount']
-                ))
-        elif flat_discount:
-            discounts.append(Discount(
-                order=order,
-                discount_type='flat',
-                description=flat_discount['description'],
-                amount=flat_discount['amount']
-            ))
-        elif percent_discount:
-            discounts.append(Discount(
-                order=order,
-                discount_type='percentage',
-                description=percent_discount['description'],
-                amount=percent_discount['amount']
-            ))
-
-        # Save all calculated discounts
-        Discount.objects.bulk_create(discounts)
+        return apply_discounts(order)
+
+    """This function creates an order. With an `Idempotency-Key` header, a retry of the same
+    request returns the stored response instead of creating another order (see core/idempotency.py).
+
+    Route: POST /orders/
+    """
+    def create(self, request, *args, **kwargs):
+        return idempotency.run_once(request, partial(super().create, request, *args, **kwargs))
 
     """This function creates the order record in the `Orders` table.
+    With settings.DISCOUNTS_ASYNC, discounts are queued for the background worker
+    instead of being applied before the response. The order, its items, totals,
+    rollup entries and discounts (or job) are written in one transaction.
     
     Arguments:
         serializer - `Order Serializer to save the order and return appropriate API response`
@@ -182,8 +194,101 @@ class OrderViewSet(viewsets.ModelViewSet):
         Riya Jha <jhariya.1912@gmail.com>
     """
     def perform_create(self, serializer):
-        order = serializer.save(user=self.request.user)
-        self.apply_discounts(order)
+        with transaction.atomic():
+            order = serializer.save(user=self.request.user)
+            if settings.DISCOUNTS_ASYNC:
+                # Respond right away; `manage.py run_discount_worker` applies the discounts
+                DiscountJob.enqueue([order.id])
+            else:
+                self.apply_discounts(order)
+        # The response renders every item's product; load them in bulk
+        prefetch_related_objects([order], *display_prefetches())
+
+    """This function creates many orders for the logged in user in one request.
+    Products, orders, items and discounts are resolved and written in batches.
+    Accepts an `Idempotency-Key` header like order creation.
+
+    Route: POST /orders/bulk/
+    Body: {"orders": [{"items": [{"product_id": 1, "quantity": 2}, ...]}, ...]}
+
+    Returns:
+        The created orders with their discounts, total and final price.
+    """
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        return idempotency.run_once(request, partial(self.create_bulk, request))
+
+    def create_bulk(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    """This function streams the orders visible to the user as newline-delimited JSON,
+    one order per line in the same format as the list endpoint, oldest first.
+    Orders are read in chunks, so memory use stays flat regardless of table size.
+
+    Route: GET /orders/export/?since=<datetime>&until=<datetime>
+    """
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        queryset = self.get_queryset()
+        for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+            value = request.query_params.get(param)
+            if value:
+                moment = parse_datetime(value)
+                if moment is None:
+                    return Response({"error": f"Invalid '{param}' datetime."},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                queryset = queryset.filter(**{lookup: moment})
+
+        # The stream is read after the view returns, so choose its database now
+        orders = queryset.using(queryset.db).order_by('id').iterator(chunk_size=self.export_chunk_size)
+        serializer = self.get_serializer()
+
+        def lines():
+            for order in orders:
+                data = serializer.to_representation(order)
+                yield json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="orders.ndjson"'
+        return response
+
+    """This function previews the discounts and final price of a cart for the logged in user
+    without creating an order. Uses the same rule evaluation as order creation.
+    Quotes are cached briefly per cart contents, loyalty tier and rule set version.
+
+    Route: POST /orders/quote/
+    Body: {"items": [{"product_id": 1, "quantity": 2}, ...]}
+    """
+    @action(detail=False, methods=['post'])
+    def quote(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        cart = normalize_cart(serializer.validated_data['items'])
+        loyalty_user = qualifying_order_count(request.user.id) >= LOYALTY_MIN_ORDERS
+        rule_set = get_rule_set()
+        cache_key = quote_cache_key(cart, loyalty_user, rule_set, request.user.id)
+
+        data = cache.get(cache_key)
+        if data is None:
+            products = catalog.resolve(product_id for product_id, _ in cart)
+            missing = [product_id for product_id, _ in cart if product_id not in products]
+            if missing:
+                return Response({"error": f"Invalid product ids: {', '.join(map(str, missing))}"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            summary = summarize(
+                (products[product_id].category_id, quantity, products[product_id].price)
+                for product_id, quantity in cart
+            )
+            data = quote_representation(summary, evaluate(rule_set, summary, loyalty_user, request.user.id))
+            cache.set(cache_key, data, timeout=QUOTE_CACHE_TIMEOUT)
+
+        return Response(data)
 
         """This function gives the admin leverage to update the status of any order.
 
@@ -198,12 +303,42 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({"error": "Only admins can update order status."},
                             status=status.HTTP_403_FORBIDDEN)
 
-        order = self.get_object()
         new_status = request.data.get('status')
 
         if new_status not in dict(Order.STATUS_CHOICES):
             return Response({"error": "Invalid status."}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = new_status
-        order.save()
-        return Response({"message": f"Order status for id {order.id} updated to '{new_status}'."})
+        # The URL pattern accepts any string, and the UPDATE below would fail on a non-number
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404("No Order matches the given query.")
+
+        # One conditional UPDATE; only on a miss do we look at why
+        queryset = self.get_queryset()
+        if not queryset.transition_order(pk, new_status):
+            current = queryset.filter(pk=pk).values_list('status', flat=True).first()
+            if current is None:
+                raise Http404("No Order matches the given query.")
+            return Response({"error": f"Order {pk} cannot move from '{current}' to '{new_status}'."},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({"message": f"Order status for id {pk} updated to '{new_status}'."})
+
+    """This function moves many orders to one status at once, e.g. a whole shipment to 'shipped'.
+    Orders whose current status does not allow the move are skipped and listed in the response.
+
+    Route: PATCH /orders/update-status/
+    Body: {"ids": [1, 2, ...], "status": "shipped"}
+    """
+    @action(detail=False, methods=['patch'], url_path='update-status')
+    def bulk_update_status(self, request):
+        if not request.user.is_staff:
+            return Response({"error": "Only admins can update order status."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = set(serializer.validated_data['ids'])
+
+        moved = self.get_queryset().filter(pk__in=ids).transition(serializer.validated_data['status'])
+        return Response({"updated": len(moved), "skipped": sorted(ids.difference(moved))})
@@ -0,0 +1,142 @@
+"""
+core/warmup.py
+
+Warm-up for new worker processes.
+
+A fresh worker has no compiled discount rules, an empty product catalog and,
+with the default per-process LocMemCache, no rendered orders, so its first
+requests pay for every query and cache fill. `warm` loads all three: the
+rule schedule (compiling the rules live now), the catalog entries of the
+most recently ordered products and the rendered representations (totals
+included) of the most recent orders.
+
+order_engine/wsgi.py and asgi.py call `worker_ready` once the application is
+built, before the worker takes traffic. With the garbage collector paused,
+it imports the URLconf and warms up when settings.WARMUP_ON_STARTUP is set,
+then freezes everything allocated while booting, so the collector never
+scans it again.
+`manage.py warmup` runs the same steps on demand, which fills a shared
+order cache for every worker.
+"""
+import gc
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import prefetch_related_objects
+from django.urls import get_resolver
+
+from . import catalog, order_cache
+from .discounts import get_rule_set, get_schedule
+from .models import Order, OrderItem, display_prefetches
+from .serializers import OrderSerializer
+
+logger = logging.getLogger(__name__)
+
+# Products (and orders) are loaded in batches of this many
+BATCH_SIZE = 1000
+
+
+def warm_rules():
+    """
+    Load the rule schedule and compile the rules live now. Returns the
+    number of rules in the schedule.
+    """
+    get_rule_set()
+    return len(get_schedule().rules)
+
+
+def warm_catalog(limit):
+    """
+    Cache the products of the most recent order items, up to `limit`
+    distinct products. Returns the number cached.
+    """
+    product_ids = []
+    seen = set()
+    recent = OrderItem.objects.order_by('-pk').values_list('product_id', flat=True)
+    for product_id in recent[:limit * 10].iterator(chunk_size=BATCH_SIZE):
+        if product_id not in seen:
+            seen.add(product_id)
+            product_ids.append(product_id)
+            if len(product_ids) == limit:
+                break
+    cached = 0
+    for start in range(0, len(product_ids), BATCH_SIZE):
+        cached += len(catalog.resolve(product_ids[start:start + BATCH_SIZE]))
+    return cached
+
+
+def warm_orders(limit):
+    """
+    Render the `limit` most recent orders into the order cache, skipping
+    the ones already cached at their current version. Returns the number
+    rendered.
+    """
+    rendered = 0
+    orders = list(Order.objects.select_related('user').order_by('-created_at', '-pk')[:limit])
+    for start in range(0, len(orders), BATCH_SIZE):
+        batch = orders[start:start + BATCH_SIZE]
+        cached = order_cache.get_orders(batch)
+        misses = [order for order in batch if order.pk not in cached]
+        if misses:
+            prefetch_related_objects(misses, *display_prefetches())
+            order_cache.set_orders(misses, {order.pk: OrderSerializer(order).data for order in misses})
+            rendered += len(misses)
+    return rendered
+
+
+def warm(orders=None, products=None):
+    """
+    Run every warm-up step. `orders` and `products` default to
+    settings.WARMUP_ORDERS and settings.CATALOG_CACHE_SIZE.
+
+    Returns {step: (count, seconds)}.
+    """
+    steps = (
+        ('rules', warm_rules, ()),
+        ('catalog', warm_catalog, (settings.CATALOG_CACHE_SIZE if products is None else products,)),
+        ('orders', warm_orders, (settings.WARMUP_ORDERS if orders is None else orders,)),
+    )
+    results = {}
+    for name, step, args in steps:
+        start = time.perf_counter()
+        count = step(*args)
+        results[name] = (count, time.perf_counter() - start)
+    return results
+
+
+def _warm_worker():
+    try:
+        warm()
+    except Exception:
+        logger.exception("Worker warm-up failed; starting with cold caches")
+    finally:
+        connections.close_all()
+
+
+def worker_ready():
+    """
+    Called by the WSGI/ASGI entry points once the application is built. The
+    garbage collector is paused while the URLconf loads and the caches warm,
+    then everything allocated so far is frozen and collection resumes. A
+    worker whose warm-up fails still starts, with cold caches.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        # Import the URLconf, and every view module with it, now rather than
+        # on the worker's first request
+        get_resolver().url_patterns
+        if settings.WARMUP_ON_STARTUP:
+            # In a thread of its own: ASGI servers load the application inside
+            # a running event loop, where queries are not allowed
+            thread = threading.Thread(target=_warm_worker, name='warmup')
+            thread.start()
+            thread.join()
+    finally:
+        # Boot objects live as long as the worker; keep them out of every collection
+        gc.freeze()
+        if enabled:
+            gc.enable()
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_engine.settings')
 
 application = get_asgi_application()
+
+# Load the views and warm the caches (with ORDER_ENGINE_WARMUP=1) before taking
+# traffic, then freeze the boot objects out of garbage collection
+from core.warmup import worker_ready  # noqa: E402 (needs the app registry)
+
+worker_ready()
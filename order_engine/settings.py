@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.instrumentation.InstrumentationMiddleware',
+    'core.routing.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'order_engine.urls'
@@ -78,9 +81,54 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts, so concurrent
+            # writers (e.g. discount worker processes) wait for each other
+            # instead of failing with "database is locked".
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Set ORDER_ENGINE_POSTGRES_DB to use a PostgreSQL database instead (requires
+# `psycopg`); host, port, user and password are read by libpq from the usual
+# PGHOST, PGPORT, PGUSER and PGPASSWORD environment variables.
+if os.environ.get('ORDER_ENGINE_POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['ORDER_ENGINE_POSTGRES_DB'],
+    }
+
+# Seconds a worker thread keeps its database connection open between requests;
+# 0 (the default) connects for every request.
+DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('ORDER_ENGINE_CONN_MAX_AGE', '0'))
+
+# Read replicas
+#
+# Order list/retrieve/export, reports and the async order reads are served by a
+# replica (see core/routing.py); writes and everything else use `default`. A user
+# who just wrote reads from `default` for READ_YOUR_WRITES_SECONDS, so replica lag
+# never hides their own changes. Locally, SQLite copies of the primary can stand
+# in for replicas, refreshed with `manage.py sync_sqlite_replicas`:
+#   ORDER_ENGINE_REPLICA_DBS=replica1.sqlite3,replica2.sqlite3
+# With other backends, add the replica connections to DATABASES and list their
+# aliases in DATABASE_REPLICAS.
+DATABASE_REPLICAS = []
+for number, name in enumerate(filter(None, os.environ.get('ORDER_ENGINE_REPLICA_DBS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / name.strip(),
+        'OPTIONS': {'timeout': 20},
+        # Tests run against the primary only
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routing.ReplicaRouter']
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('ORDER_ENGINE_READ_YOUR_WRITES_SECONDS', '5'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,9 +173,89 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Rule set versions, quotes and rendered orders live in the default cache. Use a
+# shared backend in production so every worker sees the same entries:
+#   ORDER_ENGINE_REDIS_URL=redis://localhost:6379/0   (requires `redis`)
+#   ORDER_ENGINE_MEMCACHED=127.0.0.1:11211            (requires `pymemcache`)
+#   ORDER_ENGINE_CACHE_DIR=/var/tmp/order_engine      (file based, shared by local workers)
+# Without any of these, each process gets its own in-memory cache.
+
+if os.environ.get('ORDER_ENGINE_REDIS_URL'):
+    CACHE_BACKEND = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['ORDER_ENGINE_REDIS_URL'],
+    }
+elif os.environ.get('ORDER_ENGINE_MEMCACHED'):
+    CACHE_BACKEND = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ['ORDER_ENGINE_MEMCACHED'],
+    }
+elif os.environ.get('ORDER_ENGINE_CACHE_DIR'):
+    CACHE_BACKEND = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['ORDER_ENGINE_CACHE_DIR'],
+    }
+else:
+    CACHE_BACKEND = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'discount-cache',
+        # The default of 300 entries would cull the orders warmed at startup
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'discount-cache'
+        **CACHE_BACKEND,
+        'KEY_PREFIX': 'order_engine',
     }
-}
\ No newline at end of file
+}
+
+# Per-process caches
+#
+# Compiled discount rules and product catalog entries are cached in every
+# process and invalidated through version tokens kept in the database (see
+# core/versions.py). Each process re-reads the tokens at most this often, so
+# an edit reaches the other workers within this many seconds.
+VERSION_CHECK_INTERVAL = float(os.environ.get('ORDER_ENGINE_VERSION_CHECK_INTERVAL', '1'))
+
+# Discounts
+#
+# When True, order creation only queues a DiscountJob and returns immediately;
+# `python manage.py run_discount_worker` applies the discounts in the background.
+DISCOUNTS_ASYNC = os.environ.get('ORDER_ENGINE_DISCOUNTS_ASYNC', '').lower() in ('1', 'true', 'yes')
+
+# The discounts of an order never add up to more than this percentage of its
+# total; the lowest priority discounts are trimmed first (see core/rule_types.py).
+DISCOUNT_CAP_PERCENT = os.environ.get('ORDER_ENGINE_DISCOUNT_CAP_PERCENT', '100')
+
+# Idempotency-Key responses of order submissions are kept at least this many
+# seconds; `manage.py sweep_idempotency_keys` deletes older ones.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('ORDER_ENGINE_IDEMPOTENCY_KEY_TTL', str(24 * 60 * 60)))
+
+# Request instrumentation
+#
+# Fraction of API requests that are instrumented (SQL, cache and phase
+# timings, reported in a Server-Timing header and at /api/metrics/). Low by
+# default so the timing hooks stay off the hot path; raise it while profiling.
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('ORDER_ENGINE_METRICS_SAMPLE_RATE', '0.01'))
+INSTRUMENTATION_PATH_PREFIX = '/api/'
+
+# Worker warm-up
+#
+# With ORDER_ENGINE_WARMUP=1, every WSGI/ASGI worker loads the discount rules,
+# the catalog entries of recently ordered products and the rendered
+# WARMUP_ORDERS most recent orders before serving requests (see core/warmup.py).
+WARMUP_ON_STARTUP = os.environ.get('ORDER_ENGINE_WARMUP', '').lower() in ('1', 'true', 'yes')
+WARMUP_ORDERS = int(os.environ.get('ORDER_ENGINE_WARMUP_ORDERS', '1000'))
+
+# Product catalog
+#
+# Products kept in each process's (price, category) LRU cache (see core/catalog.py).
+CATALOG_CACHE_SIZE = int(os.environ.get('ORDER_ENGINE_CATALOG_CACHE_SIZE', '10000'))
+
+# The covering indexes in core/models.py only add their INCLUDE columns on
+# PostgreSQL; other backends create them as plain indexes.
+SILENCED_SYSTEM_CHECKS = ['models.W040']